@@ -0,0 +1,37 @@
+import importlib
+
+# main entry points, their modules are imported on first use to keep `import minds` fast
+_LAZY_EXPORTS = {
+    'Client': 'minds.client',
+    'Mind': 'minds.minds',
+    'Minds': 'minds.minds',
+    'DatabaseConfig': 'minds.datasources',
+    'DatabaseTables': 'minds.datasources',
+    'Datasource': 'minds.datasources',
+    'KnowledgeBase': 'minds.knowledge_bases',
+    'KnowledgeBaseConfig': 'minds.knowledge_bases',
+    'KnowledgeBaseDocument': 'minds.knowledge_bases',
+    'EmbeddingConfig': 'minds.knowledge_bases',
+    'VectorStoreConfig': 'minds.knowledge_bases',
+    'PreprocessingConfig': 'minds.knowledge_bases.preprocessing',
+    'TextChunkingConfig': 'minds.knowledge_bases.preprocessing',
+    'Budget': 'minds.usage',
+    'HedgingPolicy': 'minds.hedging',
+    'CompletionScheduler': 'minds.scheduler',
+    'DesiredState': 'minds.reconcile',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'minds' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
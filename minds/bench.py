@@ -0,0 +1,562 @@
+'''
+Load generator to measure throughput and latency of the SDK
+
+By default it starts a local stand-in server (minds.local_server) in a subprocess,
+so the measured CPU time belongs to the client only:
+
+    python -m minds.bench --scenario completion --scenario minds-get --concurrency 8 --requests 500
+    python -m minds.bench --scenario completion-stream --rate 20 --duration 30 --first-token-latency 0.2
+
+Against a real server:
+
+    python -m minds.bench --base-url https://mdb.ai --api-key KEY --scenario minds-list
+
+Serialization of DataFrame rows, list of models against the columnar path:
+
+    python -m minds.bench --columnar --requests 100000 --doc-size 500
+
+Import time of the package (python -X importtime):
+
+    python -m minds.bench --import-time minds.client
+'''
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import minds.exceptions as exc
+from minds import local_server
+
+
+MIND_NAME = 'bench_mind'
+KNOWLEDGE_BASE_NAME = 'bench_kb'
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    '''Nearest-rank percentile, p in 0..100'''
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Result:
+    def __init__(self, scenario: str):
+        self.scenario = scenario
+        self.latencies = []
+        self.ttfts = []
+        self.errors = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, latency: float, ttft: Optional[float] = None, error: bool = False):
+        with self._lock:
+            if error:
+                self.errors += 1
+                return
+            self.latencies.append(latency)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+
+    def to_dict(self) -> dict:
+        count = len(self.latencies) + self.errors
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'scenario': self.scenario,
+            'requests': count,
+            'errors': self.errors,
+            'throughput': round(len(self.latencies) / self.wall_time, 3) if self.wall_time else None,
+            'p50_ms': ms(percentile(self.latencies, 50)),
+            'p95_ms': ms(percentile(self.latencies, 95)),
+            'p99_ms': ms(percentile(self.latencies, 99)),
+            'ttft_p50_ms': ms(percentile(self.ttfts, 50)),
+            'ttft_p95_ms': ms(percentile(self.ttfts, 95)),
+            'ttft_p99_ms': ms(percentile(self.ttfts, 99)),
+            'cpu_s': round(self.cpu_time, 3),
+            'cpu_per_request_ms': ms(self.cpu_time / count) if count else None,
+        }
+
+
+# --- scenarios ---
+
+class Scenario:
+    '''
+    Base class of benchmark scenario
+
+    run(i) executes one request and returns time to first token or None
+    '''
+    name = None
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+
+    def setup(self):
+        ...
+
+    def run(self, i: int) -> Optional[float]:
+        raise NotImplementedError
+
+    def teardown(self):
+        ...
+
+
+def _get_or_create_mind(client):
+    try:
+        return client.minds.get(MIND_NAME)
+    except exc.ObjectNotFound:
+        return client.minds.create(name=MIND_NAME)
+
+
+class CompletionScenario(Scenario):
+    name = 'completion'
+
+    def setup(self):
+        self.mind = _get_or_create_mind(self.client)
+
+    def run(self, i):
+        self.mind.completion(self.args.question)
+
+
+class StreamCompletionScenario(CompletionScenario):
+    name = 'completion-stream'
+
+    def run(self, i):
+        start = time.perf_counter()
+        ttft = None
+        for _ in self.mind.completion(self.args.question, stream=True):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft
+
+
+class MindsCreateScenario(Scenario):
+    name = 'minds-create'
+
+    def setup(self):
+        self.prefix = 'bench_' + uuid.uuid4().hex[:8] + '_'
+        self.created = []
+        self._lock = threading.Lock()
+
+    def run(self, i):
+        with self._lock:
+            # warmup requests reuse indexes
+            name = f'{self.prefix}{len(self.created)}'
+            self.created.append(name)
+        self.client.minds.create(name=name)
+
+    def teardown(self):
+        for name in self.created:
+            try:
+                self.client.minds.drop(name)
+            except exc.ObjectNotFound:
+                ...
+
+
+class MindsGetScenario(Scenario):
+    name = 'minds-get'
+
+    def setup(self):
+        _get_or_create_mind(self.client)
+
+    def run(self, i):
+        self.client.minds.get(MIND_NAME)
+
+
+class MindsListScenario(Scenario):
+    name = 'minds-list'
+
+    def setup(self):
+        _get_or_create_mind(self.client)
+
+    def run(self, i):
+        self.client.minds.list()
+
+
+class InsertDocumentsScenario(Scenario):
+    name = 'kb-insert'
+
+    def setup(self):
+        from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+
+        try:
+            self.kb = self.client.knowledge_bases.get(KNOWLEDGE_BASE_NAME)
+        except exc.ObjectNotFound:
+            self.kb = self.client.knowledge_bases.create(
+                KnowledgeBaseConfig(name=KNOWLEDGE_BASE_NAME, description='Benchmark knowledge base')
+            )
+        content = 'x' * self.args.doc_size
+        self.documents = [
+            KnowledgeBaseDocument(id=i, content=content, metadata={'n': i})
+            for i in range(self.args.batch_size)
+        ]
+
+    def run(self, i):
+        self.kb.insert_documents(self.documents)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        CompletionScenario,
+        StreamCompletionScenario,
+        MindsCreateScenario,
+        MindsGetScenario,
+        MindsListScenario,
+        InsertDocumentsScenario,
+    )
+}
+
+
+# --- load generation ---
+
+def _call(run: Callable, i: int, start: float, result: Result):
+    run_start = time.perf_counter()
+    try:
+        ttft = run(i)
+    except Exception:
+        result.add(0, error=True)
+        return
+    end = time.perf_counter()
+    if ttft is not None:
+        # measured from the intended start in open loop mode
+        ttft += run_start - start
+    result.add(end - start, ttft)
+
+
+def run_closed_loop(run: Callable, result: Result, concurrency: int, requests: int = None, duration: float = None):
+    '''
+    Every worker sends the next request right after the previous one is finished
+    '''
+    counter = iter(range(sys.maxsize))
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter)
+            if requests is not None and i >= requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            _call(run, i, time.perf_counter(), result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(run: Callable, result: Result, rate: float, concurrency: int,
+                  requests: int = None, duration: float = None, seed: int = 0):
+    '''
+    Requests arrive with poisson process with given rate, independently of responses.
+    Latency is measured from the scheduled arrival time, so queueing in the client is included
+    '''
+    rnd = random.Random(seed)
+    begin = time.perf_counter()
+    arrival = begin
+    i = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            if requests is not None and i >= requests:
+                break
+            if duration is not None and arrival - begin >= duration:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(_call, run, i, arrival, result)
+            i += 1
+            arrival += rnd.expovariate(rate)
+
+
+def run_scenario(client, name: str, args) -> Result:
+    scenario = SCENARIOS[name](client, args)
+    scenario.setup()
+    result = Result(name)
+    requests = args.requests if args.duration is None else None
+    try:
+        for i in range(args.warmup):
+            scenario.run(i)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if args.rate:
+            run_open_loop(scenario.run, result, args.rate, args.concurrency, requests, args.duration, args.seed)
+        else:
+            run_closed_loop(scenario.run, result, args.concurrency, requests, args.duration)
+        result.wall_time = time.perf_counter() - wall_start
+        result.cpu_time = time.process_time() - cpu_start
+    finally:
+        scenario.teardown()
+    return result
+
+
+COLUMNS = [
+    ('scenario', 18), ('requests', 9), ('errors', 7), ('throughput', 11),
+    ('p50_ms', 9), ('p95_ms', 9), ('p99_ms', 9),
+    ('ttft_p50_ms', 12), ('ttft_p99_ms', 12), ('cpu_s', 8), ('cpu_per_request_ms', 19),
+]
+
+
+def format_report(results: List[Result]) -> str:
+    lines = [''.join(name.ljust(width) for name, width in COLUMNS)]
+    for result in results:
+        row = result.to_dict()
+        lines.append(''.join(
+            ('-' if row[name] is None else str(row[name])).ljust(width)
+            for name, width in COLUMNS
+        ))
+    return '\n'.join(lines)
+
+
+def measure_import_time(module: str = 'minds', runs: int = 5) -> dict:
+    '''
+    Import the module in fresh interpreters with `python -X importtime`
+
+    :return: median of cumulative import time of the module in microseconds,
+        and imported modules of the last run with their cumulative time
+    '''
+    totals = []
+    imported = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, check=True
+        )
+        imported = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split('|')
+            imported[name.strip()] = int(cumulative)
+        totals.append(imported[module])
+    return {
+        'module': module,
+        'cumulative_us': sorted(totals)[len(totals) // 2],
+        'imported': imported,
+    }
+
+
+def measure_chunking(documents: int = 1000, doc_size: int = 20000, processes: int = 1,
+                     chunk_size: int = 1000, chunk_overlap: int = 200, seed: int = 0) -> dict:
+    '''
+    Split a generated corpus with the local chunker
+
+    :return: number of documents and chunks, elapsed seconds, chunks and megabytes per second
+    '''
+    from minds.knowledge_bases.chunking import chunk_documents
+    from minds.knowledge_bases.preprocessing import TextChunkingConfig
+
+    rnd = random.Random(seed)
+    words = ['data', 'mind', 'query', 'knowledge', 'base', 'vector', 'answer', 'question']
+
+    def generate():
+        for i in range(documents):
+            text = []
+            size = 0
+            while size < doc_size:
+                sentence = ' '.join(rnd.choice(words) for _ in range(rnd.randint(5, 20))) + '.'
+                # paragraphs and lines to exercise all separators
+                sentence += rnd.choice([' ', ' ', '\n', '\n\n'])
+                text.append(sentence)
+                size += len(sentence)
+            yield {'id': i, 'content': ''.join(text)}
+
+    corpus = list(generate())
+    config = TextChunkingConfig(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    start = time.perf_counter()
+    chunks = sum(1 for _ in chunk_documents(corpus, config, processes=processes))
+    elapsed = time.perf_counter() - start
+    size = sum(len(doc['content']) for doc in corpus)
+    return {
+        'documents': documents,
+        'chunks': chunks,
+        'processes': processes,
+        'elapsed': elapsed,
+        'chunks_per_second': chunks / elapsed,
+        'mb_per_second': size / elapsed / 1e6,
+    }
+
+
+def measure_columnar(rows: int = 100000, doc_size: int = 500, batch_size: int = 1000, seed: int = 0) -> dict:
+    '''
+    Client CPU time of serialization of a generated DataFrame into request batches:
+    list of KnowledgeBaseDocument models against the columnar path. Requests are not sent
+
+    :return: rows per second of both paths and the speedup
+    '''
+    import pandas as pd
+
+    from minds.knowledge_bases import KnowledgeBaseDocument
+    from minds.knowledge_bases.columnar import _import_pyarrow, dataframe_to_table, iter_blocks, validate_columns
+    from minds.knowledge_bases.ingestion import BatchUploader
+    from minds.knowledge_bases.knowledge_bases import _document_serializer
+
+    rnd = random.Random(seed)
+    df = pd.DataFrame({
+        'id': range(rows),
+        'content': [''.join(rnd.choice('abcdefgh ') for _ in range(64)) * (doc_size // 64) for _ in range(rows)],
+        'source': [rnd.choice(['docs', 'faq', 'blog']) for _ in range(rows)],
+        'score': [rnd.random() for _ in range(rows)],
+    })
+    uploader = BatchUploader(lambda batch: None, batch_size=batch_size, max_workers=1)
+    # import time is not measured
+    _import_pyarrow()
+
+    start = time.perf_counter()
+    documents = [
+        KnowledgeBaseDocument(id=row.id, content=row.content, metadata={'source': row.source, 'score': row.score})
+        for row in df.itertuples(index=False)
+    ]
+    uploader.upload(documents, _document_serializer())
+    models_elapsed = time.perf_counter() - start
+    del documents
+
+    start = time.perf_counter()
+    table = dataframe_to_table(df)
+    metadata_cols = validate_columns(table, 'id', 'content')
+    uploader.upload_blocks(iter_blocks(table, 'id', 'content', metadata_cols, batch_size, 8 * 1024 * 1024))
+    columnar_elapsed = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'models_rows_per_second': rows / models_elapsed,
+        'columnar_rows_per_second': rows / columnar_elapsed,
+        'speedup': models_elapsed / columnar_elapsed,
+    }
+
+
+class _ServerProcess:
+    '''Local stand-in server running in a subprocess'''
+
+    def __init__(self, args):
+        cmd = [
+            sys.executable, '-m', 'minds.local_server', '--port', '0',
+            '--latency', str(args.latency),
+            '--first-token-latency', str(args.first_token_latency),
+            '--token-latency', str(args.token_latency),
+            '--answer-tokens', str(args.answer_tokens),
+            '--ingest-latency', str(args.ingest_latency),
+            '--error-rate', str(args.error_rate),
+            '--rate-limit-rate', str(args.rate_limit_rate),
+            '--retry-after', str(args.retry_after),
+            '--slow-stream-rate', str(args.slow_stream_rate),
+            '--slow-token-latency', str(args.slow_token_latency),
+            '--stream-drop-rate', str(args.stream_drop_rate),
+        ]
+        if args.rate_limit:
+            cmd += ['--rate-limit', str(args.rate_limit)]
+        if args.server_seed is not None:
+            cmd += ['--server-seed', str(args.server_seed)]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line.startswith('Listening on '):
+            self.process.kill()
+            raise RuntimeError(f'Local server is not started: {line}')
+        self.url = line.split()[-1]
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m minds.bench', description='Minds SDK load generator')
+    parser.add_argument('--base-url', help='Minds server, local stand-in server is started if not set')
+    parser.add_argument('--api-key', default=os.getenv('MINDS_API_KEY', 'bench'))
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run, can be repeated, default: completion')
+    parser.add_argument('--concurrency', type=int, default=1, help='number of concurrent requests')
+    parser.add_argument('--rate', type=float, help='open loop mode: requests per second')
+    parser.add_argument('--requests', type=int, default=100, help='number of requests of each scenario')
+    parser.add_argument('--duration', type=float, help='run each scenario for given seconds instead of --requests')
+    parser.add_argument('--warmup', type=int, default=1, help='not measured requests before each scenario')
+    parser.add_argument('--seed', type=int, default=0, help='seed of open loop arrivals')
+    parser.add_argument('--question', default='What is the answer?', help='completion question')
+    parser.add_argument('--batch-size', type=int, default=100, help='documents in one kb-insert request')
+    parser.add_argument('--doc-size', type=int, default=500, help='content length of kb-insert documents')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    parser.add_argument('--import-time', metavar='MODULE',
+                        help='measure import time of the module instead of running scenarios')
+    parser.add_argument('--chunking', action='store_true',
+                        help='measure local chunking of a generated corpus: --requests documents of --doc-size length')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes of --chunking')
+    parser.add_argument('--columnar', action='store_true',
+                        help='compare serialization of --requests rows of --doc-size length: models and DataFrame')
+    local_server.add_arguments(parser.add_argument_group('local server'))
+    return parser
+
+
+def main(argv=None):
+    from minds.client import Client
+
+    args = build_parser().parse_args(argv)
+    if args.import_time:
+        result = measure_import_time(args.import_time)
+        slowest = sorted(result['imported'].items(), key=lambda item: -item[1])[:15]
+        if args.json:
+            print(json.dumps(dict(result, imported=dict(slowest)), indent=2))
+        else:
+            print(f'{args.import_time}: {result["cumulative_us"] / 1000:.1f} ms')
+            for name, us in slowest:
+                print(f'  {name.ljust(50)} {us / 1000:.1f} ms')
+        return result
+
+    if args.chunking:
+        result = measure_chunking(args.requests, args.doc_size, processes=args.processes, seed=args.seed)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print(f'{result["documents"]} documents, {result["chunks"]} chunks, {result["processes"]} processes: '
+                  f'{result["chunks_per_second"]:.0f} chunks/s, {result["mb_per_second"]:.1f} MB/s')
+        return result
+
+    if args.columnar:
+        result = measure_columnar(args.requests, args.doc_size, batch_size=args.batch_size, seed=args.seed)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print(f'{result["rows"]} rows: models {result["models_rows_per_second"]:.0f} rows/s, '
+                  f'columnar {result["columnar_rows_per_second"]:.0f} rows/s, speedup {result["speedup"]:.1f}x')
+        return result
+
+    scenarios = args.scenario or ['completion']
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = _ServerProcess(args)
+        base_url = server.url
+
+    try:
+        client = Client(args.api_key, base_url=base_url)
+        results = [run_scenario(client, name, args) for name in scenarios]
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print(format_report(results))
+    return results
+
+
+if __name__ == '__main__':
+    main()
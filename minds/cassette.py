@@ -0,0 +1,345 @@
+'''
+Record and replay of the traffic of the client: REST requests and completions
+
+In record mode every request to Minds API and every completion call, streamed chunks included,
+is written with its timings to a json lines file (gzipped if the name ends with .gz).
+In replay mode the recorded responses are served without network, in the order they were recorded:
+
+    client = Client(api_key, cassette=Cassette('trace.jsonl.gz', mode='record'))
+    ...
+    client.cassette.close()
+
+    client = Client('any key', cassette=Cassette('trace.jsonl.gz', preserve_timing=True))
+
+Requests are matched by method, path and hash of the normalized body, completions by hash of their parameters.
+When all recorded responses of a request are served, the last one is repeated.
+Credentials and request bodies are not stored.
+'''
+import base64
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Iterator
+from urllib.parse import urlsplit
+
+import requests.adapters
+import requests.models
+import requests.structures
+import requests.utils
+
+import minds.exceptions as exc
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# headers of responses which are not stored: they are not reproducible or are recomputed on replay
+_SKIPPED_HEADERS = {
+    'date', 'server', 'set-cookie', 'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+    'content-length',
+}
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b''
+    if isinstance(body, str):
+        return body.encode()
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body)
+    # file-like object
+    return body.read()
+
+
+def _body_hash(body: bytes) -> str:
+    if not body:
+        return ''
+    try:
+        # the same json with different order of keys or spacing
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode()
+    except ValueError:
+        ...
+    return hashlib.sha256(body).hexdigest()
+
+
+def _encode(body: bytes) -> dict:
+    try:
+        return {'text': body.decode()}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(body).decode()}
+
+
+def _decode(record: dict) -> bytes:
+    if 'base64' in record:
+        return base64.b64decode(record['base64'])
+    return record.get('text', '').encode()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = REPLAY, preserve_timing: bool = False, speed: float = 1.0,
+                 append: bool = False):
+        '''
+        :param path: file of the cassette, gzipped if the name ends with .gz
+        :param mode: 'record' - send requests and write them to the file, 'replay' - serve responses from the file
+        :param preserve_timing: replay with recorded latencies and intervals between streamed chunks, default is false
+        :param speed: divider of recorded delays if timing is preserved, for example 2 - twice as fast
+        :param append: in record mode, append to the existing file instead of overwriting it
+        '''
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f'Unknown mode of cassette: {mode}')
+        if speed <= 0:
+            raise ValueError('Speed must be positive')
+        self.path = str(path)
+        self.mode = mode
+        self.preserve_timing = preserve_timing
+        self.speed = speed
+        self.append = append
+
+        self._lock = threading.Lock()
+        self._file = None
+        # replay: key -> recorded interactions and number of served ones
+        self._interactions = {}
+        self._served = {}
+        self.recorded = 0
+        self.replayed = 0
+
+        if mode == REPLAY:
+            self._load()
+        else:
+            self._open(append)
+
+    def __reduce__(self):
+        # other process appends to the same file or reads it again
+        return Cassette, (self.path, self.mode, self.preserve_timing, self.speed, True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _open(self, append: bool):
+        file_mode = 'at' if append else 'wt'
+        if self.path.endswith('.gz'):
+            self._file = gzip.open(self.path, file_mode, encoding='utf-8')
+        else:
+            self._file = open(self.path, file_mode, encoding='utf-8')
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._interactions.setdefault(record['key'], []).append(record)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return sum(len(records) for records in self._interactions.values())
+
+    def _write(self, record: dict):
+        line = json.dumps(record, separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f'Cassette is closed: {self.path}')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.recorded += 1
+
+    def _next(self, key: str, description: str) -> dict:
+        with self._lock:
+            records = self._interactions.get(key)
+            if not records:
+                raise exc.CassetteMiss(f'Not recorded in {self.path}: {description}')
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            self.replayed += 1
+        return records[min(served, len(records) - 1)]
+
+    def _sleep_until(self, start: float, offset: float):
+        if not self.preserve_timing:
+            return
+        delay = start + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # REST requests
+
+    @staticmethod
+    def _request_key(method: str, url: str, body: bytes) -> str:
+        # the path without host: cassette can be replayed against any base url
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        return f'{method} {path} {_body_hash(body)}'
+
+    def adapter(self, inner: requests.adapters.BaseAdapter = None) -> requests.adapters.BaseAdapter:
+        '''
+        Transport adapter of requests session
+
+        :param inner: adapter sending requests in record mode, default is HTTPAdapter
+        '''
+        return _CassetteAdapter(self, inner or requests.adapters.HTTPAdapter())
+
+    def _record_request(self, inner, request, **kwargs):
+        body = _body_bytes(request.body)
+        if hasattr(request.body, 'read'):
+            # file-like body is read once
+            request.body = body
+        start = time.perf_counter()
+        response = inner.send(request, **kwargs)
+        content = response.content
+        elapsed = time.perf_counter() - start
+
+        headers = {
+            name: value for name, value in response.headers.items() if name.lower() not in _SKIPPED_HEADERS
+        }
+        self._write({
+            'key': self._request_key(request.method, request.url, body),
+            'kind': 'rest',
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': headers,
+            'latency': round(elapsed, 6),
+            **_encode(content),
+        })
+        return response
+
+    def _replay_request(self, request):
+        start = time.perf_counter()
+        body = _body_bytes(request.body)
+        key = self._request_key(request.method, request.url, body)
+        record = self._next(key, f'{request.method} {request.url}')
+        content = _decode(record)
+        self._sleep_until(start, record['latency'])
+
+        response = requests.models.Response()
+        response.status_code = record['status']
+        response.reason = record.get('reason')
+        response.headers = requests.structures.CaseInsensitiveDict(record.get('headers', {}))
+        response.headers['Content-Length'] = str(len(content))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(content)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=record['latency'])
+        return response
+
+    # completions
+
+    @staticmethod
+    def _completion_key(request: dict) -> str:
+        body = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+        return f'completion {request.get("model")} {hashlib.sha256(body.encode()).hexdigest()}'
+
+    def wrap_completion(self, create: Callable, request: dict) -> Callable:
+        '''
+        :param create: function sending the completion request with the parameters
+        :param request: parameters of the request: model, messages, stream...
+        :return: function returning the recorded or replayed response, or iterator of chunks in stream mode
+        '''
+        if self.mode == RECORD:
+            return lambda: self._record_completion(create, request)
+        return lambda: self._replay_completion(request)
+
+    def _record_completion(self, create: Callable, request: dict):
+        key = self._completion_key(request)
+        start = time.perf_counter()
+        response = create()
+        latency = time.perf_counter() - start
+        if request.get('stream'):
+            return _RecordingStream(self, key, response, start, latency)
+
+        self._write({
+            'key': key,
+            'kind': 'completion',
+            'latency': round(latency, 6),
+            'response': response.model_dump(mode='json', exclude_unset=True),
+        })
+        return response
+
+    def _replay_completion(self, request: dict):
+        start = time.perf_counter()
+        record = self._next(self._completion_key(request), f'completion of {request.get("model")}')
+        self._sleep_until(start, record['latency'])
+        if 'chunks' in record:
+            return _ReplayStream(self, record['chunks'], start)
+
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(record['response'])
+
+
+class _CassetteAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, cassette: Cassette, inner: requests.adapters.BaseAdapter):
+        super().__init__()
+        self.cassette = cassette
+        self.inner = inner
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == RECORD:
+            return self.cassette._record_request(self.inner, request, **kwargs)
+        return self.cassette._replay_request(request)
+
+    def close(self):
+        self.inner.close()
+
+
+class _RecordingStream:
+    '''Stream of completion chunks which is written to the cassette when it is consumed'''
+
+    def __init__(self, cassette: Cassette, key: str, stream, start: float, latency: float):
+        self.cassette = cassette
+        self.key = key
+        self.stream = stream
+        self.start = start
+        self.latency = latency
+        # (seconds from start of the request, chunk)
+        self.chunks = []
+
+    def __iter__(self) -> Iterator[object]:
+        for chunk in self.stream:
+            self.chunks.append([
+                round(time.perf_counter() - self.start, 6), chunk.model_dump(mode='json', exclude_unset=True)
+            ])
+            yield chunk
+        # interrupted streams are not written
+        self.cassette._write({
+            'key': self.key,
+            'kind': 'completion',
+            'latency': round(self.latency, 6),
+            'chunks': self.chunks,
+        })
+
+    def close(self):
+        self.stream.close()
+
+
+class _ReplayStream:
+    def __init__(self, cassette: Cassette, chunks: list, start: float):
+        self.cassette = cassette
+        self.chunks = chunks
+        self.start = start
+        self.closed = False
+
+    def __iter__(self) -> Iterator[object]:
+        from openai.types.chat import ChatCompletionChunk
+
+        for offset, data in self.chunks:
+            if self.closed:
+                return
+            self.cassette._sleep_until(self.start, offset)
+            yield ChatCompletionChunk.model_validate(data)
+
+    def close(self):
+        self.closed = True
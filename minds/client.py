@@ -1,18 +1,309 @@
+import functools
+import os
+import threading
+import time
+import weakref
+from typing import List, Union, TYPE_CHECKING
 
+import minds.utils as utils
+from minds.metrics import instrument
 from minds.rest_api import RestAPI
 
-from minds.datasources import Datasources
-from minds.knowledge_bases import KnowledgeBases
-from minds.minds import Minds
+if TYPE_CHECKING:
+    from minds.datasources import Datasources
+    from minds.files import Files
+    from minds.knowledge_bases import KnowledgeBases
+    from minds.minds import Minds
+    from minds.usage import UsageTracker, Budget
+    from minds.hedging import HedgingPolicy
+    from minds.scheduler import CompletionScheduler
+    from minds.reconcile import DesiredState, Plan, ApplyResult
+    from minds.metrics import MetricsSnapshot
+    from minds.cassette import Cassette
+    from minds.watch import Watcher
+
+
+# clients of the process, they are reinitialized in the child process after fork
+_clients = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for client in list(_clients):
+        client._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _restore_client(api_key, base_url, options):
+    return Client(api_key, base_url, **options)
 
 
 class Client:
 
-    def __init__(self, api_key, base_url=None):
+    def __init__(self, api_key, base_url=None, budget: 'Budget' = None, mind_budget: 'Budget' = None,
+                 hedging: 'HedgingPolicy' = None, scheduler: 'CompletionScheduler' = None, pool_size: int = 10,
+                 metrics: bool = True, cassette: 'Cassette' = None):
+        """
+        :param api_key: Minds API key
+        :param base_url: url of Minds server, optional
+        :param budget: token limits for all completions of the client, optional
+        :param mind_budget: token limits applied to each mind separately, optional
+        :param hedging: policy of hedged completion requests, disabled by default
+        :param scheduler: scheduler of concurrent completions, optional
+        :param pool_size: number of kept alive connections to the server, default is 10
+        :param metrics: collect metrics of calls, see client.metrics(), default is true
+        :param cassette: record requests and completions to the cassette or replay them from it, optional
+        """
+
+        self.api = RestAPI(api_key, base_url, pool_size=pool_size, metrics=metrics, cassette=cassette)
+
+        # to be pickled, see __reduce__
+        self._options = dict(
+            budget=budget, mind_budget=mind_budget, hedging=hedging, scheduler=scheduler, pool_size=pool_size,
+            metrics=metrics, cassette=cassette,
+        )
+
+        self.budget = budget
+        self.mind_budget = mind_budget
+        self.hedger = None
+        if hedging is not None:
+            from minds.hedging import Hedger
+
+            self.hedger = Hedger(hedging)
+        self.scheduler = scheduler
+        self.cassette = cassette
+
+        self._openai_client = None
+        self._openai_lock = threading.Lock()
+        _clients.add(self)
+
+    def __reduce__(self):
+        # pickled as a lightweight handle: credentials and options, without connections and state
+        return _restore_client, (self.api.api_key, self.api.base_url, self._options)
+
+    def _after_fork(self):
+        # connections and threads of the parent process must not be used in the child
+        self.api._reset()
+        if self.api.metrics is not None:
+            self.api.metrics._after_fork()
+        self._openai_client = None
+        self._openai_lock = threading.Lock()
+        if self.hedger is not None:
+            self.hedger._after_fork()
+        if self.scheduler is not None:
+            self.scheduler._after_fork()
+        if 'usage' in self.__dict__:
+            self.usage._after_fork()
+
+    def close(self):
+        """
+        Close connections of the client and stop threads of the hedger
+        """
+        if self.hedger is not None:
+            self.hedger.close()
+        if self._openai_client is not None:
+            self._openai_client.close()
+            self._openai_client = None
+        self.api.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # modules of the collections are imported on first use
+
+    @functools.cached_property
+    def datasources(self) -> 'Datasources':
+        from minds.datasources import Datasources
+
+        return Datasources(self)
+
+    @functools.cached_property
+    def knowledge_bases(self) -> 'KnowledgeBases':
+        from minds.knowledge_bases import KnowledgeBases
+
+        return KnowledgeBases(self)
+
+    @functools.cached_property
+    def files(self) -> 'Files':
+        from minds.files import Files
+
+        return Files(self)
+
+    @functools.cached_property
+    def minds(self) -> 'Minds':
+        from minds.minds import Minds
+
+        return Minds(self)
+
+    @functools.cached_property
+    def usage(self) -> 'UsageTracker':
+        from minds.usage import UsageTracker
+
+        return UsageTracker(budget=self.budget, mind_budget=self.mind_budget)
+
+    def metrics(self) -> 'MetricsSnapshot':
+        """
+        Snapshot of metrics of the client: duration and errors of operations, HTTP requests by method and status,
+        payload bytes, time to first token of streamed completions
+
+        :return: minds.metrics.MetricsSnapshot, snapshot.to_prometheus() returns Prometheus text format
+        """
+        from minds.metrics import MetricsSnapshot
+
+        if self.api.metrics is None:
+            return MetricsSnapshot({}, {})
+        return self.api.metrics.snapshot()
+
+    def watch(self, resources: List[str] = ('minds', 'datasources', 'knowledge_bases'), interval: float = 5.0,
+              **kwargs) -> 'Watcher':
+        """
+        Watch changes of minds, datasources and knowledge bases. Lists are polled with conditional requests,
+        only added or changed items are hydrated, the interval adapts to the rate of changes.
+
+            for event in client.watch(['minds'], interval=5):
+                print(event.type, event.name, event.item)
+
+        :param resources: names of watched resources: minds, datasources, knowledge_bases
+        :param interval: first interval between polls, seconds
+        :param kwargs: min_interval, max_interval, initial, see minds.watch.Watcher
+        :return: Watcher: iterator of events, async iterator, or watcher.start(callback) in background thread
+        """
+        from minds.watch import Watcher
+
+        return Watcher(self, resources, interval=interval, **kwargs)
+
+    @property
+    def openai_client(self):
+        """
+        OpenAI client to call completions, it is created on first use
+        """
+        if self._openai_client is None:
+            with self._openai_lock:
+                if self._openai_client is None:
+                    from openai import OpenAI
+
+                    self._openai_client = OpenAI(
+                        api_key=self.api.api_key,
+                        base_url=utils.get_openai_base_url(self.api.base_url)
+                    )
+        return self._openai_client
+
+    def _hold_rest_connection(self, barrier):
+        response = self.api.connect()
+        try:
+            barrier.wait()
+        finally:
+            # consumed response returns connection to the pool
+            response.content
+            response.close()
+
+    def _hold_llm_connection(self, barrier):
+        from openai import APIStatusError
+
+        try:
+            with self.openai_client.models.with_streaming_response.list():
+                barrier.wait()
+        except APIStatusError:
+            # any response means that the connection is established, it is kept alive in the pool
+            barrier.wait()
+
+    def warmup(self, connections: int = 1, minds: Union[bool, List[str]] = False, timeout: float = 30) -> dict:
+        """
+        Prepare client for the first requests: resolve DNS, make TLS handshakes and keep
+        connections to the server and to the LLM host in the pools, create OpenAI client.
+
+        :param connections: number of connections to open to each host, limited by pool_size of the client
+        :param minds: prefetch minds to cache: True - all minds, list - names of minds, default is False.
+            Cached minds are returned by client.minds.get(name, cached=True)
+        :param timeout: maximal seconds to wait for connections
+        :return: report: {'ok': bool, 'connections': dict, 'minds': list, 'errors': list, 'elapsed': float}
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        start = time.monotonic()
+        connections = max(1, min(connections, self.api.pool_size))
+
+        errors = []
+        opened = {}
+        with ThreadPoolExecutor(max_workers=connections * 2) as executor:
+            futures = []
+            for kind, hold in (('rest', self._hold_rest_connection), ('llm', self._hold_llm_connection)):
+                # every connection is held until all of them are opened, otherwise they would be reused
+                barrier = threading.Barrier(connections, timeout=timeout)
+
+                def task(hold=hold, barrier=barrier):
+                    try:
+                        hold(barrier)
+                    except threading.BrokenBarrierError:
+                        ...
+                    except Exception:
+                        barrier.abort()
+                        raise
+
+                futures.extend((kind, executor.submit(task)) for _ in range(connections))
+
+            for kind, future in futures:
+                opened.setdefault(kind, 0)
+                error = future.exception()
+                if error is None:
+                    opened[kind] += 1
+                else:
+                    errors.append(f'{kind}: {error}')
+
+        prefetched = []
+        if minds:
+            try:
+                names = None if minds is True else list(minds)
+                prefetched = [mind.name for mind in self.minds.prefetch(names)]
+            except Exception as e:
+                errors.append(f'minds: {e}')
+
+        return {
+            'ok': not errors,
+            'connections': opened,
+            'minds': prefetched,
+            'errors': errors,
+            'elapsed': time.monotonic() - start,
+        }
+
+    async def warmup_async(
+        self, connections: int = 1, minds: Union[bool, List[str]] = False, timeout: float = 30
+    ) -> dict:
+        """
+        Async version of warmup, it is executed in the default executor of the running loop
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.warmup, connections, minds, timeout))
+
+    @instrument('Client.apply')
+    def apply(self, desired_state: Union['DesiredState', dict], prune: bool = False, dry_run: bool = False,
+              max_workers: int = 8) -> Union['Plan', 'ApplyResult']:
+        """
+        Bring datasources, knowledge bases and minds to the desired state.
 
-        self.api = RestAPI(api_key, base_url)
+        Current state is listed once, then only the necessary calls are made: unchanged objects are not touched,
+        single datasource or knowledge base of a mind is attached or detached by one call,
+        other changes of a mind are sent by one patch request.
+        Calls are executed concurrently: datasources and knowledge bases first, then minds, then drops.
 
-        self.datasources = Datasources(self)
-        self.knowledge_bases = KnowledgeBases(self)
+        :param desired_state: minds.reconcile.DesiredState or dict with the same structure, for example loaded from yaml:
+            {'datasources': [...], 'knowledge_bases': [...], 'minds': [...]}
+        :param prune: if true - drop objects missing in the desired state, default is false
+        :param dry_run: if true - return the plan without executing it, default is false
+        :param max_workers: number of concurrent requests
+        :return: plan in dry run mode, otherwise result with executed actions, errors and number of saved calls
+        """
+        from minds.reconcile import Reconciler
 
-        self.minds = Minds(self)
+        reconciler = Reconciler(self)
+        plan = reconciler.plan(desired_state, prune=prune)
+        if dry_run:
+            return plan
+        return reconciler.apply(plan, max_workers=max_workers)
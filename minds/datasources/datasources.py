@@ -3,6 +3,7 @@ from typing import List, Optional, Union
 from pydantic import BaseModel, Field
 import minds.utils as utils
 import minds.exceptions as exc
+from minds.metrics import instrument
 
 
 class DatabaseConfigBase(BaseModel):
@@ -40,6 +41,7 @@ class Datasources:
     def __init__(self, client):
         self.api = client.api
 
+    @instrument('Datasources.create')
     def create(self, ds_config: DatabaseConfig, update=False):
         """
         Create new datasource and return it
@@ -64,6 +66,7 @@ class Datasources:
             self.api.post('/datasources', data=ds_config.model_dump())
         return self.get(name)
 
+    @instrument('Datasources.list')
     def list(self) -> List[Datasource]:
         """
         Returns list of datasources
@@ -80,6 +83,7 @@ class Datasources:
             ds_list.append(Datasource(**item))
         return ds_list
 
+    @instrument('Datasources.get')
     def get(self, name: str) -> Datasource:
         """
         Get datasource by name
@@ -95,6 +99,7 @@ class Datasources:
             raise exc.ObjectNotSupported(f'Wrong type of datasource: {name}')
         return Datasource(**data)
 
+    @instrument('Datasources.drop')
     def drop(self, name: str, force=False):
         """
         Drop datasource by name
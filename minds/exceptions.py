@@ -16,7 +16,10 @@ class Unauthorized(Exception):
 
 
 class UnknownError(Exception):
-    ...
+    def __init__(self, *args, status_code: int = None):
+        super().__init__(*args)
+        # http status of the response, None if the error is not caused by a response
+        self.status_code = status_code
 
 
 class MindNameInvalid(Exception):
@@ -24,4 +27,19 @@ class MindNameInvalid(Exception):
 
 
 class DatasourceNameInvalid(Exception):
-    ...
\ No newline at end of file
+    ...
+
+class BudgetExceeded(Exception):
+    ...
+
+
+class SchedulerTimeout(Exception):
+    ...
+
+
+class IngestionFailed(Exception):
+    ...
+
+
+class CassetteMiss(Exception):
+    ...
@@ -0,0 +1,399 @@
+'''
+Upload of local files to Minds, they can be inserted into knowledge bases by name
+
+The file is memory-mapped and sent in parts by concurrent requests, a part is streamed
+from the mapped memory, the file is never read fully. A failed part is retried on its own.
+Uploaded parts are kept by the server until the upload is completed, the id of the upload
+is saved in a local state file: if the upload is interrupted, the next upload of the same file
+sends only the missing parts.
+
+If the server doesn't support uploads in parts (POST /files/uploads is answered by 404 or 405),
+the file is sent by one multipart/form-data request to PUT /files/{name}, the body is streamed
+from the mapped memory as well.
+'''
+import base64
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+import minds.exceptions as exc
+from minds.knowledge_bases.ingestion import _is_retryable
+from minds.metrics import instrument
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# size of a piece read from the mapped memory by the http client
+_READ_SIZE = 256 * 1024
+
+
+def _default_state_dir() -> str:
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'minds', 'uploads')
+
+
+class File:
+    def __init__(self, name: str, size: int = None, api=None):
+        self.name = name
+        self.size = size
+        self.api = api
+
+    def __repr__(self):
+        return f'File(name={self.name}, size={self.size})'
+
+
+class UploadProgress:
+    def __init__(self, size: int, parts: int):
+        self.size = size
+        self.parts = parts
+        self.uploaded_parts = 0
+        self.uploaded_bytes = 0
+        # parts uploaded before the interruption
+        self.resumed_parts = 0
+        self.retries = 0
+        self.start = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.uploaded_bytes / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f'UploadProgress(parts={self.uploaded_parts + self.resumed_parts}/{self.parts}, '
+            f'bytes={self.uploaded_bytes}, resumed_parts={self.resumed_parts}, retries={self.retries})'
+        )
+
+
+class _PartReader:
+    '''
+    File-like view of a part of the mapped file, the http client reads it by pieces
+    '''
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def __len__(self):
+        return len(self.view) - self.position
+
+    def read(self, size: int = -1) -> bytes:
+        # as in file protocol, without size the rest of the part is read
+        size = len(self) if size is None or size < 0 else min(size, len(self))
+        data = self.view[self.position:self.position + size].tobytes()
+        self.position += size
+        return data
+
+    def __iter__(self):
+        while len(self):
+            yield self.read(_READ_SIZE)
+
+
+class _MultipartBody:
+    '''
+    File-like multipart/form-data body with one file, the file is read from the mapped memory by pieces
+    '''
+
+    def __init__(self, view: memoryview, field: str, filename: str):
+        self.boundary = uuid.uuid4().hex
+        filename = filename.replace('"', '%22')
+        head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._pieces = [_PartReader(memoryview(head)), _PartReader(view), _PartReader(memoryview(tail))]
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return sum(len(piece) for piece in self._pieces)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self)
+        data = b''
+        for piece in self._pieces:
+            if len(data) >= size:
+                break
+            data += piece.read(size - len(data))
+        return data
+
+    def __iter__(self):
+        while len(self):
+            yield self.read(_READ_SIZE)
+
+
+class _UploadState:
+    '''Id of not completed upload of a file, saved to resume it'''
+
+    def __init__(self, state_dir: str, key: str):
+        self.path = os.path.join(state_dir, f'{key}.json')
+
+    def load(self) -> Optional[str]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)['upload_id']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, upload_id: str):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'upload_id': upload_id}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            ...
+
+
+def upload_file(
+    api,
+    path: str,
+    name: str = None,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    retry_delay: float = 0.5,
+    resume: bool = True,
+    state_dir: str = None,
+    on_progress: Callable[[UploadProgress], None] = None,
+) -> File:
+    '''
+    Upload local file in parts, or by one request if the server doesn't support uploads in parts
+
+    :param api: RestAPI object
+    :param path: path to the file
+    :param name: name of the file in Minds, by default name of the local file without extension
+    :param part_size: size of a part, bytes
+    :param max_workers: number of concurrent part uploads
+    :param max_retries: number of retries of a failed part or request
+    :param retry_delay: delay before the first retry, it is doubled on every next one
+    :param resume: continue not completed upload of the same file, default is true
+    :param state_dir: directory of the state files of uploads, default is ~/.cache/minds/uploads
+    :param on_progress: called with UploadProgress after every uploaded part, optional
+    :return: uploaded File
+    '''
+    if part_size <= 0:
+        raise ValueError('part_size must be positive')
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+
+    stat = os.stat(path)
+    size = stat.st_size
+    # any change of the file or of the upload parameters starts a new upload
+    key = hashlib.sha256(
+        f'{api.base_url}|{name}|{os.path.abspath(path)}|{size}|{stat.st_mtime_ns}|{part_size}'.encode()
+    ).hexdigest()
+    state = _UploadState(state_dir or _default_state_dir(), key)
+
+    ranges = [(start, min(start + part_size, size)) for start in range(0, size, part_size)] or [(0, 0)]
+    progress = UploadProgress(size, len(ranges))
+
+    with open(path, 'rb') as f:
+        # empty file can't be mapped
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        view = memoryview(mapped)
+        try:
+            upload_id, uploaded = None, {}
+            if resume:
+                upload_id = state.load()
+                if upload_id is not None:
+                    uploaded = _uploaded_parts(api, upload_id)
+                    if uploaded is None:
+                        # expired on the server
+                        upload_id = None
+
+            if upload_id is None:
+                upload_id = _create_upload(api, name, size, part_size)
+                uploaded = {}
+                if resume and upload_id is not None:
+                    state.save(upload_id)
+
+            if upload_id is None:
+                response = _upload_whole(api, view, path, name, max_retries, retry_delay)
+                progress = UploadProgress(size, 1)
+                progress.uploaded_parts = 1
+                progress.uploaded_bytes = size
+                if on_progress is not None:
+                    on_progress(progress)
+            else:
+                etags = _upload_parts(
+                    api, upload_id, view, ranges, uploaded, progress,
+                    max_workers=max_workers, max_retries=max_retries, retry_delay=retry_delay,
+                    on_progress=on_progress,
+                )
+                response = api.post(f'/files/uploads/{upload_id}/complete', data={
+                    'parts': [{'number': number, 'etag': etags[number]} for number in range(1, len(ranges) + 1)]
+                })
+        finally:
+            view.release()
+            if size:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # a part is still referenced by the traceback, the map is closed when it is collected
+                    ...
+
+    if resume:
+        state.clear()
+    # the files endpoint can answer without a body
+    data = response.json() if response.content else {}
+    return File(data.get('name', name), data.get('size', size), api)
+
+
+def _create_upload(api, name: str, size: int, part_size: int) -> Optional[str]:
+    # id of the new upload, None if the server doesn't support uploads in parts
+    try:
+        response = api.post('/files/uploads', data={'name': name, 'size': size, 'part_size': part_size})
+    except exc.ObjectNotFound:
+        return None
+    except exc.UnknownError as e:
+        if e.status_code == 405:
+            return None
+        raise
+    return response.json()['upload_id']
+
+
+def _upload_whole(api, view: memoryview, path: str, name: str, max_retries: int, retry_delay: float):
+    # the whole file by one request to the files endpoint
+    retries = 0
+    while True:
+        body = _MultipartBody(view, 'file', os.path.basename(path))
+        try:
+            return api.put(f'/files/{name}', body=body, headers={'Content-Type': body.content_type})
+        except Exception as e:
+            if retries >= max_retries or not _is_retryable(e):
+                raise
+            time.sleep(retry_delay * 2 ** retries)
+            retries += 1
+
+
+def _uploaded_parts(api, upload_id: str) -> Optional[dict]:
+    # number -> etag of parts on the server, None if the upload doesn't exist
+    try:
+        data = api.get(f'/files/uploads/{upload_id}').json()
+    except exc.ObjectNotFound:
+        return None
+    return {part['number']: part['etag'] for part in data.get('parts', [])}
+
+
+def _upload_parts(api, upload_id: str, view: memoryview, ranges: List[tuple], uploaded: dict,
+                  progress: UploadProgress, max_workers: int, max_retries: int, retry_delay: float,
+                  on_progress: Callable[[UploadProgress], None] = None) -> dict:
+    lock = threading.Lock()
+    etags = {}
+
+    def upload_part(number: int, start: int, end: int):
+        with view[start:end] as part:
+            digest = hashlib.md5(part)
+            etag = digest.hexdigest()
+            if uploaded.get(number) == etag:
+                # uploaded before the interruption
+                return etag, True
+            headers = {
+                'Content-Type': 'application/octet-stream',
+                'Content-MD5': base64.b64encode(digest.digest()).decode(),
+            }
+            retries = 0
+            while True:
+                try:
+                    response = api.put(
+                        f'/files/uploads/{upload_id}/parts/{number}', body=_PartReader(part), headers=headers
+                    )
+                    break
+                except Exception as e:
+                    if retries >= max_retries or not _is_retryable(e):
+                        raise
+                    time.sleep(retry_delay * 2 ** retries)
+                    retries += 1
+                    with lock:
+                        progress.retries += 1
+        server_etag = response.json().get('etag', etag)
+        if server_etag != etag:
+            raise exc.UnknownError(f'Part {number} of upload {upload_id} is corrupted')
+        return etag, False
+
+    # parts are submitted lazily: after a failure no new parts are sent
+    pending = {}
+    parts = iter(enumerate(ranges, start=1))
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while error is None and len(pending) < max_workers * 2:
+                item = next(parts, None)
+                if item is None:
+                    break
+                number, (start, end) = item
+                pending[executor.submit(upload_part, number, start, end)] = (number, end - start)
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, part_size = pending.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                etag, resumed = future.result()
+                etags[number] = etag
+                if resumed:
+                    progress.resumed_parts += 1
+                else:
+                    progress.uploaded_parts += 1
+                    progress.uploaded_bytes += part_size
+                if on_progress is not None:
+                    on_progress(progress)
+
+    if error is not None:
+        # uploaded parts are kept by the server, the upload can be resumed
+        raise error
+    return etags
+
+
+class Files:
+    def __init__(self, client):
+        self.api = client.api
+
+    @instrument('Files.upload')
+    def upload(self, path: str, name: str = None, **kwargs) -> File:
+        '''
+        Upload local file, it is streamed from disk in parts by concurrent requests.
+        Interrupted upload of the same file is resumed
+
+        :param path: path to the file
+        :param name: name of the file in Minds, by default name of the local file without extension
+        :param kwargs: part_size, max_workers, max_retries, resume, state_dir, on_progress, see upload_file
+        :return: uploaded File
+        '''
+        return upload_file(self.api, path, name=name, **kwargs)
+
+    @instrument('Files.list')
+    def list(self) -> List[File]:
+        data = self.api.get('/files').json()
+        return [File(item['name'], item.get('size'), self.api) for item in data]
+
+    @instrument('Files.get')
+    def get(self, name: str) -> File:
+        data = self.api.get(f'/files/{name}').json()
+        return File(data['name'], data.get('size'), self.api)
+
+    @instrument('Files.drop')
+    def drop(self, name: str):
+        self.api.delete(f'/files/{name}')
@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+from pydantic import BaseModel, Field
+
+
+class HedgingPolicy(BaseModel):
+    '''
+    Configuration of hedged completion requests
+
+    If a completion hasn't produced its first token within the threshold,
+    a duplicate request is sent and the first one to answer is used.
+    '''
+    threshold: Optional[float] = Field(
+        default=None,
+        description='Seconds to wait for the first token before hedging. '
+                    'If not set, the percentile of observed latencies is used',
+        gt=0
+    )
+    percentile: float = Field(
+        default=0.9,
+        description='Percentile of observed first token latencies used as threshold',
+        gt=0,
+        lt=1
+    )
+    min_samples: int = Field(
+        default=20,
+        description='Number of observed latencies required before hedging by percentile',
+        gt=0
+    )
+    window: int = Field(
+        default=1000,
+        description='Number of recent latencies kept to compute the percentile',
+        gt=0
+    )
+    max_hedge_rate: float = Field(
+        default=0.1,
+        description='Maximal fraction of completions that can be hedged',
+        ge=0,
+        le=1
+    )
+    max_workers: int = Field(
+        default=32,
+        description='Size of the thread pool running the requests',
+        gt=0
+    )
+
+
+class _Attempt:
+    '''Result of one request: full response or opened stream with its first chunks'''
+
+    def __init__(self, response, head=None, iterator=None):
+        self.response = response
+        self.head = head
+        self.iterator = iterator
+
+    def close(self):
+        close = getattr(self.response, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+    def result(self, stream: bool):
+        if not stream:
+            return self.response
+        return self._iter_stream()
+
+    def _iter_stream(self):
+        yield from self.head
+        yield from self.iterator
+
+
+def _read_first_token(create: Callable) -> _Attempt:
+    stream = create()
+    iterator = iter(stream)
+    head = []
+    for chunk in iterator:
+        head.append(chunk)
+        if chunk.choices:
+            break
+    return _Attempt(stream, head, iterator)
+
+
+class Hedger:
+    '''
+    Sends hedged completion requests according to the policy and collects statistics
+    '''
+
+    def __init__(self, policy: HedgingPolicy):
+        self.policy = policy
+        self._latencies = deque(maxlen=policy.window)
+        self._executor = ThreadPoolExecutor(max_workers=policy.max_workers, thread_name_prefix='minds-hedge')
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def threshold(self) -> Optional[float]:
+        '''
+        Current time to wait for the first token before hedging
+
+        :return: seconds or None if there are not enough observations yet
+        '''
+        if self.policy.threshold is not None:
+            return self.policy.threshold
+        with self._lock:
+            if len(self._latencies) < self.policy.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(int(len(latencies) * self.policy.percentile), len(latencies) - 1)
+        return latencies[index]
+
+    def stats(self) -> dict:
+        # threshold in effect: fixed or the percentile of observed latencies, None if it is not known yet
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_rate': self.hedges / self.requests if self.requests else 0.0,
+                'threshold': threshold,
+            }
+
+    def _can_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.policy.max_hedge_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _submit(self, create: Callable, stream: bool, observe: bool):
+        start = time.monotonic()
+        if stream:
+            future = self._executor.submit(_read_first_token, create)
+        else:
+            future = self._executor.submit(lambda: _Attempt(create()))
+
+        if observe:
+            def on_done(f):
+                if f.exception() is None:
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - start)
+            future.add_done_callback(on_done)
+        return future
+
+    def run(self, create: Callable, stream: bool = False, on_discard: Callable = None):
+        '''
+        Run the request with hedging
+
+        :param create: function sending the request, it is called twice if the request is hedged
+        :param stream: if true - create returns a stream, first token is its first chunk with choices
+        :param on_discard: called with the response of the loser when it is completed, optional
+        :return: response or iterator of chunks in stream mode
+        '''
+        with self._lock:
+            self.requests += 1
+
+        threshold = self.threshold()
+        primary = self._submit(create, stream, observe=True)
+
+        if threshold is not None:
+            done, _ = wait([primary], timeout=threshold)
+        else:
+            done = {primary}
+            primary.result()
+
+        if primary in done or not self._can_hedge():
+            return primary.result().result(stream)
+
+        hedge = self._submit(create, stream, observe=False)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    if error is None or future is primary:
+                        error = future.exception()
+                    continue
+
+                # the winner is found, cancel the loser
+                for loser in pending:
+                    if not loser.cancel():
+                        loser.add_done_callback(lambda f: self._discard(f, on_discard))
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return future.result().result(stream)
+        raise error
+
+    def _discard(self, future, on_discard: Callable = None):
+        if future.cancelled() or future.exception() is not None:
+            return
+        attempt = future.result()
+        attempt.close()
+        if on_discard is not None:
+            on_discard(attempt.response)
+
+    def _after_fork(self):
+        # threads of the parent process don't exist in the child
+        self._executor = ThreadPoolExecutor(max_workers=self.policy.max_workers, thread_name_prefix='minds-hedge')
+        self._lock = threading.Lock()
+
+    def close(self):
+        '''
+        Stop threads of the hedger, running requests are finished. Hedger can't be used after it
+        '''
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,199 @@
+'''
+Client-side chunking of documents with TextChunkingConfig
+
+The splitter follows the semantics of the server-side text chunking (recursive character splitting):
+text is split by the first separator found in it, splits longer than chunk_size are split recursively
+by the next separators, then neighbour splits are merged into chunks of at most chunk_size characters
+with chunk_overlap characters of overlap. Separators are kept at the start of the following split
+and whitespace is stripped from the chunks.
+'''
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Tuple, Union, TYPE_CHECKING
+
+from minds.knowledge_bases.preprocessing import TextChunkingConfig
+
+if TYPE_CHECKING:
+    from minds.knowledge_bases import KnowledgeBaseDocument
+
+
+class TextChunker:
+    def __init__(self, config: TextChunkingConfig = None):
+        '''
+        :param config: chunking config, default TextChunkingConfig() if not set
+        '''
+        config = config or TextChunkingConfig()
+        if config.chunk_overlap > config.chunk_size:
+            raise ValueError(
+                f'chunk_overlap ({config.chunk_overlap}) must not be larger than chunk_size ({config.chunk_size})'
+            )
+        self.separators = list(config.separators)
+        self.chunk_size = config.chunk_size
+        self.chunk_overlap = config.chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split(text, self.separators)
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[str, int]]:
+        '''
+        :return: list of (chunk, offset of the chunk in the text)
+        '''
+        chunks = []
+        index = 0
+        previous_len = 0
+        for chunk in self.split_text(text):
+            # search from the end of the previous chunk minus overlap
+            index = text.find(chunk, max(0, index + previous_len - self.chunk_overlap))
+            previous_len = len(chunk)
+            chunks.append((chunk, index))
+        return chunks
+
+    def _split(self, text: str, separators: List[str]) -> List[str]:
+        separator = separators[-1]
+        next_separators = []
+        for i, candidate in enumerate(separators):
+            if candidate == '':
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                next_separators = separators[i + 1:]
+                break
+
+        if separator:
+            # separator is kept at the start of the next split
+            parts = text.split(separator)
+            splits = [parts[0]] + [separator + part for part in parts[1:]]
+        else:
+            splits = list(text)
+        splits = [split for split in splits if split != '']
+
+        chunks = []
+        good_splits = []
+        for split in splits:
+            if len(split) < self.chunk_size:
+                good_splits.append(split)
+                continue
+            if good_splits:
+                chunks.extend(self._merge(good_splits))
+                good_splits = []
+            if not next_separators:
+                chunks.append(split)
+            else:
+                chunks.extend(self._split(split, next_separators))
+        if good_splits:
+            chunks.extend(self._merge(good_splits))
+        return chunks
+
+    def _merge(self, splits: List[str]) -> List[str]:
+        # separators are kept in splits, so they are joined without separator
+        chunks = []
+        current = deque()
+        total = 0
+        for split in splits:
+            length = len(split)
+            if total + length > self.chunk_size and current:
+                chunk = ''.join(current).strip()
+                if chunk:
+                    chunks.append(chunk)
+                # keep the tail of the chunk as overlap
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= len(current.popleft())
+            current.append(split)
+            total += length
+        chunk = ''.join(current).strip()
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def chunk_document(self, doc_id: Union[int, str], content: str, metadata: dict = None) -> List[dict]:
+        '''
+        Split the document to chunks
+
+        :return: list of dicts with fields of KnowledgeBaseDocument. Chunk id is '<doc_id>:<chunk_index>',
+            metadata of the chunk is metadata of the document plus _original_doc_id, _chunk_index,
+            _start_char and _end_char
+        '''
+        documents = []
+        for i, (chunk, offset) in enumerate(self.split_text_with_offsets(content)):
+            chunk_metadata = dict(metadata or {})
+            chunk_metadata.update({
+                '_original_doc_id': doc_id,
+                '_chunk_index': i,
+                '_start_char': offset,
+                '_end_char': offset + len(chunk),
+            })
+            documents.append({'id': f'{doc_id}:{i}', 'content': chunk, 'metadata': chunk_metadata})
+        return documents
+
+
+def _chunk_batch(config: TextChunkingConfig, batch: List[tuple]) -> List[dict]:
+    chunker = TextChunker(config)
+    chunks = []
+    for doc_id, content, metadata in batch:
+        chunks.extend(chunker.chunk_document(doc_id, content, metadata))
+    return chunks
+
+
+class _ChunkBatch:
+    # picklable function of one argument for the pool
+    def __init__(self, config: TextChunkingConfig):
+        self.config = config
+
+    def __call__(self, batch: List[tuple]) -> List[dict]:
+        return _chunk_batch(self.config, batch)
+
+
+def _as_tuples(documents: Iterable) -> Iterator[tuple]:
+    # plain tuples are cheaper to send to worker processes than pydantic objects
+    for document in documents:
+        if isinstance(document, dict):
+            yield document['id'], document['content'], document.get('metadata')
+        else:
+            yield document.id, document.content, document.metadata
+
+
+def chunk_documents(
+    documents: Iterable[Union['KnowledgeBaseDocument', dict]],
+    config: TextChunkingConfig = None,
+    processes: int = None,
+    batch_size: int = 100,
+    max_in_flight: int = None,
+    mp_context=None,
+) -> Iterator['KnowledgeBaseDocument']:
+    '''
+    Split documents to chunks in a process pool
+
+    Chunks are yielded lazily in order of the documents, they can be passed to KnowledgeBase.insert_documents.
+
+    :param documents: list or generator of KnowledgeBaseDocument or dicts
+    :param config: chunking config, default TextChunkingConfig() if not set
+    :param processes: number of worker processes, by default number of CPUs. If 1 - chunks in current process
+    :param batch_size: number of documents sent to a worker at once
+    :param max_in_flight: maximal number of submitted batches, by default 2 per process
+    :param mp_context: multiprocessing context, optional
+    :return: iterator of KnowledgeBaseDocument with parent id and offsets in metadata
+    '''
+    from minds.knowledge_bases import KnowledgeBaseDocument
+    from minds.parallel import _batches, _bounded_map
+
+    config = config or TextChunkingConfig()
+    # validate config before starting the pool
+    TextChunker(config)
+    processes = processes or os.cpu_count()
+    batches = _batches(_as_tuples(documents), batch_size)
+
+    if processes == 1:
+        results = (_chunk_batch(config, batch) for batch in batches)
+        for chunks in results:
+            for chunk in chunks:
+                yield KnowledgeBaseDocument(**chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context) as executor:
+        max_in_flight = max_in_flight or processes * 2
+        work = _bounded_map(executor, _ChunkBatch(config), batches, max_in_flight)
+        for chunks in work:
+            for chunk in chunks:
+                yield KnowledgeBaseDocument(**chunk)
@@ -0,0 +1,197 @@
+'''
+Columnar ingestion of pandas DataFrames and Arrow tables
+
+Types of columns are validated once. Rows are serialized to json by vectorized Arrow compute
+functions, column by column: no Python object is created per row. Json of a batch is a slice
+of the data buffer of the serialized rows.
+'''
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+# control characters with short escapes in json, backslash and quote are escaped first
+_ESCAPES = [('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r'), ('\t', '\\t'), ('\b', '\\b'), ('\f', '\\f')]
+_OTHER_CONTROL = r'[\x00-\x07\x0b\x0e-\x1f]'
+
+# number of rows serialized at once
+SERIALIZE_ROWS = 10000
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError:
+        raise ImportError('pyarrow is required to insert DataFrames and Arrow tables: pip install pyarrow')
+    return pyarrow, pyarrow.compute
+
+
+def _kind(data_type) -> Optional[str]:
+    # kind of json value of the arrow type, None if the type is not supported
+    import pyarrow.types as types
+
+    if types.is_dictionary(data_type):
+        return _kind(data_type.value_type)
+    if types.is_string(data_type) or types.is_large_string(data_type):
+        return 'string'
+    if types.is_integer(data_type):
+        return 'integer'
+    if types.is_floating(data_type):
+        return 'float'
+    if types.is_decimal(data_type):
+        return 'decimal'
+    if types.is_boolean(data_type):
+        return 'boolean'
+    if types.is_timestamp(data_type):
+        return 'timestamp'
+    if types.is_date(data_type) or types.is_time(data_type):
+        return 'date'
+    if types.is_null(data_type):
+        return 'null'
+    return None
+
+
+def validate_columns(table, id_col: str, content_col: str, metadata_cols: List[str] = None) -> List[str]:
+    '''
+    Check types of the columns and nulls in id and content
+
+    :param table: pyarrow table
+    :return: metadata columns, by default all columns except id and content
+    '''
+    schema = table.schema
+    names = schema.names
+    if metadata_cols is None:
+        metadata_cols = [name for name in names if name not in (id_col, content_col)]
+    for name in [id_col, content_col] + list(metadata_cols):
+        if name not in names:
+            raise ValueError(f'Column not found: {name}')
+
+    if _kind(schema.field(id_col).type) not in ('integer', 'string'):
+        raise TypeError(f'Id column {id_col} must be integer or string, got {schema.field(id_col).type}')
+    if _kind(schema.field(content_col).type) != 'string':
+        raise TypeError(f'Content column {content_col} must be string, got {schema.field(content_col).type}')
+    for name in metadata_cols:
+        if _kind(schema.field(name).type) is None:
+            raise TypeError(f'Type of metadata column {name} is not supported: {schema.field(name).type}')
+
+    for name in (id_col, content_col):
+        if table.column(name).null_count:
+            raise ValueError(f'Column {name} has nulls')
+    return list(metadata_cols)
+
+
+def _join(*parts):
+    # element-wise concatenation of arrays and literals
+    pa, pc = _import_pyarrow()
+
+    parts = [pa.scalar(part, pa.large_string()) if isinstance(part, str) else part for part in parts]
+    return pc.binary_join_element_wise(*parts, pa.scalar('', pa.large_string()))
+
+
+def _json_strings(column):
+    # quoted and escaped strings
+    pa, pc = _import_pyarrow()
+
+    column = pc.cast(column, pa.large_string())
+    if pc.any(pc.match_substring_regex(column, _OTHER_CONTROL)).as_py():
+        # rare control characters need \\u escapes, the column is escaped by json module
+        return pa.array([None if value is None else json.dumps(value) for value in column.to_pylist()],
+                        pa.large_string())
+    for char, escaped in _ESCAPES:
+        column = pc.replace_substring(column, char, escaped)
+    return _join('"', column, '"')
+
+
+def _isoformat(column):
+    # like datetime.isoformat: fraction of seconds only if it is not zero
+    pa, pc = _import_pyarrow()
+
+    try:
+        column = pc.cast(column, pa.timestamp('s', column.type.tz))
+    except pa.ArrowInvalid:
+        # has fractions
+        ...
+    return pc.strftime(column, format='%Y-%m-%dT%H:%M:%S%Ez' if column.type.tz else '%Y-%m-%dT%H:%M:%S')
+
+
+def _json_values(column, kind: str):
+    # json of every value, nulls are 'null'
+    pa, pc = _import_pyarrow()
+
+    if pa.types.is_dictionary(column.type):
+        column = pc.cast(column, column.type.value_type)
+    if kind == 'null':
+        return pa.array(['null'] * len(column), pa.large_string())
+    if kind == 'string':
+        values = _json_strings(column)
+    elif kind in ('integer', 'decimal', 'boolean'):
+        values = pc.cast(column, pa.large_string())
+    elif kind == 'float':
+        # nan and infinity are not valid json
+        finite = pc.is_finite(column)
+        values = pc.if_else(finite, pc.cast(column, pa.large_string()), pa.scalar(None, pa.large_string()))
+    elif kind == 'timestamp':
+        values = _json_strings(_isoformat(column))
+    else:
+        values = _json_strings(pc.cast(column, pa.large_string()))
+    return pc.fill_null(values, 'null')
+
+
+def serialize_rows(table, id_col: str, content_col: str, metadata_cols: List[str]):
+    '''
+    Serialize rows of the table to json objects of KnowledgeBaseDocument, every row is followed by comma
+
+    :param table: pyarrow table with validated columns
+    :return: pyarrow large string array
+    '''
+    def column(name):
+        data = table.column(name)
+        return data.combine_chunks() if data.num_chunks != 1 else data.chunk(0)
+
+    parts = ['{"id":', _json_values(column(id_col), _kind(table.schema.field(id_col).type))]
+    parts += [',"content":', _json_strings(column(content_col)), ',"metadata":{']
+    for i, name in enumerate(metadata_cols):
+        parts.append((',' if i else '') + json.dumps(name) + ':')
+        parts.append(_json_values(column(name), _kind(table.schema.field(name).type)))
+    parts.append('}},')
+    return _join(*parts)
+
+
+def _offsets(rows) -> Tuple[Any, Any]:
+    # offsets and data buffer of large string array
+    import numpy as np
+
+    _, offsets, data = rows.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[rows.offset:rows.offset + len(rows) + 1]
+    return offsets, data
+
+
+def iter_blocks(table, id_col: str, content_col: str, metadata_cols: List[str], batch_size: int,
+                max_batch_bytes: int) -> Iterator[Tuple[Any, bytes, int]]:
+    '''
+    Serialize the table by slices and cut the serialized rows into batches
+
+    :return: iterator of (slice of the table, json rows joined by comma, number of rows)
+    '''
+    import numpy as np
+
+    # compute functions have overhead per call: small batches are cut from bigger slices
+    slice_rows = max(batch_size, SERIALIZE_ROWS)
+    for start in range(0, table.num_rows, slice_rows):
+        chunk = table.slice(start, slice_rows)
+        rows = serialize_rows(chunk, id_col, content_col, metadata_cols)
+        offsets, data = _offsets(rows)
+        first = 0
+        while first < len(rows):
+            # the most rows fitting into the batch, at least one
+            last = int(np.searchsorted(offsets, offsets[first] + max_batch_bytes, side='right')) - 1
+            last = min(max(last, first + 1), first + batch_size, len(rows))
+            # without comma after the last row
+            blob = data[int(offsets[first]):int(offsets[last]) - 1].to_pybytes()
+            yield chunk.slice(first, last - first), blob, last - first
+            first = last
+
+
+def dataframe_to_table(df):
+    pa, _ = _import_pyarrow()
+
+    return pa.Table.from_pandas(df, preserve_index=False)
@@ -0,0 +1,71 @@
+'''
+Compact encoding of pre-computed embeddings
+
+Vectors are sent as base64 of little-endian float32 values instead of json lists of floats:
+it is ~2.5 times smaller and doesn't need float formatting. A float32 little-endian contiguous buffer
+(numpy array, array.array('f'), memoryview) is encoded directly from its memory, without copying.
+'''
+import array
+import base64
+import sys
+from typing import Any, List, Tuple
+
+EMBEDDING_ENCODING = 'base64_float32_le'
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def float32_le_buffer(vector: Any) -> memoryview:
+    try:
+        view = memoryview(vector)
+    except TypeError:
+        view = None
+
+    if view is not None:
+        if view.format == '<f' or (view.format in ('f', '@f', '=f') and _LITTLE_ENDIAN):
+            if view.ndim != 1:
+                raise ValueError(f'Embedding must be a one-dimensional vector, got {view.ndim} dimensions')
+            if view.c_contiguous:
+                # zero copy
+                return view.cast('B')
+
+    if hasattr(vector, 'astype'):
+        # numpy array of other dtype or not contiguous: one conversion
+        import numpy as np
+
+        vector = np.ascontiguousarray(vector, dtype='<f4')
+        if vector.ndim != 1:
+            raise ValueError(f'Embedding must be a one-dimensional vector, got {vector.ndim} dimensions')
+        return memoryview(vector).cast('B')
+
+    if view is not None and view.format not in ('b', 'B', 'c'):
+        # buffer of other numbers
+        values = view.tolist()
+    elif view is not None:
+        raise ValueError('Bytes are not supported as embedding, use float32 array')
+    else:
+        values = list(vector)
+
+    floats = array.array('f', values)
+    if not _LITTLE_ENDIAN:
+        floats.byteswap()
+    return memoryview(floats).cast('B')
+
+
+def encode_embedding(vector: Any) -> Tuple[bytes, int]:
+    '''
+    Encode vector to base64 of float32 little-endian
+
+    :param vector: numpy array, buffer (array.array, memoryview) or list of floats
+    :return: base64 bytes and number of dimensions
+    '''
+    data = float32_le_buffer(vector)
+    return base64.b64encode(data), data.nbytes // 4
+
+
+def decode_embedding(data: str) -> List[float]:
+    floats = array.array('f')
+    floats.frombytes(base64.b64decode(data))
+    if not _LITTLE_ENDIAN:
+        floats.byteswap()
+    return floats.tolist()
@@ -0,0 +1,197 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, List, Tuple
+
+import minds.exceptions as exc
+
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_BATCH_BYTES = 8 * 1024 * 1024
+
+
+class IngestionProgress:
+    '''Counters of the ingestion, passed to the progress callback and returned when it is finished'''
+
+    def __init__(self):
+        self.documents = 0
+        self.batches = 0
+        self.bytes = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (f'IngestionProgress(documents={self.documents}, '
+                f'batches={self.batches}, '
+                f'bytes={self.bytes}, '
+                f'retries={self.retries}, '
+                f'failed_batches={self.failed_batches}, '
+                f'documents_per_second={self.documents_per_second:.1f})')
+
+
+class _Batch:
+    def __init__(self, index: int):
+        self.index = index
+        self.items = []
+        self.rows = []
+        self.documents = 0
+        self.size = 0
+        self.retries = 0
+
+
+def _is_retryable(error: Exception) -> bool:
+    # server errors, throttling and connection errors (requests exceptions are subclasses of OSError).
+    # Rejected requests (400, 409, 413, 422, ...) would fail again
+    if isinstance(error, exc.UnknownError):
+        return error.status_code is not None and (error.status_code >= 500 or error.status_code == 429)
+    return isinstance(error, OSError)
+
+
+class BatchUploader:
+    '''
+    Sends items in batches from a bounded thread pool
+
+    Items are consumed from the iterable lazily and serialized once. Only batches being sent are kept in memory:
+    while max_in_flight batches are not finished, reading of the iterable is paused.
+    '''
+
+    def __init__(
+        self,
+        send: Callable[[List[bytes]], Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        max_workers: int = 4,
+        max_in_flight: int = None,
+        max_retries: int = 3,
+        retry_delay: float = 0.5,
+        on_progress: Callable[[IngestionProgress], Any] = None,
+        on_batch: Callable[[list], Any] = None,
+    ):
+        '''
+        :param send: function sending serialized rows of one batch
+        :param batch_size: maximal number of items in a batch
+        :param max_batch_bytes: maximal size of serialized items in a batch, a bigger item is sent alone
+        :param max_workers: number of concurrent requests
+        :param max_in_flight: maximal number of batches in memory, by default 2 per worker
+        :param max_retries: number of retries of a failed batch
+        :param retry_delay: delay before the first retry, it is doubled on every next one
+        :param on_progress: called with IngestionProgress after every sent batch, optional
+        :param on_batch: called with the items of every sent batch, optional
+        '''
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        self.send = send
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers * 2
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_progress = on_progress
+        self.on_batch = on_batch
+
+    def _batches(self, items: Iterable, serialize: Callable[[Any], bytes]):
+        batch = _Batch(0)
+        for item in items:
+            row = serialize(item)
+            # +1 for the separator
+            if batch.rows and (len(batch.rows) >= self.batch_size or batch.size + len(row) + 1 > self.max_batch_bytes):
+                yield batch
+                batch = _Batch(batch.index + 1)
+            batch.items.append(item)
+            batch.rows.append(row)
+            batch.documents += 1
+            batch.size += len(row) + 1
+        if batch.rows:
+            yield batch
+
+    def _send(self, batch: _Batch) -> _Batch:
+        while True:
+            try:
+                self.send(batch.rows)
+                return batch
+            except Exception as e:
+                if batch.retries >= self.max_retries or not _is_retryable(e):
+                    raise
+                time.sleep(self.retry_delay * 2 ** batch.retries)
+                batch.retries += 1
+
+    def upload(self, items: Iterable, serialize: Callable[[Any], bytes]) -> IngestionProgress:
+        '''
+        Send all items. If a batch failed after retries, sending of new batches is stopped
+        and the error is raised when the batches in flight are finished
+
+        :param items: iterable or generator of items
+        :param serialize: function converting item to bytes
+        :return: final progress
+        '''
+        return self._upload(self._batches(items, serialize))
+
+    def upload_blocks(self, blocks: Iterable[Tuple[Any, bytes, int]]) -> IngestionProgress:
+        '''
+        Send already serialized batches, every block is sent by one request
+
+        :param blocks: iterable of (items passed to on_batch, serialized rows joined by comma, number of rows)
+        :return: final progress
+        '''
+        def batches():
+            for index, (items, rows, documents) in enumerate(blocks):
+                batch = _Batch(index)
+                batch.items = items
+                batch.rows = [rows]
+                batch.documents = documents
+                batch.size = len(rows)
+                yield batch
+
+        return self._upload(batches())
+
+    def _upload(self, batches: Iterable[_Batch]) -> IngestionProgress:
+        progress = IngestionProgress()
+        start = time.monotonic()
+        error = None
+
+        def collect(done):
+            nonlocal error
+            for future in done:
+                batch = in_flight.pop(future)
+                if future.exception() is not None:
+                    progress.failed_batches += 1
+                    if error is None:
+                        error = future.exception()
+                    continue
+                progress.documents += batch.documents
+                progress.batches += 1
+                progress.bytes += batch.size
+                progress.retries += batch.retries
+                progress.elapsed = time.monotonic() - start
+                if self.on_batch is not None:
+                    self.on_batch(batch.items)
+                if self.on_progress is not None:
+                    self.on_progress(progress)
+
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='minds-ingest') as executor:
+            for batch in batches:
+                in_flight[executor.submit(self._send, batch)] = batch
+                if len(in_flight) >= self.max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if error is not None:
+                    break
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        progress.elapsed = time.monotonic() - start
+        if error is not None:
+            raise error
+        return progress
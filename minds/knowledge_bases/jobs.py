@@ -0,0 +1,269 @@
+'''
+Handles of non-blocking ingestion
+
+The request is sent from a shared background pool, so the calling thread returns immediately.
+Inserts are sent with `Prefer: respond-async` (RFC 7240): if the server accepts the request
+for background processing (202 with Location), the job is polled there with growing intervals.
+Otherwise the job is finished when the request is.
+'''
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Iterable, List, Tuple
+from urllib.parse import urljoin
+
+import minds.exceptions as exc
+from minds.rest_api import _raise_for_status
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+TERMINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+RESPOND_ASYNC = {'Prefer': 'respond-async'}
+
+# number of ingestion requests sent concurrently in background
+MAX_SUBMITTING = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_SUBMITTING, thread_name_prefix='minds-ingest-job')
+    return _executor
+
+
+def _after_fork_in_child():
+    # threads of the parent process don't exist in the child
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class IngestionJob:
+    '''
+    Ingestion running in background
+
+        job = kb.insert_files(files, wait=False)
+        job.status()        # pending, running, completed, failed or cancelled
+        job.wait(timeout=60)
+        job.result()        # raises if the ingestion failed
+        await job           # in async code
+    '''
+
+    def __init__(self, api, submit: Callable[[], Any], min_interval: float = 0.2, max_interval: float = 10.0,
+                 backoff: float = 2.0, on_done: Callable[[], Any] = None):
+        '''
+        :param api: RestAPI object
+        :param submit: function sending the ingestion, it is called in background
+        :param min_interval: first interval of status polling, seconds
+        :param max_interval: maximal interval of status polling, seconds
+        :param backoff: multiplier of the polling interval
+        :param on_done: called once when the job is finished: by the request, or when the final status
+            of the job on the server is received, optional
+        '''
+        self.api = api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._on_done = on_done
+        self._done_lock = threading.Lock()
+
+        # url of the job on the server if it was accepted for background processing
+        self.location = None
+        self._server_status = None
+        self._server_error = None
+        self._result = None
+        self._future = _get_executor().submit(self._run, submit)
+
+    def __repr__(self):
+        return f'IngestionJob(status={self._local_status() or self._server_status}, location={self.location})'
+
+    def _run(self, submit: Callable[[], Any]):
+        try:
+            result = submit()
+        except BaseException:
+            # a part of the ingestion can be sent already
+            self._finish()
+            raise
+        headers = getattr(result, 'headers', None)
+        if getattr(result, 'status_code', None) == 202 and headers and headers.get('Location'):
+            self.location = urljoin(self.api.base_url + '/', headers['Location'])
+            self._server_status = RUNNING
+        else:
+            self._result = result
+            self._finish()
+
+    def _finish(self):
+        with self._done_lock:
+            on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done()
+
+    def _request(self, method: str):
+        response = self.api.session.request(method, self.location, headers=self.api._headers())
+        _raise_for_status(response)
+        return response
+
+    def _local_status(self):
+        # status while the request is not finished, None if the job is on the server
+        if not self._future.done():
+            return RUNNING if self._future.running() else PENDING
+        if self._future.cancelled():
+            return CANCELLED
+        if self._future.exception() is not None:
+            return FAILED
+        if self.location is None:
+            return COMPLETED
+        return None
+
+    def status(self) -> str:
+        '''
+        Current status, the server is requested if the job is processed there
+
+        :return: pending, running, completed, failed or cancelled
+        '''
+        status = self._local_status()
+        if status is not None:
+            return status
+        if self._server_status not in TERMINAL_STATUSES:
+            data = self._request('get').json()
+            status = data.get('status')
+            self._server_status = status if status in TERMINAL_STATUSES else RUNNING
+            self._server_error = data.get('error')
+            if self._server_status in TERMINAL_STATUSES:
+                self._finish()
+        return self._server_status
+
+    def done(self) -> bool:
+        return self.status() in TERMINAL_STATUSES
+
+    def _wait_request(self, timeout: float = None):
+        try:
+            self._future.exception(timeout=timeout)
+        except CancelledError:
+            ...
+
+    def wait(self, timeout: float = None) -> str:
+        '''
+        Wait until the job is finished. The server is polled with growing intervals
+
+        :param timeout: maximal seconds to wait, optional
+        :return: final status, or the current one if timeout is reached
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self.min_interval
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not self._future.done():
+                # waiting for the request itself doesn't need polling
+                try:
+                    self._wait_request(remaining)
+                except FutureTimeout:
+                    return self.status()
+                continue
+
+            status = self.status()
+            if status in TERMINAL_STATUSES or remaining == 0:
+                return status
+            time.sleep(interval if remaining is None else min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_interval)
+
+    def result(self, timeout: float = None) -> Any:
+        '''
+        Wait for the job and return its result
+
+        :param timeout: maximal seconds to wait, optional
+        :return: result of the insert, for example IngestionProgress for insert_documents
+        '''
+        status = self.wait(timeout)
+        if status not in TERMINAL_STATUSES:
+            raise TimeoutError(f'Ingestion is not finished in {timeout} seconds')
+        if status == CANCELLED:
+            raise exc.IngestionFailed('Ingestion is cancelled')
+        if status == FAILED:
+            if self.location is None:
+                raise self._future.exception()
+            raise exc.IngestionFailed(self._server_error or 'Ingestion failed')
+        return self._result
+
+    def cancel(self) -> bool:
+        '''
+        Cancel the job: not sent request is not sent, the job on the server is deleted.
+        A request which is being sent can't be cancelled
+
+        :return: true if cancelled
+        '''
+        if self._future.cancel():
+            return True
+        if self.location is None or self.status() in TERMINAL_STATUSES:
+            return False
+        try:
+            self._request('delete')
+        except exc.UnknownError:
+            # is finished already
+            return False
+        self._server_status = CANCELLED
+        return True
+
+    async def _wait_async(self) -> Any:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        if not self._future.done():
+            try:
+                await asyncio.wrap_future(self._future)
+            except Exception:
+                ...
+        interval = self.min_interval
+        while await loop.run_in_executor(None, self.status) not in TERMINAL_STATUSES:
+            await asyncio.sleep(interval)
+            interval = min(interval * self.backoff, self.max_interval)
+        return self.result()
+
+    def __await__(self):
+        return self._wait_async().__await__()
+
+
+def wait_jobs(jobs: Iterable[IngestionJob], timeout: float = None,
+              min_interval: float = 0.2, max_interval: float = 10.0) -> Tuple[List[IngestionJob], List[IngestionJob]]:
+    '''
+    Wait for many jobs from one thread
+
+    :param jobs: ingestion jobs
+    :param timeout: maximal seconds to wait, optional
+    :param min_interval: first interval of status polling, seconds
+    :param max_interval: maximal interval of status polling, seconds
+    :return: finished and not finished jobs
+    '''
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = list(jobs)
+    done = []
+    interval = min_interval
+    while True:
+        still_pending = []
+        for job in pending:
+            (done if job.done() else still_pending).append(job)
+        if len(still_pending) < len(pending):
+            # something is changed, poll faster
+            interval = min_interval
+        pending = still_pending
+
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if not pending or (remaining is not None and remaining <= 0):
+            return done, pending
+        time.sleep(interval if remaining is None else min(interval, remaining))
+        interval = min(interval * 2, max_interval)
@@ -1,10 +1,23 @@
-from typing import Any, Dict, List, Optional, Union
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union, TYPE_CHECKING
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from minds.knowledge_bases.embeddings import encode_embedding, EMBEDDING_ENCODING
+from minds.knowledge_bases.ingestion import (
+    BatchUploader, IngestionProgress, DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_BYTES
+)
 from minds.knowledge_bases.preprocessing import PreprocessingConfig
+import minds.exceptions as exc
+from minds.metrics import instrument
 from minds.rest_api import RestAPI
 
+if TYPE_CHECKING:
+    from minds.knowledge_bases.jobs import IngestionJob
+    from minds.knowledge_bases.search import SearchCache, SearchResult
+    from minds.knowledge_bases.sync import SyncResult
+    from minds.knowledge_bases.urls import UrlIngestionReport
+
 
 class VectorStoreConfig(BaseModel):
     '''Configuration for the underlying vector store for knowledge base embeddings'''
@@ -18,6 +31,8 @@ class EmbeddingConfig(BaseModel):
     provider: str
     model: str
     params: Optional[Dict[str, Any]] = None
+    # Size of vectors, pre-computed embeddings of inserted documents are validated against it.
+    dimensions: Optional[int] = Field(default=None, gt=0)
 
 
 class KnowledgeBaseConfig(BaseModel):
@@ -36,81 +51,524 @@ class KnowledgeBaseDocument(BaseModel):
     id: Union[int, str]
     content: str
     metadata: Optional[Dict[str, Any]] = {}
+    # Pre-computed embedding: numpy array, buffer of floats (array.array, memoryview) or list of floats.
+    # It is sent as base64 of float32 little-endian values, float32 arrays are encoded without copying.
+    embedding: Optional[Any] = Field(default=None, exclude=True)
+
+
+def _document_serializer(dimensions: int = None) -> Callable[[Union[KnowledgeBaseDocument, dict]], bytes]:
+    # all embeddings of an insert must have the same size: from the config or from the first vector
+    expected = {'dimensions': dimensions}
+
+    def serialize(document: Union[KnowledgeBaseDocument, dict]) -> bytes:
+        if isinstance(document, dict):
+            document = KnowledgeBaseDocument(**document)
+        row = document.model_dump_json().encode()
+        if document.embedding is None:
+            return row
+
+        data, size = encode_embedding(document.embedding)
+        if expected['dimensions'] is None:
+            expected['dimensions'] = size
+        elif size != expected['dimensions']:
+            raise ValueError(
+                f'Embedding of document {document.id} has {size} dimensions, expected {expected["dimensions"]}'
+            )
+        # add encoded vector to the end of the json object
+        return row[:-1] + b',"embedding":{"encoding":"' + EMBEDDING_ENCODING.encode() + b'","data":"' + data + b'"}}'
+
+    return serialize
 
 
 class KnowledgeBase:
-    def __init__(self, name, api: RestAPI):
+    def __init__(self, name, api: RestAPI, embedding_dimensions: int = None):
+        '''
+        :param name: name of the knowledge base
+        :param api: RestAPI object
+        :param embedding_dimensions: size of embedding vectors, to validate pre-computed embeddings, optional
+        '''
         self.name = name
         self.api = api
+        self.embedding_dimensions = embedding_dimensions
+        # is set to false if the server doesn't support batch search
+        self._batch_search = True
+
+    def _update(self, update_request: dict, wait: bool = True) -> Optional['IngestionJob']:
+        url = f'/knowledge_bases/{self.name}'
+        if wait:
+            self.api.put(url, data=update_request)
+            self._invalidate_search_cache()
+            return None
+
+        from minds.knowledge_bases.jobs import IngestionJob, RESPOND_ASYNC
+
+        def submit():
+            response = self.api.put(url, data=update_request, headers=RESPOND_ASYNC)
+            self._invalidate_search_cache()
+            return response
+
+        return IngestionJob(self.api, submit, on_done=self._invalidate_search_cache)
+
+    @property
+    def search_cache(self) -> Optional['SearchCache']:
+        '''
+        Cache of search results, it is shared by all objects of this knowledge base of the client.
+        None if it is not enabled, see enable_search_cache
+        '''
+        from minds.knowledge_bases.search import get_search_cache
+
+        return get_search_cache(self.api, self.name)
+
+    def _invalidate_search_cache(self):
+        cache = self.search_cache
+        if cache is not None:
+            cache.invalidate()
+
+    def enable_search_cache(self, maxsize: int = 1024) -> 'KnowledgeBase':
+        '''
+        Cache search results in memory. The cache is shared by all objects of this knowledge base
+        of the client and is cleared by any insert into it, and again when a background insert is finished
+
+        :param maxsize: maximal number of cached queries, least recently used are evicted
+        :return: this knowledge base
+        '''
+        from minds.knowledge_bases.search import SearchCache, set_search_cache
+
+        set_search_cache(self.api, self.name, SearchCache(maxsize))
+        return self
+
+    @instrument('KnowledgeBase.search')
+    def search(self, query: str, top_k: int = 10, filters: dict = None) -> List['SearchResult']:
+        '''
+        Search chunks relevant to the query
+
+        :param query: text of the query
+        :param top_k: maximal number of results
+        :param filters: metadata filters, for example {'source': 'docs'}, optional
+        :return: list of SearchResult, the most relevant first
+        '''
+        return self.search_batch([query], top_k=top_k, filters=filters)[0]
 
-    def insert_from_select(self, query: str, preprocessing_config: PreprocessingConfig = None):
+    @instrument('KnowledgeBase.search_batch')
+    def search_batch(self, queries: List[Union[str, dict]], top_k: int = 10, filters: dict = None,
+                     batch_size: int = 50, max_workers: int = 8) -> List[List['SearchResult']]:
+        '''
+        Search many queries: up to batch_size queries are sent in one request, batches are sent concurrently.
+        If the server doesn't support batch search, every query is sent by its own concurrent request
+
+        :param queries: texts of queries or dicts with query, top_k and filters
+        :param top_k: maximal number of results of a query without own top_k
+        :param filters: metadata filters of a query without own filters, optional
+        :param batch_size: maximal number of queries in one request
+        :param max_workers: number of concurrent requests
+        :return: list of results of every query
+        '''
+        from minds.knowledge_bases.search import _cache_key, _query_request
+
+        cache = self.search_cache
+        # results of searches started before an insert are not cached
+        generation = cache.generation if cache is not None else None
+
+        requests = [_query_request(query, top_k, filters) for query in queries]
+        results = [None] * len(requests)
+        # cache key -> indexes of the queries, the same query is sent once
+        missing = {}
+        for i, request in enumerate(requests):
+            key = _cache_key(request)
+            cached = cache.get(key) if cache is not None and key not in missing else None
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            to_send = [requests[indexes[0]] for indexes in missing.values()]
+            found = self._search_requests(to_send, batch_size, max_workers)
+            for (key, indexes), query_results in zip(missing.items(), found):
+                for i in indexes:
+                    results[i] = list(query_results)
+                if cache is not None:
+                    cache.put(key, query_results, generation)
+        return results
+
+    def _search_one(self, request: dict) -> List['SearchResult']:
+        from minds.knowledge_bases.search import SearchResult
+
+        data = self.api.post(f'/knowledge_bases/{self.name}/search', data=request).json()
+        return [SearchResult(**item) for item in data['results']]
+
+    def _search_many(self, requests: List[dict]) -> List[List['SearchResult']]:
+        from minds.knowledge_bases.search import SearchResult
+
+        data = self.api.post(f'/knowledge_bases/{self.name}/search/batch', data={'queries': requests}).json()
+        return [[SearchResult(**item) for item in items] for items in data['results']]
+
+    def _search_requests(self, requests: List[dict], batch_size: int,
+                         max_workers: int) -> List[List['SearchResult']]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        if len(requests) == 1:
+            return [self._search_one(requests[0])]
+
+        if self._batch_search:
+            batches = [requests[i:i + batch_size] for i in range(0, len(requests), batch_size)]
+            try:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+                    found = list(executor.map(self._search_many, batches))
+                return [results for batch_results in found for results in batch_results]
+            except exc.ObjectNotFound:
+                batch_not_found = True
+        else:
+            batch_not_found = False
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(requests))) as executor:
+            found = list(executor.map(self._search_one, requests))
+        if batch_not_found:
+            # single search works, so batch endpoint doesn't exist
+            self._batch_search = False
+        return found
+
+    @instrument('KnowledgeBase.insert_from_select')
+    def insert_from_select(self, query: str, preprocessing_config: PreprocessingConfig = None,
+                           wait: bool = True) -> Optional['IngestionJob']:
         '''
         Inserts select content of a connected datasource into this knowledge base
 
         :param query: The SQL SELECT query to use to retrieve content to be inserted
+        :param wait: if false - return IngestionJob immediately, the insert is processed in background
+        :return: IngestionJob if wait is false
         '''
         update_request = {
             'query': query
         }
         if preprocessing_config is not None:
             update_request['preprocessing'] = preprocessing_config.model_dump()
-        _ = self.api.put(f'/knowledge_bases/{self.name}', data=update_request)
-
-    def insert_documents(self, documents: List[KnowledgeBaseDocument], preprocessing_config: PreprocessingConfig = None):
+        return self._update(update_request, wait)
+
+    @instrument('KnowledgeBase.insert_documents')
+    def insert_documents(
+        self,
+        documents: Iterable[Union[KnowledgeBaseDocument, dict]],
+        preprocessing_config: PreprocessingConfig = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Callable[[IngestionProgress], Any] = None,
+        on_batch: Callable[[list], Any] = None,
+        embedding_dimensions: int = None,
+        wait: bool = True,
+    ) -> Union[IngestionProgress, 'IngestionJob']:
         '''
         Inserts documents directly into this knowledge base
 
-        :param documents: The documents to insert
+        Documents are read from the iterable lazily and sent in batches by concurrent requests,
+        only the batches being sent are kept in memory. A failed batch is retried on its own.
+
+        :param documents: The documents to insert, list or generator of KnowledgeBaseDocument or dicts
+        :param preprocessing_config: preprocessing config of the documents, optional
+        :param batch_size: maximal number of documents in one request
+        :param max_batch_bytes: maximal size of serialized documents in one request
+        :param max_workers: number of concurrent requests
+        :param max_retries: number of retries of a failed batch
+        :param on_progress: called with IngestionProgress after every sent batch, optional
+        :param on_batch: called with the documents of every batch committed by the server, optional
+        :param embedding_dimensions: expected size of pre-computed embeddings, by default from embedding config
+            of the knowledge base if it was created by this client, otherwise all vectors must have the same size
+        :param wait: if false - return IngestionJob immediately, documents are sent in background
+            and job.result() returns IngestionProgress
+        :return: IngestionProgress with number of sent documents, batches, bytes and throughput
         '''
-        update_request = {
-            'rows': [d.model_dump() for d in documents]
-        }
-        if preprocessing_config is not None:
-            update_request['preprocessing'] = preprocessing_config.model_dump()
-        _ = self.api.put(f'/knowledge_bases/{self.name}', data=update_request)
+        uploader = BatchUploader(
+            self._rows_sender(preprocessing_config),
+            batch_size=batch_size,
+            max_batch_bytes=max_batch_bytes,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+            on_batch=on_batch,
+        )
+        serialize = _document_serializer(embedding_dimensions or self.embedding_dimensions)
+        if wait:
+            return uploader.upload(documents, serialize)
+
+        from minds.knowledge_bases.jobs import IngestionJob
+
+        return IngestionJob(
+            self.api, lambda: uploader.upload(documents, serialize), on_done=self._invalidate_search_cache
+        )
+
+    @instrument('KnowledgeBase.insert_dataframe')
+    def insert_dataframe(self, df, id_col: str = 'id', content_col: str = 'content', metadata_cols: List[str] = None,
+                         preprocessing_config: PreprocessingConfig = None,
+                         **kwargs) -> Union[IngestionProgress, 'IngestionJob']:
+        '''
+        Inserts rows of a pandas DataFrame into this knowledge base, requires pyarrow
+
+        The frame is converted to an Arrow table, see insert_arrow
 
-    def insert_urls(self, urls: List[str], preprocessing_config: PreprocessingConfig = None):
+        :param df: pandas DataFrame
+        :param id_col: column with ids of the documents, integer or string
+        :param content_col: column with content of the documents, string
+        :param metadata_cols: columns copied to metadata, by default all columns except id and content
+        :param preprocessing_config: preprocessing config of the documents, optional
+        :param kwargs: other arguments of insert_arrow: batch_size, max_workers, on_progress, wait, etc.
+        :return: IngestionProgress, or IngestionJob if wait is false
+        '''
+        from minds.knowledge_bases.columnar import dataframe_to_table
+
+        return self.insert_arrow(dataframe_to_table(df), id_col=id_col, content_col=content_col,
+                                 metadata_cols=metadata_cols, preprocessing_config=preprocessing_config, **kwargs)
+
+    @instrument('KnowledgeBase.insert_arrow')
+    def insert_arrow(
+        self,
+        table,
+        id_col: str = 'id',
+        content_col: str = 'content',
+        metadata_cols: List[str] = None,
+        preprocessing_config: PreprocessingConfig = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        on_progress: Callable[[IngestionProgress], Any] = None,
+        on_batch: Callable[[Any], Any] = None,
+        wait: bool = True,
+    ) -> Union[IngestionProgress, 'IngestionJob']:
+        '''
+        Inserts rows of an Arrow table into this knowledge base
+
+        Column types are validated once. Rows are serialized to json by vectorized Arrow functions,
+        without creating objects per row, it is much faster than insert_documents for large tables.
+
+        :param table: pyarrow Table or RecordBatch
+        :param id_col: column with ids of the documents, integer or string
+        :param content_col: column with content of the documents, string
+        :param metadata_cols: columns copied to metadata, by default all columns except id and content.
+            Supported types: strings, numbers, booleans, decimals, dates and timestamps
+        :param preprocessing_config: preprocessing config of the documents, optional
+        :param batch_size: maximal number of rows in one request
+        :param max_batch_bytes: maximal size of serialized rows in one request
+        :param max_workers: number of concurrent requests
+        :param max_retries: number of retries of a failed batch
+        :param on_progress: called with IngestionProgress after every sent batch, optional
+        :param on_batch: called with the slice of the table of every batch committed by the server, optional
+        :param wait: if false - return IngestionJob immediately, rows are sent in background
+        :return: IngestionProgress, or IngestionJob if wait is false
+        '''
+        from minds.knowledge_bases import columnar
+
+        pa, _ = columnar._import_pyarrow()
+        if isinstance(table, pa.RecordBatch):
+            table = pa.Table.from_batches([table])
+        metadata_cols = columnar.validate_columns(table, id_col, content_col, metadata_cols)
+
+        uploader = BatchUploader(
+            self._rows_sender(preprocessing_config),
+            batch_size=batch_size,
+            max_batch_bytes=max_batch_bytes,
+            max_workers=max_workers,
+            max_retries=max_retries,
+            on_progress=on_progress,
+            on_batch=on_batch,
+        )
+        blocks = columnar.iter_blocks(table, id_col, content_col, metadata_cols, batch_size, max_batch_bytes)
+        if wait:
+            return uploader.upload_blocks(blocks)
+
+        from minds.knowledge_bases.jobs import IngestionJob
+
+        return IngestionJob(
+            self.api, lambda: uploader.upload_blocks(blocks), on_done=self._invalidate_search_cache
+        )
+
+    def _rows_sender(self, preprocessing_config: PreprocessingConfig = None) -> Callable[[List[bytes]], Any]:
+        # rows are serialized once, the request body is joined from them
+        suffix = b']'
+        if preprocessing_config is not None:
+            suffix += b',"preprocessing":' + json.dumps(preprocessing_config.model_dump()).encode()
+        suffix += b'}'
+
+        def send(rows: List[bytes]):
+            body = b'{"rows":[' + b','.join(rows) + suffix
+            self.api.put(f'/knowledge_bases/{self.name}', body=body)
+            self._invalidate_search_cache()
+        return send
+
+    @instrument('KnowledgeBase.insert_from_path')
+    def insert_from_path(
+        self,
+        path: str,
+        format: str = None,
+        id_field: str = None,
+        content_field: str = 'content',
+        metadata_fields: List[str] = None,
+        preprocessing_config: PreprocessingConfig = None,
+        **kwargs
+    ) -> IngestionProgress:
+        '''
+        Inserts records of a local file or directory into this knowledge base
+
+        The file is read as a stream while previous batches are being sent:
+         - jsonl and csv: line by line through mmap
+         - parquet: row group by row group, requires pyarrow
+         - dir: text and markdown files of the directory tree, a file is a document with its relative path as id
+
+        :param path: path to the file or directory
+        :param format: one of: jsonl, csv, parquet, dir. Detected by extension if not set
+        :param id_field: field with id of the document, default is 'id', for directories 'path'
+        :param content_field: field with content of the document, default is 'content'
+        :param metadata_fields: fields copied to metadata, by default all fields except id and content
+        :param preprocessing_config: preprocessing config of the documents, optional
+        :param kwargs: other arguments of insert_documents: batch_size, max_workers, on_progress, etc.
+        :return: IngestionProgress
+        '''
+        from minds.knowledge_bases import readers
+
+        format = format or readers.detect_format(path)
+        if id_field is None:
+            id_field = 'path' if format == 'dir' else 'id'
+
+        columns = None
+        if metadata_fields is not None:
+            columns = [id_field, content_field] + list(metadata_fields)
+
+        records = readers.read_records(path, format=format, columns=columns)
+        documents = (
+            readers.record_to_document(record, number, id_field, content_field, metadata_fields)
+            for number, record in enumerate(records)
+        )
+        return self.insert_documents(documents, preprocessing_config=preprocessing_config, **kwargs)
+
+    @instrument('KnowledgeBase.sync_documents')
+    def sync_documents(
+        self,
+        documents: Iterable[Union[KnowledgeBaseDocument, dict]],
+        manifest: str,
+        preprocessing_config: PreprocessingConfig = None,
+        **kwargs
+    ) -> 'SyncResult':
+        '''
+        Incrementally sync documents with this knowledge base
+
+        A local SQLite manifest keeps hashes of content and metadata of uploaded documents:
+        only new and changed documents are uploaded. Documents uploaded before and missing
+        in the documents are reported in result.deleted. Committed batches are recorded,
+        if the sync is interrupted, the next call with the same manifest resumes it.
+
+        :param documents: all documents of the knowledge base, list or generator of KnowledgeBaseDocument or dicts
+        :param manifest: path to the SQLite manifest file, it is created if not exists
+        :param preprocessing_config: preprocessing config of the documents, optional
+        :param kwargs: other arguments of insert_documents: batch_size, max_workers, on_progress, etc.
+        :return: SyncResult with numbers of uploaded and unchanged documents and ids of deleted ones
+        '''
+        from minds.knowledge_bases.sync import sync_documents
+
+        if kwargs.get('wait') is False:
+            raise ValueError('sync_documents can not be run in background')
+        return sync_documents(self, documents, manifest, preprocessing_config=preprocessing_config, **kwargs)
+
+    @instrument('KnowledgeBase.insert_urls')
+    def insert_urls(
+        self,
+        urls: Iterable[str],
+        preprocessing_config: PreprocessingConfig = None,
+        wait: bool = True,
+        batch_size: int = None,
+        preflight: bool = False,
+        max_workers: int = 4,
+        per_host_limit: int = 2,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        raise_on_error: bool = True,
+    ) -> Union['UrlIngestionReport', 'IngestionJob']:
         '''
         Crawls URLs & inserts the retrieved webpages into this knowledge base
 
+        URLs are deduplicated by their canonical form before sending, the first of duplicates is sent as given,
+        invalid ones are not sent. With batch_size URLs are sent by concurrent requests in batches, URLs of
+        every host are spread evenly between the batches. If a batch is rejected because of its URLs, it is split
+        to find the rejected URLs, a batch failed by the server is retried. Other errors are raised.
+
         :param urls: Valid URLs to crawl & insert
+        :param preprocessing_config: preprocessing config of the webpages, optional
+        :param wait: if false - return IngestionJob immediately, the insert is processed in background
+            and job.result() returns UrlIngestionReport
+        :param batch_size: maximal number of URLs in one request, by default all URLs are sent at once
+        :param preflight: check URLs by HEAD requests before sending, unreachable URLs are not sent
+        :param max_workers: number of concurrent requests
+        :param per_host_limit: maximal number of concurrent preflight requests to one host
+        :param timeout: timeout of a preflight request, seconds
+        :param max_retries: number of retries of a batch failed by the server
+        :param raise_on_error: if false - a batch failed by the server is reported as failed URLs instead of raising,
+            authentication errors and missing knowledge base are raised anyway
+        :return: UrlIngestionReport with status of every URL: ok, failed, invalid, duplicate or unreachable
         '''
-        update_request = {
-            'urls': urls
-        }
-        if preprocessing_config is not None:
-            update_request['preprocessing'] = preprocessing_config.model_dump()
-        _ = self.api.put(f'/knowledge_bases/{self.name}', data=update_request)
-
-    def insert_files(self, files: List[str], preprocessing_config: PreprocessingConfig = None):
+        from minds.knowledge_bases.urls import UrlIngestion
+
+        ingestion = UrlIngestion(
+            self, urls,
+            preprocessing_config=preprocessing_config,
+            batch_size=batch_size,
+            preflight=preflight,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+            timeout=timeout,
+            max_retries=max_retries,
+            raise_on_error=raise_on_error,
+        )
+        if wait:
+            return ingestion.run()
+
+        from minds.knowledge_bases.jobs import IngestionJob
+
+        return IngestionJob(self.api, ingestion.run, on_done=self._invalidate_search_cache)
+
+    @instrument('KnowledgeBase.insert_files')
+    def insert_files(self, files: List[str], preprocessing_config: PreprocessingConfig = None,
+                     wait: bool = True) -> Optional['IngestionJob']:
         '''
         Inserts files that have already been uploaded to MindsDB into this knowledge base
 
         :param files: Names of preuploaded files to insert
+        :param wait: if false - return IngestionJob immediately, the insert is processed in background
+        :return: IngestionJob if wait is false
         '''
         update_request = {
             'files': files
         }
         if preprocessing_config is not None:
             update_request['preprocessing'] = preprocessing_config.model_dump()
-        _ = self.api.put(f'/knowledge_bases/{self.name}', data=update_request)
+        return self._update(update_request, wait)
+
+    @instrument('KnowledgeBase.insert_local_files')
+    def insert_local_files(self, paths: List[str], preprocessing_config: PreprocessingConfig = None,
+                           wait: bool = True, **kwargs) -> Optional['IngestionJob']:
+        '''
+        Uploads local files to MindsDB and inserts them into this knowledge base
+
+        Files are streamed from disk in parts, interrupted uploads are resumed, see client.files.upload.
+        If the server doesn't support uploads in parts, every file is sent by one request
+
+        :param paths: paths to the local files
+        :param preprocessing_config: preprocessing config of the files, optional
+        :param wait: if false - return IngestionJob immediately after the upload, the insert is processed in background
+        :param kwargs: arguments of the upload: part_size, max_workers, max_retries, resume, on_progress, etc.
+        :return: IngestionJob if wait is false
+        '''
+        from minds.files import upload_file
+
+        names = [upload_file(self.api, path, **kwargs).name for path in paths]
+        return self.insert_files(names, preprocessing_config=preprocessing_config, wait=wait)
 
 
 class KnowledgeBases:
     def __init__(self, client):
         self.api = client.api
 
-    def create(self, config: KnowledgeBaseConfig) -> KnowledgeBase:
-        '''
-        Create new knowledge base and return it
-
-        :param config: knowledge base configuration, properties:
-           - name: str, name of knowledge base
-           - description: str, description of the knowledge base. Used by minds to know what data can be retrieved.
-           - vector_store_config: VectorStoreConfig, configuration for embeddings vector store.
-           - embedding_config: EmbeddingConfig, configuration for embeddings.
-        :return: knowledge base object
-        '''
+    @staticmethod
+    def _create_request(config: KnowledgeBaseConfig) -> dict:
         create_request = {
             'name': config.name,
             'description': config.description
@@ -129,15 +587,35 @@ class KnowledgeBases:
             }
             if config.embedding_config.params is not None:
                 embedding_data.update(config.embedding_config.params)
+            if config.embedding_config.dimensions is not None:
+                embedding_data['dimensions'] = config.embedding_config.dimensions
             create_request['embedding_model'] = embedding_data
         if config.preprocessing_config is not None:
             create_request['preprocessing'] = config.preprocessing_config.model_dump()
         if config.params is not None:
             create_request['params'] = config.params
+        return create_request
+
+    @instrument('KnowledgeBases.create')
+    def create(self, config: KnowledgeBaseConfig) -> KnowledgeBase:
+        '''
+        Create new knowledge base and return it
 
+        :param config: knowledge base configuration, properties:
+           - name: str, name of knowledge base
+           - description: str, description of the knowledge base. Used by minds to know what data can be retrieved.
+           - vector_store_config: VectorStoreConfig, configuration for embeddings vector store.
+           - embedding_config: EmbeddingConfig, configuration for embeddings.
+        :return: knowledge base object
+        '''
+        create_request = self._create_request(config)
         _ = self.api.post('/knowledge_bases', data=create_request)
-        return self.get(config.name)
+        knowledge_base = self.get(config.name)
+        if config.embedding_config is not None:
+            knowledge_base.embedding_dimensions = config.embedding_config.dimensions
+        return knowledge_base
 
+    @instrument('KnowledgeBases.list')
     def list(self) -> List[KnowledgeBase]:
         '''
         Returns list of knowledge bases
@@ -153,6 +631,7 @@ class KnowledgeBases:
             all_knowledge_bases.append(KnowledgeBase(knowledge_base['name'], self.api))
         return all_knowledge_bases
 
+    @instrument('KnowledgeBases.get')
     def get(self, name: str) -> KnowledgeBase:
         '''
         Get knowledge base by name
@@ -165,6 +644,7 @@ class KnowledgeBases:
         knowledge_base = knowledge_base_response.json()
         return KnowledgeBase(knowledge_base['name'], self.api)
 
+    @instrument('KnowledgeBases.drop')
     def drop(self, name: str, force=False):
         '''
         Drop knowledge base by name
@@ -177,3 +657,8 @@ class KnowledgeBases:
             data = {'cascade': True}
 
         self.api.delete(f'/knowledge_bases/{name}', data=data)
+
+        from minds.knowledge_bases.search import set_search_cache
+
+        # a new knowledge base with the same name has other content
+        set_search_cache(self.api, name, None)
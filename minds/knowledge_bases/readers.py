@@ -0,0 +1,138 @@
+'''
+Streaming readers of local files for knowledge base ingestion
+
+Records are yielded one by one: JSONL and CSV files are read through mmap line by line,
+Parquet files row group by row group, directories file by file. They are consumed by
+KnowledgeBase.insert_from_path while previous batches are being sent.
+'''
+import csv
+import io
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterator, List
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.markdown', '.rst')
+
+FORMATS = ('jsonl', 'csv', 'parquet', 'dir')
+
+_EXTENSIONS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+}
+
+
+def detect_format(path: str) -> str:
+    if os.path.isdir(path):
+        return 'dir'
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _EXTENSIONS:
+        raise ValueError(f'Unknown format of file: {path}, set it explicitly, supported formats: {FORMATS}')
+    return _EXTENSIONS[extension]
+
+
+def _iter_lines(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty file can't be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b'')
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    for number, line in enumerate(_iter_lines(path), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'Invalid json in {path}, line {number}: {e}')
+
+
+def read_csv(path: str, encoding: str = 'utf-8') -> Iterator[Dict[str, Any]]:
+    # csv reader joins lines of quoted values with line breaks itself
+    lines = (line.decode(encoding) for line in _iter_lines(path))
+    yield from csv.DictReader(lines)
+
+
+def read_parquet(path: str, columns: List[str] = None) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required to read parquet files: pip install pyarrow')
+
+    parquet_file = pq.ParquetFile(path)
+    for i in range(parquet_file.num_row_groups):
+        yield from parquet_file.read_row_group(i, columns=columns).to_pylist()
+
+
+def read_dir(path: str, extensions=TEXT_EXTENSIONS, encoding: str = 'utf-8') -> Iterator[Dict[str, Any]]:
+    for root, dirs, files in os.walk(path):
+        # stable order
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(tuple(extensions)):
+                continue
+            file_path = os.path.join(root, name)
+            with io.open(file_path, encoding=encoding) as f:
+                content = f.read()
+            yield {
+                'path': os.path.relpath(file_path, path).replace(os.sep, '/'),
+                'content': content,
+                'size': len(content),
+            }
+
+
+def read_records(path: str, format: str = None, columns: List[str] = None) -> Iterator[Dict[str, Any]]:
+    '''
+    Read records of the file or directory
+
+    :param path: path to the file or directory
+    :param format: one of: jsonl, csv, parquet, dir. Detected by extension if not set
+    :param columns: columns to read from parquet file, optional
+    :return: iterator of dicts
+    '''
+    format = format or detect_format(path)
+    if format == 'jsonl':
+        return read_jsonl(path)
+    if format == 'csv':
+        return read_csv(path)
+    if format == 'parquet':
+        return read_parquet(path, columns=columns)
+    if format == 'dir':
+        return read_dir(path)
+    raise ValueError(f'Unknown format: {format}, supported formats: {FORMATS}')
+
+
+def record_to_document(
+    record: Dict[str, Any],
+    number: int,
+    id_field: str = 'id',
+    content_field: str = 'content',
+    metadata_fields: List[str] = None,
+) -> dict:
+    '''
+    Map record to fields of KnowledgeBaseDocument
+
+    :param record: read record
+    :param number: position of the record, for error messages
+    :param id_field: field with id of the document
+    :param content_field: field with content of the document
+    :param metadata_fields: fields copied to metadata, by default all fields except id and content
+    :return: dict with id, content and metadata
+    '''
+    if id_field not in record:
+        raise ValueError(f'Record {number} has no id field: {id_field}')
+    if content_field not in record:
+        raise ValueError(f'Record {number} has no content field: {content_field}')
+
+    if metadata_fields is None:
+        metadata = {key: value for key, value in record.items() if key not in (id_field, content_field)}
+    else:
+        metadata = {key: record.get(key) for key in metadata_fields}
+
+    return {'id': record[id_field], 'content': record[content_field], 'metadata': metadata}
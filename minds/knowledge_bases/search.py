@@ -0,0 +1,114 @@
+'''
+Direct search in a knowledge base, without completion of a mind
+
+Many queries are sent in one request to the batch endpoint. If the server doesn't support it,
+they are sent by concurrent requests. Results can be cached in memory, the cache of a knowledge base
+is shared by all its objects of the client and is invalidated by any insert into it.
+'''
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+DEFAULT_TOP_K = 10
+
+
+class SearchResult(BaseModel):
+    id: Union[int, str]
+    content: str
+    metadata: Optional[Dict[str, Any]] = None
+    # similarity of the chunk to the query, higher is better
+    relevance: Optional[float] = None
+    distance: Optional[float] = None
+
+
+def _query_request(query: Union[str, dict], top_k: int = DEFAULT_TOP_K, filters: dict = None) -> dict:
+    # query is text or dict with query, top_k and filters
+    if isinstance(query, dict):
+        request = {'query': query['query'], 'top_k': query.get('top_k', top_k)}
+        filters = query.get('filters', filters)
+    else:
+        request = {'query': query, 'top_k': top_k}
+    if filters:
+        request['filters'] = filters
+    return request
+
+
+def _cache_key(request: dict) -> Tuple:
+    filters = request.get('filters')
+    return request['query'], request['top_k'], json.dumps(filters, sort_keys=True) if filters else None
+
+
+class SearchCache:
+    '''
+    LRU cache of search results
+
+    Inserts increment the generation: results of searches started before the insert are not cached.
+    '''
+
+    def __init__(self, maxsize: int = 1024):
+        '''
+        :param maxsize: maximal number of cached queries
+        '''
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: Tuple) -> Optional[List[SearchResult]]:
+        with self._lock:
+            results = self._items.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def put(self, key: Tuple, results: List[SearchResult], generation: int):
+        with self._lock:
+            if generation != self.generation:
+                # knowledge base is changed during the search
+                return
+            self._items[key] = results
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
+
+
+# RestAPI of the client -> name of knowledge base -> SearchCache
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_search_cache(api, name: str) -> Optional[SearchCache]:
+    '''
+    :return: cache of the knowledge base of the client, None if it is not enabled
+    '''
+    with _caches_lock:
+        return _caches.get(api, {}).get(name)
+
+
+def set_search_cache(api, name: str, cache: Optional[SearchCache]):
+    '''
+    Set or remove (if cache is None) cache of the knowledge base of the client
+    '''
+    with _caches_lock:
+        caches = _caches.setdefault(api, {})
+        if cache is None:
+            caches.pop(name, None)
+        else:
+            caches[name] = cache
@@ -0,0 +1,189 @@
+'''
+Incremental sync of documents with a knowledge base
+
+A local SQLite manifest keeps a hash of content and metadata of every uploaded document.
+Only new and changed documents are uploaded, documents missing in the run are reported as deleted.
+Hashes of uploaded documents are stored when their batch is committed by the server,
+so an interrupted run is resumed without uploading committed batches again.
+'''
+import hashlib
+import json
+import sqlite3
+from typing import Any, Iterable, Iterator, List, Tuple, Union
+
+from minds.knowledge_bases.embeddings import float32_le_buffer
+from minds.knowledge_bases.ingestion import IngestionProgress
+
+
+def document_hash(content: str, metadata: dict = None, embedding: Any = None) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(content.encode())
+    h.update(b'\0')
+    if metadata:
+        h.update(json.dumps(metadata, sort_keys=True, separators=(',', ':'), default=str).encode())
+    if embedding is not None:
+        h.update(b'\0')
+        h.update(float32_le_buffer(embedding))
+    return h.digest()
+
+
+class SyncResult:
+    def __init__(self, uploaded: int, unchanged: int, deleted: List[Any], resumed: bool,
+                 progress: IngestionProgress):
+        self.uploaded = uploaded
+        self.unchanged = unchanged
+        # ids of documents which were uploaded before but are missing in this run
+        self.deleted = deleted
+        self.resumed = resumed
+        self.progress = progress
+
+    def __repr__(self):
+        return (f'SyncResult(uploaded={self.uploaded}, '
+                f'unchanged={self.unchanged}, '
+                f'deleted={len(self.deleted)}, '
+                f'resumed={self.resumed})')
+
+
+class Manifest:
+    '''
+    Hashes of documents uploaded to knowledge bases
+
+    Every sync is a run. Documents seen in the run are marked with its number,
+    the run is finished when all documents are uploaded.
+    '''
+
+    # unchanged documents are marked as seen by this number of rows in one transaction
+    MARK_BATCH = 1000
+
+    def __init__(self, path: str):
+        '''
+        :param path: path to the SQLite file, it is created if not exists
+        '''
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                kb TEXT NOT NULL,
+                id TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                run INTEGER NOT NULL,
+                PRIMARY KEY (kb, id)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                kb TEXT PRIMARY KEY,
+                run INTEGER NOT NULL,
+                finished INTEGER NOT NULL
+            );
+        ''')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start_run(self, kb: str) -> Tuple[int, bool]:
+        '''
+        Start a new run or resume the unfinished one
+
+        :return: number of the run and true if it is resumed
+        '''
+        row = self.conn.execute('SELECT run, finished FROM runs WHERE kb = ?', (kb,)).fetchone()
+        if row is not None and not row[1]:
+            return row[0], True
+        run = row[0] + 1 if row is not None else 1
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO runs (kb, run, finished) VALUES (?, ?, 0)', (kb, run))
+        return run, False
+
+    def get_hash(self, kb: str, doc_id: str) -> Union[bytes, None]:
+        row = self.conn.execute('SELECT hash FROM documents WHERE kb = ? AND id = ?', (kb, doc_id)).fetchone()
+        return row[0] if row is not None else None
+
+    def mark_seen(self, kb: str, run: int, doc_ids: List[str]):
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE documents SET run = ? WHERE kb = ? AND id = ?',
+                ((run, kb, doc_id) for doc_id in doc_ids)
+            )
+
+    def commit(self, kb: str, run: int, hashes: List[tuple]):
+        '''
+        Store hashes of uploaded documents
+
+        :param hashes: list of (id, hash)
+        '''
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO documents (kb, id, hash, run) VALUES (?, ?, ?, ?)',
+                ((kb, doc_id, doc_hash, run) for doc_id, doc_hash in hashes)
+            )
+
+    def finish_run(self, kb: str, run: int) -> List[str]:
+        '''
+        Finish the run and remove documents which were not seen in it
+
+        :return: ids of removed documents
+        '''
+        with self.conn:
+            deleted = [
+                row[0] for row in
+                self.conn.execute('SELECT id FROM documents WHERE kb = ? AND run < ?', (kb, run))
+            ]
+            self.conn.execute('DELETE FROM documents WHERE kb = ? AND run < ?', (kb, run))
+            self.conn.execute('UPDATE runs SET finished = 1 WHERE kb = ?', (kb,))
+        return deleted
+
+
+def sync_documents(knowledge_base, documents: Iterable, manifest_path: str, **insert_kwargs) -> SyncResult:
+    '''
+    Upload only new and changed documents to the knowledge base
+
+    :param knowledge_base: KnowledgeBase object
+    :param documents: iterable of KnowledgeBaseDocument or dicts, all documents of the knowledge base
+    :param manifest_path: path to the SQLite manifest
+    :param insert_kwargs: arguments of insert_documents
+    :return: SyncResult
+    '''
+    from minds.knowledge_bases import KnowledgeBaseDocument
+
+    kb = knowledge_base.name
+    counts = {'uploaded': 0, 'unchanged': 0}
+
+    with Manifest(manifest_path) as manifest:
+        run, resumed = manifest.start_run(kb)
+
+        def changed_documents() -> Iterator[KnowledgeBaseDocument]:
+            seen = []
+            for document in documents:
+                if isinstance(document, dict):
+                    document = KnowledgeBaseDocument(**document)
+                # distinguish 1 and '1'
+                doc_id = json.dumps(document.id)
+                doc_hash = document_hash(document.content, document.metadata, document.embedding)
+                if manifest.get_hash(kb, doc_id) == doc_hash:
+                    counts['unchanged'] += 1
+                    seen.append(doc_id)
+                    if len(seen) >= Manifest.MARK_BATCH:
+                        manifest.mark_seen(kb, run, seen)
+                        seen = []
+                    continue
+                yield document
+            manifest.mark_seen(kb, run, seen)
+
+        def on_batch(batch: List[KnowledgeBaseDocument]):
+            manifest.commit(kb, run, [
+                (json.dumps(document.id), document_hash(document.content, document.metadata, document.embedding))
+                for document in batch
+            ])
+            counts['uploaded'] += len(batch)
+
+        progress = knowledge_base.insert_documents(changed_documents(), on_batch=on_batch, **insert_kwargs)
+        deleted = [json.loads(doc_id) for doc_id in manifest.finish_run(kb, run)]
+
+    return SyncResult(counts['uploaded'], counts['unchanged'], deleted, resumed, progress)
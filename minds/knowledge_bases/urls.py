@@ -0,0 +1,329 @@
+'''
+URL ingestion pipeline for KnowledgeBase.insert_urls
+
+ - URLs are deduplicated on the client side by their canonical form, the first of duplicates is sent as given
+ - optional preflight: concurrent HEAD requests with limited concurrency per host
+ - valid URLs are sharded into batches with hosts spread evenly between them
+ - batches are submitted in parallel, a batch rejected because of its URLs (400, 422 with URLs in the error)
+   is split to find the rejected URLs, a batch failed by the server (5xx, 429) is retried as a whole
+ - other errors are raised, or reported as failed URLs with raise_on_error=False
+'''
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import minds.exceptions as exc
+from minds.knowledge_bases.ingestion import _is_retryable
+
+OK = 'ok'
+FAILED = 'failed'
+INVALID = 'invalid'
+DUPLICATE = 'duplicate'
+UNREACHABLE = 'unreachable'
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+# statuses of a batch rejected because of its URLs
+_REJECTED_STATUSES = (400, 422)
+# rejected batch is split at most this number of times, 2 ** 12 URLs are resolved to single ones
+_MAX_SPLIT_DEPTH = 12
+_UNRESERVED = re.compile(r'[A-Za-z0-9\-._~]')
+
+
+def _normalize_escape(match) -> str:
+    char = chr(int(match.group(0)[1:], 16))
+    if _UNRESERVED.fullmatch(char):
+        return char
+    return match.group(0).upper()
+
+
+def _remove_dot_segments(path: str) -> str:
+    segments = []
+    parts = path.split('/')
+    for part in parts:
+        if part == '.':
+            continue
+        if part == '..':
+            if len(segments) > 1:
+                segments.pop()
+            continue
+        segments.append(part)
+    if parts[-1] in ('.', '..'):
+        # directory reference keeps trailing slash
+        segments.append('')
+    return '/'.join(segments)
+
+
+def canonicalize_url(url: str) -> str:
+    '''
+    Canonical form of http(s) URL: lowercase scheme and host, no default port and fragment,
+    resolved dot segments, normalized percent-escapes, sorted query parameters.
+    It is a key of deduplication, it can address another page than the URL
+
+    :param url: url
+    :return: canonical url
+    '''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS:
+        raise ValueError(f'Only http and https URLs are supported: {url}')
+    if not parts.hostname:
+        raise ValueError(f'URL without host: {url}')
+
+    host = parts.hostname.rstrip('.')
+    if ':' in host:
+        # ipv6
+        host = f'[{host}]'
+    else:
+        host = host.encode('idna').decode('ascii')
+    # raises ValueError if port is invalid
+    port = parts.port
+    netloc = host if port is None or port == _DEFAULT_PORTS[scheme] else f'{host}:{port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{userinfo}@{netloc}'
+
+    path = re.sub(r'%[0-9a-fA-F]{2}', _normalize_escape, parts.path)
+    path = _remove_dot_segments(path) or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+class UrlResult:
+    def __init__(self, url: str, canonical: str = None, status: str = None, error: str = None,
+                 original: 'UrlResult' = None):
+        self.url = url
+        self.canonical = canonical
+        self.status = status
+        self.error = error
+        # result of the sent url for a duplicate
+        self.original = original
+
+    def __repr__(self):
+        text = f'UrlResult(url={self.url}, status={self.status}'
+        if self.error:
+            text += f', error={self.error}'
+        return text + ')'
+
+
+class UrlIngestionReport:
+    '''Result of every input URL: ok, failed, invalid, duplicate or unreachable'''
+
+    def __init__(self, results: List[UrlResult], batches: int, elapsed: float):
+        self.results = results
+        self.batches = batches
+        self.elapsed = elapsed
+
+    def by_status(self, status: str) -> List[UrlResult]:
+        return [result for result in self.results if result.status == status]
+
+    @property
+    def ok(self) -> bool:
+        return all(
+            result.status == OK or (result.status == DUPLICATE and result.original.status == OK)
+            for result in self.results
+        )
+
+    def counts(self) -> Dict[str, int]:
+        counts = {}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def __repr__(self):
+        return f'UrlIngestionReport(batches={self.batches}, counts={self.counts()})'
+
+
+def shard_urls(urls: List[str], batch_size: int) -> List[List[str]]:
+    '''
+    Split URLs into batches, URLs of every host are spread evenly between the batches
+
+    :param urls: canonical URLs
+    :param batch_size: maximal size of a batch
+    :return: list of batches
+    '''
+    by_host = OrderedDict()
+    for url in urls:
+        by_host.setdefault(urlsplit(url).netloc, []).append(url)
+
+    # round-robin over hosts
+    interleaved = []
+    queues = [iter(host_urls) for host_urls in by_host.values()]
+    while queues:
+        active = []
+        for queue in queues:
+            url = next(queue, None)
+            if url is not None:
+                interleaved.append(url)
+                active.append(queue)
+        queues = active
+
+    batches_count = -(-len(interleaved) // batch_size)
+    # i-th batch takes every batches_count-th url, so hosts are spread evenly
+    return [interleaved[i::batches_count] for i in range(batches_count)]
+
+
+class Preflight:
+    '''
+    Concurrent HEAD requests with limited number of concurrent requests to each host
+
+    Requests are sent without credentials of Minds API.
+    '''
+
+    def __init__(self, max_workers: int = 16, per_host_limit: int = 2, timeout: float = 10.0):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._semaphores[host]
+
+    def _check(self, session, url: str) -> Optional[str]:
+        with self._host_semaphore(url):
+            try:
+                response = session.head(url, timeout=self.timeout, allow_redirects=True)
+                if response.status_code in (405, 501):
+                    # HEAD is not supported
+                    response = session.get(url, timeout=self.timeout, stream=True)
+                    response.close()
+            except Exception as e:
+                return str(e)
+        if response.status_code >= 400:
+            return f'HTTP {response.status_code}'
+        return None
+
+    def check(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        '''
+        :return: url -> error, None if url is reachable
+        '''
+        import requests
+
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            errors = executor.map(lambda url: self._check(session, url), urls)
+            return dict(zip(urls, errors))
+
+
+class UrlIngestion:
+    def __init__(self, knowledge_base, urls: Iterable[str], preprocessing_config=None, batch_size: int = None,
+                 preflight: bool = False, max_workers: int = 4, per_host_limit: int = 2, timeout: float = 10.0,
+                 max_retries: int = 3, retry_delay: float = 0.5, raise_on_error: bool = True):
+        self.knowledge_base = knowledge_base
+        self.urls = list(urls)
+        self.preprocessing_config = preprocessing_config
+        self.batch_size = batch_size
+        self.preflight = preflight
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.raise_on_error = raise_on_error
+
+    def _update(self, urls: List[str]):
+        update_request = {'urls': urls}
+        if self.preprocessing_config is not None:
+            update_request['preprocessing'] = self.preprocessing_config.model_dump()
+        retries = 0
+        while True:
+            try:
+                return self.knowledge_base._update(update_request)
+            except Exception as e:
+                if retries >= self.max_retries or not _is_retryable(e):
+                    raise
+                time.sleep(self.retry_delay * 2 ** retries)
+                retries += 1
+
+    @staticmethod
+    def _rejects_urls(error: exc.UnknownError, urls: List[str]) -> bool:
+        # the batch is rejected because of its URLs, not because of the request
+        if error.status_code not in _REJECTED_STATUSES:
+            return False
+        message = str(error)
+        return 'url' in message.lower() or any(url in message for url in urls)
+
+    def _send(self, batch: List[str], results: Dict[str, List[UrlResult]], depth: int = 0):
+        # batch of canonical urls, the first input url of every one is sent
+        urls = [results[canonical][0].url.strip() for canonical in batch]
+        try:
+            self._update(urls)
+        except exc.UnknownError as e:
+            if not self._rejects_urls(e, urls):
+                if self.raise_on_error:
+                    raise
+            elif len(batch) > 1 and depth < _MAX_SPLIT_DEPTH:
+                # find rejected urls: halves are sent separately
+                middle = len(batch) // 2
+                self._send(batch[:middle], results, depth + 1)
+                self._send(batch[middle:], results, depth + 1)
+                return
+            error = str(e)
+            status = FAILED
+        except OSError as e:
+            # connection errors after retries
+            if self.raise_on_error:
+                raise
+            error = str(e)
+            status = FAILED
+        else:
+            error = None
+            status = OK
+
+        for canonical in batch:
+            for result in results[canonical]:
+                result.status = status
+                result.error = error
+
+    def run(self) -> UrlIngestionReport:
+        start = time.monotonic()
+        results = []
+        # canonical url -> results of input urls, the first one is sent
+        to_send = OrderedDict()
+        for url in self.urls:
+            result = UrlResult(url)
+            results.append(result)
+            try:
+                result.canonical = canonicalize_url(url)
+            except ValueError as e:
+                result.status = INVALID
+                result.error = str(e)
+                continue
+            if result.canonical in to_send:
+                result.status = DUPLICATE
+                result.original = to_send[result.canonical][0]
+                continue
+            to_send[result.canonical] = [result]
+
+        if self.preflight and to_send:
+            checker = Preflight(
+                max_workers=max(self.max_workers, 16), per_host_limit=self.per_host_limit, timeout=self.timeout
+            )
+            sent_urls = {canonical: url_results[0].url.strip() for canonical, url_results in to_send.items()}
+            errors = checker.check(list(sent_urls.values()))
+            for canonical, url in sent_urls.items():
+                if errors[url] is not None:
+                    for result in to_send.pop(canonical):
+                        result.status = UNREACHABLE
+                        result.error = errors[url]
+
+        batches = []
+        if to_send:
+            # canonical urls are sharded: hosts are compared in normalized form
+            batches = shard_urls(list(to_send), self.batch_size or len(to_send))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # authentication errors and missing knowledge base are raised
+                list(executor.map(lambda batch: self._send(batch, to_send), batches))
+
+        for result in results:
+            if result.original is not None:
+                # duplicate has the outcome of the sent url
+                result.error = result.original.error
+        return UrlIngestionReport(results, len(batches), time.monotonic() - start)
@@ -0,0 +1,942 @@
+'''
+Local stand-in for Minds server
+
+Emulates REST endpoints used by the SDK and OpenAI compatible chat endpoint.
+State is kept in memory. It is used for benchmarks and tests:
+
+    with LocalServer(latency=0.01) as server:
+        client = Client('any_key', base_url=server.url)
+
+Latencies can be random and faults can be injected to test retries, concurrency and streaming:
+
+    LocalServer(latency='lognormal:0.05,0.5', error_rate=0.01, rate_limit=100, slow_stream_rate=0.1, seed=1)
+
+Or run it standalone:
+
+    python -m minds.local_server --port 8000 --latency uniform:0.01,0.05 --error-rate 0.01
+'''
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+from urllib.parse import urlparse
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+
+
+class Latency:
+    '''
+    Distribution of delays in seconds, it is parsed from a number or a string:
+
+        0.01                    fixed
+        'uniform:0.01,0.05'     uniform between low and high
+        'exponential:0.02'      exponential with the mean
+        'normal:0.05,0.01'      normal with the mean and standard deviation, negative values are 0
+        'lognormal:0.05,0.5'    log-normal with the median and sigma, long tail
+    '''
+    KINDS = {'fixed': 1, 'uniform': 2, 'exponential': 1, 'normal': 2, 'lognormal': 2}
+
+    def __init__(self, kind: str = 'fixed', *params: float):
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown latency distribution: {kind}, expected one of: {", ".join(self.KINDS)}')
+        if len(params) != self.KINDS[kind]:
+            raise ValueError(f'Latency distribution {kind} has {self.KINDS[kind]} parameters, got {len(params)}')
+        if any(param < 0 for param in params):
+            raise ValueError(f'Parameters of latency must not be negative: {params}')
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, value: Union[float, str, 'Latency']) -> 'Latency':
+        if isinstance(value, Latency):
+            return value
+        if isinstance(value, (int, float)):
+            return cls('fixed', float(value))
+        kind, _, params = value.partition(':')
+        if not params:
+            return cls('fixed', float(kind))
+        return cls(kind.strip(), *(float(param) for param in params.split(',')))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(*self.params)
+        if self.kind == 'exponential':
+            mean = self.params[0]
+            return rng.expovariate(1 / mean) if mean > 0 else 0.0
+        if self.kind == 'normal':
+            return max(0.0, rng.normalvariate(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __bool__(self):
+        return any(self.params)
+
+    def __str__(self):
+        if self.kind == 'fixed':
+            return str(self.params[0])
+        return f'{self.kind}:' + ','.join(str(param) for param in self.params)
+
+    def __repr__(self):
+        return f'Latency({str(self)!r})'
+
+
+class _RateLimiter:
+    '''Token bucket: requests per second with burst of one second, at least one request'''
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        # with rate below 1 the bucket still has to hold a whole token
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> Optional[float]:
+        '''
+        :return: None if the request is allowed, otherwise seconds to wait for the next token
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+
+class _State:
+    '''In-memory objects of the server'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.datasources = {}
+        self.knowledge_bases = {}
+        self.documents = {}
+        # knowledge base -> crawled urls
+        self.urls = {}
+        # name -> uploaded file
+        self.files = {}
+        # id -> not completed upload of a file
+        self.uploads = {}
+        # asynchronous inserts: id -> job
+        self.jobs = {}
+        # project -> name -> mind
+        self.minds = {}
+
+    def project_minds(self, project):
+        return self.minds.setdefault(project, {})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    routes = [
+        ('GET', r'/api/datasources', 'list_datasources'),
+        ('POST', r'/api/datasources', 'create_datasource'),
+        ('GET', r'/api/datasources/(?P<name>[^/]+)', 'get_datasource'),
+        ('PUT', r'/api/datasources/(?P<name>[^/]+)', 'update_datasource'),
+        ('DELETE', r'/api/datasources/(?P<name>[^/]+)', 'drop_datasource'),
+
+        ('GET', r'/api/knowledge_bases', 'list_knowledge_bases'),
+        ('POST', r'/api/knowledge_bases', 'create_knowledge_base'),
+        ('GET', r'/api/knowledge_bases/(?P<name>[^/]+)', 'get_knowledge_base'),
+        ('PUT', r'/api/knowledge_bases/(?P<name>[^/]+)', 'insert_knowledge_base'),
+        ('DELETE', r'/api/knowledge_bases/(?P<name>[^/]+)', 'drop_knowledge_base'),
+        ('POST', r'/api/knowledge_bases/(?P<name>[^/]+)/search', 'search_knowledge_base'),
+        ('POST', r'/api/knowledge_bases/(?P<name>[^/]+)/search/batch', 'search_knowledge_base_batch'),
+        ('GET', r'/api/knowledge_bases/(?P<name>[^/]+)/jobs/(?P<job_id>[^/]+)', 'get_job'),
+        ('DELETE', r'/api/knowledge_bases/(?P<name>[^/]+)/jobs/(?P<job_id>[^/]+)', 'cancel_job'),
+
+        ('POST', r'/api/files/uploads', 'create_upload'),
+        ('GET', r'/api/files/uploads/(?P<upload_id>[^/]+)', 'get_upload'),
+        ('PUT', r'/api/files/uploads/(?P<upload_id>[^/]+)/parts/(?P<number>\d+)', 'upload_part'),
+        ('POST', r'/api/files/uploads/(?P<upload_id>[^/]+)/complete', 'complete_upload'),
+        ('DELETE', r'/api/files/uploads/(?P<upload_id>[^/]+)', 'abort_upload'),
+        ('GET', r'/api/files', 'list_files'),
+        ('GET', r'/api/files/(?P<name>[^/]+)', 'get_file'),
+        ('PUT', r'/api/files/(?P<name>[^/]+)', 'put_file'),
+        ('DELETE', r'/api/files/(?P<name>[^/]+)', 'drop_file'),
+
+        ('GET', r'/api/projects/(?P<project>[^/]+)/minds', 'list_minds'),
+        ('POST', r'/api/projects/(?P<project>[^/]+)/minds', 'create_mind'),
+        ('GET', r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)', 'get_mind'),
+        ('PUT', r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)', 'replace_mind'),
+        ('PATCH', r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)', 'update_mind'),
+        ('DELETE', r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)', 'drop_mind'),
+        ('POST', r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)/(?P<kind>datasources|knowledge_bases)',
+         'add_mind_source'),
+        ('DELETE',
+         r'/api/projects/(?P<project>[^/]+)/minds/(?P<name>[^/]+)/(?P<kind>datasources|knowledge_bases)/(?P<item>[^/]+)',
+         'del_mind_source'),
+
+        ('GET', r'(/v1)?/models', 'list_models'),
+        ('POST', r'(/v1)?/chat/completions', 'chat_completion'),
+    ]
+
+    def log_message(self, format, *args):
+        if self.server.app.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def app(self) -> 'LocalServer':
+        return self.server.app
+
+    @property
+    def state(self) -> _State:
+        return self.server.app.state
+
+    # --- transport ---
+
+    def _dispatch(self, method):
+        path = urlparse(self.path).path.rstrip('/')
+        body = self._read_body()
+        try:
+            for route_method, pattern, handler in self.routes:
+                if route_method != method:
+                    continue
+                match = re.fullmatch(pattern, path)
+                if match is None:
+                    continue
+                self.app.delay()
+                self.app.inject_fault()
+                result = getattr(self, handler)(body, **match.groupdict())
+                if result is not None:
+                    self._send_json(200, result)
+                return
+            raise _HTTPError(404, f'Not found: {method} {path}')
+        except _HTTPError as e:
+            self._send_json(e.status, {'detail': e.message}, headers=e.headers)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length == 0:
+            return None
+        data = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type') or ''
+        if content_type == 'application/octet-stream' or content_type.startswith('multipart/form-data'):
+            return data
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def _send_json(self, status, data, headers=None):
+        payload = json.dumps(data).encode()
+        if self.command == 'GET' and status == 200:
+            # conditional requests: not changed response is not sent again
+            etag = '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            headers = dict(headers or {}, ETag=etag)
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_HEAD(self):
+        self.app.delay()
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # --- datasources ---
+
+    def _get_datasource(self, name):
+        ds = self.state.datasources.get(name)
+        if ds is None:
+            raise _HTTPError(404, f'Datasource not found: {name}')
+        return ds
+
+    def list_datasources(self, body):
+        with self.state.lock:
+            return list(self.state.datasources.values())
+
+    def create_datasource(self, body):
+        with self.state.lock:
+            if body['name'] in self.state.datasources:
+                raise _HTTPError(409, f'Datasource already exists: {body["name"]}')
+            self.state.datasources[body['name']] = dict(body, created_at=_now(), updated_at=_now())
+        return {}
+
+    def get_datasource(self, body, name):
+        with self.state.lock:
+            return self._get_datasource(name)
+
+    def update_datasource(self, body, name):
+        with self.state.lock:
+            ds = self.state.datasources.get(name, {'created_at': _now()})
+            self.state.datasources[name] = dict(ds, **body, updated_at=_now())
+        return {}
+
+    def drop_datasource(self, body, name):
+        with self.state.lock:
+            self._get_datasource(name)
+            del self.state.datasources[name]
+        return {}
+
+    # --- knowledge bases ---
+
+    def _get_knowledge_base(self, name):
+        kb = self.state.knowledge_bases.get(name)
+        if kb is None:
+            raise _HTTPError(404, f'Knowledge base not found: {name}')
+        return kb
+
+    def list_knowledge_bases(self, body):
+        with self.state.lock:
+            return list(self.state.knowledge_bases.values())
+
+    def create_knowledge_base(self, body):
+        name = body['name']
+        with self.state.lock:
+            if name in self.state.knowledge_bases:
+                raise _HTTPError(409, f'Knowledge base already exists: {name}')
+            self.state.knowledge_bases[name] = {
+                'id': len(self.state.knowledge_bases) + 1,
+                'name': name,
+                'description': body.get('description'),
+                'params': body.get('params') or {},
+                'embedding_model': f'{name}_embeddings',
+                'vector_database': f'{name}_vector_store',
+                'vector_database_table': (body.get('vector_store') or {}).get('table', 'embeddings'),
+                'created_at': _now(),
+                'updated_at': _now(),
+            }
+            self.state.documents[name] = {}
+        return {}
+
+    def get_knowledge_base(self, body, name):
+        with self.state.lock:
+            return self._get_knowledge_base(name)
+
+    def insert_knowledge_base(self, body, name):
+        with self.state.lock:
+            self._get_knowledge_base(name)
+
+        if 'respond-async' not in (self.headers.get('Prefer') or ''):
+            self.app.sleep(self.app.ingest_latency)
+            self._insert_rows(name, body)
+            return {}
+
+        # RFC 7240: the request is accepted and processed in background, its status is polled by Location
+        job = {'id': uuid.uuid4().hex, 'status': 'running', 'error': None}
+        with self.state.lock:
+            self.state.jobs[job['id']] = job
+
+        def process():
+            self.app.sleep(self.app.ingest_latency)
+            with self.state.lock:
+                if job['status'] == 'cancelled':
+                    return
+            try:
+                self._insert_rows(name, body)
+                status = 'completed'
+            except _HTTPError as e:
+                status = 'failed'
+                job['error'] = e.message
+            with self.state.lock:
+                job['status'] = status
+
+        threading.Thread(target=process, daemon=True).start()
+        location = f'/api/knowledge_bases/{name}/jobs/{job["id"]}'
+        self._send_json(202, job, headers={'Location': location})
+
+    def _insert_rows(self, name, body):
+        from minds.knowledge_bases.embeddings import EMBEDDING_ENCODING, decode_embedding
+
+        with self.state.lock:
+            kb = self._get_knowledge_base(name)
+            documents = self.state.documents[name]
+            urls = body.get('urls') or []
+            # like unresolvable hosts, reserved .invalid domain (RFC 2606) is rejected
+            rejected = [url for url in urls if (urlparse(url).hostname or '').endswith('.invalid')]
+            if rejected:
+                raise _HTTPError(400, f'Can not crawl URLs: {", ".join(rejected)}')
+            self.state.urls.setdefault(name, []).extend(urls)
+            for row in body.get('rows') or []:
+                embedding = row.get('embedding')
+                if isinstance(embedding, dict) and embedding.get('encoding') == EMBEDDING_ENCODING:
+                    row['embedding'] = decode_embedding(embedding['data'])
+                documents[row['id']] = row
+            kb['updated_at'] = _now()
+
+    def _search(self, name, request):
+        # relevance is the share of query words found in the document
+        words = set(request['query'].lower().split())
+        filters = request.get('filters') or {}
+        results = []
+        for row in self.state.documents[name].values():
+            metadata = row.get('metadata') or {}
+            if any(metadata.get(key) != value for key, value in filters.items()):
+                continue
+            content = row.get('content') or ''
+            relevance = len(words & set(content.lower().split())) / max(len(words), 1)
+            if relevance > 0:
+                results.append({
+                    'id': row['id'], 'content': content, 'metadata': metadata,
+                    'relevance': relevance, 'distance': 1 - relevance,
+                })
+        results.sort(key=lambda result: -result['relevance'])
+        return results[:request.get('top_k', 10)]
+
+    def search_knowledge_base(self, body, name):
+        with self.state.lock:
+            self._get_knowledge_base(name)
+            return {'results': self._search(name, body)}
+
+    def search_knowledge_base_batch(self, body, name):
+        if not self.app.batch_search:
+            raise _HTTPError(404, f'Not found: POST /api/knowledge_bases/{name}/search/batch')
+        with self.state.lock:
+            self._get_knowledge_base(name)
+            return {'results': [self._search(name, request) for request in body['queries']]}
+
+    def _get_job(self, job_id):
+        job = self.state.jobs.get(job_id)
+        if job is None:
+            raise _HTTPError(404, f'Job not found: {job_id}')
+        return job
+
+    def get_job(self, body, name, job_id):
+        with self.state.lock:
+            return dict(self._get_job(job_id))
+
+    def cancel_job(self, body, name, job_id):
+        with self.state.lock:
+            job = self._get_job(job_id)
+            if job['status'] != 'running':
+                raise _HTTPError(409, f'Job is {job["status"]}')
+            job['status'] = 'cancelled'
+            return dict(job)
+
+    def drop_knowledge_base(self, body, name):
+        with self.state.lock:
+            self._get_knowledge_base(name)
+            del self.state.knowledge_bases[name]
+            del self.state.documents[name]
+            self.state.urls.pop(name, None)
+        return {}
+
+    # --- files ---
+
+    def _get_upload(self, upload_id):
+        upload = self.state.uploads.get(upload_id)
+        if upload is None:
+            raise _HTTPError(404, f'Upload not found: {upload_id}')
+        return upload
+
+    def create_upload(self, body):
+        if not self.app.upload_parts:
+            # POST to route of a file name
+            raise _HTTPError(405, 'Method Not Allowed')
+        upload_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.uploads[upload_id] = {
+                'upload_id': upload_id, 'name': body['name'], 'size': body.get('size'), 'parts': {}
+            }
+        return {'upload_id': upload_id}
+
+    def get_upload(self, body, upload_id):
+        with self.state.lock:
+            upload = self._get_upload(upload_id)
+            parts = [
+                {'number': number, 'size': len(data), 'etag': hashlib.md5(data).hexdigest()}
+                for number, data in sorted(upload['parts'].items())
+            ]
+            return {'upload_id': upload_id, 'name': upload['name'], 'size': upload['size'], 'parts': parts}
+
+    def upload_part(self, body, upload_id, number):
+        data = body or b''
+        if not isinstance(data, bytes):
+            raise _HTTPError(400, 'Part must be sent as application/octet-stream')
+        digest = hashlib.md5(data)
+        expected = self.headers.get('Content-MD5')
+        if expected and base64.b64decode(expected) != digest.digest():
+            raise _HTTPError(400, f'Content-MD5 mismatch of part {number}')
+        with self.state.lock:
+            self._get_upload(upload_id)['parts'][int(number)] = data
+        return {'number': int(number), 'etag': digest.hexdigest()}
+
+    def complete_upload(self, body, upload_id):
+        with self.state.lock:
+            upload = self._get_upload(upload_id)
+            chunks = []
+            for part in body.get('parts') or []:
+                data = upload['parts'].get(part['number'])
+                if data is None or hashlib.md5(data).hexdigest() != part['etag']:
+                    raise _HTTPError(400, f'Part {part["number"]} is not uploaded')
+                chunks.append(data)
+            content = b''.join(chunks)
+            if upload['size'] is not None and len(content) != upload['size']:
+                raise _HTTPError(400, f'Size of the file is {len(content)}, expected {upload["size"]}')
+            del self.state.uploads[upload_id]
+            self.state.files[upload['name']] = {'name': upload['name'], 'size': len(content), 'content': content}
+        return {'name': upload['name'], 'size': len(content)}
+
+    def abort_upload(self, body, upload_id):
+        with self.state.lock:
+            self._get_upload(upload_id)
+            del self.state.uploads[upload_id]
+        return {}
+
+    def put_file(self, body, name):
+        from email.parser import BytesParser
+
+        if not isinstance(body, bytes):
+            raise _HTTPError(400, 'File must be sent as multipart/form-data')
+        message = BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body
+        )
+        for part in message.get_payload():
+            if part.get_param('name', header='Content-Disposition') == 'file':
+                content = part.get_payload(decode=True)
+                break
+        else:
+            raise _HTTPError(400, 'No file in the request')
+        with self.state.lock:
+            self.state.files[name] = {'name': name, 'size': len(content), 'content': content}
+        return {'name': name, 'size': len(content)}
+
+    def _get_file(self, name):
+        file = self.state.files.get(name)
+        if file is None:
+            raise _HTTPError(404, f'File not found: {name}')
+        return {'name': file['name'], 'size': file['size']}
+
+    def list_files(self, body):
+        with self.state.lock:
+            return [self._get_file(name) for name in self.state.files]
+
+    def get_file(self, body, name):
+        with self.state.lock:
+            return self._get_file(name)
+
+    def drop_file(self, body, name):
+        with self.state.lock:
+            self._get_file(name)
+            del self.state.files[name]
+        return {}
+
+    # --- minds ---
+
+    def _get_mind(self, project, name):
+        mind = self.state.project_minds(project).get(name)
+        if mind is None:
+            raise _HTTPError(404, f'Mind not found: {name}')
+        return mind
+
+    @staticmethod
+    def _mind_from_request(body, created_at=None):
+        datasources = [ds['name'] if isinstance(ds, dict) else ds for ds in body.get('datasources') or []]
+        return {
+            'name': body['name'],
+            'model_name': body.get('model_name'),
+            'provider': body.get('provider'),
+            'parameters': body.get('parameters') or {},
+            'datasources': datasources,
+            'knowledge_bases': list(body.get('knowledge_bases') or []),
+            'created_at': created_at or _now(),
+            'updated_at': _now(),
+        }
+
+    def list_minds(self, body, project):
+        with self.state.lock:
+            return list(self.state.project_minds(project).values())
+
+    def create_mind(self, body, project):
+        with self.state.lock:
+            minds = self.state.project_minds(project)
+            if body['name'] in minds:
+                raise _HTTPError(409, f'Mind already exists: {body["name"]}')
+            minds[body['name']] = self._mind_from_request(body)
+        return {}
+
+    def get_mind(self, body, project, name):
+        with self.state.lock:
+            return self._get_mind(project, name)
+
+    def replace_mind(self, body, project, name):
+        with self.state.lock:
+            minds = self.state.project_minds(project)
+            created_at = minds[name]['created_at'] if name in minds else None
+            minds.pop(name, None)
+            minds[body['name']] = self._mind_from_request(body, created_at)
+        return {}
+
+    def update_mind(self, body, project, name):
+        with self.state.lock:
+            minds = self.state.project_minds(project)
+            mind = dict(self._get_mind(project, name))
+            for key in ('name', 'model_name', 'provider', 'knowledge_bases'):
+                if key in body:
+                    mind[key] = body[key]
+            if 'datasources' in body:
+                mind['datasources'] = [ds['name'] if isinstance(ds, dict) else ds for ds in body['datasources']]
+            if 'parameters' in body:
+                mind['parameters'] = dict(mind['parameters'], **body['parameters'])
+            mind['updated_at'] = _now()
+            del minds[name]
+            minds[mind['name']] = mind
+        return {}
+
+    def drop_mind(self, body, project, name):
+        with self.state.lock:
+            self._get_mind(project, name)
+            del self.state.project_minds(project)[name]
+        return {}
+
+    def add_mind_source(self, body, project, name, kind):
+        with self.state.lock:
+            mind = self._get_mind(project, name)
+            if body['name'] not in mind[kind]:
+                mind[kind] = mind[kind] + [body['name']]
+            mind['updated_at'] = _now()
+        return {}
+
+    def del_mind_source(self, body, project, name, kind, item):
+        with self.state.lock:
+            mind = self._get_mind(project, name)
+            if item not in mind[kind]:
+                raise _HTTPError(404, f'{item} is not found in mind {name}')
+            mind[kind] = [i for i in mind[kind] if i != item]
+            mind['updated_at'] = _now()
+        return {}
+
+    # --- completions ---
+
+    def list_models(self, body):
+        with self.state.lock:
+            names = [name for minds in self.state.minds.values() for name in minds]
+        return {
+            'object': 'list',
+            'data': [{'id': name, 'object': 'model', 'created': 0, 'owned_by': 'minds'} for name in names],
+        }
+
+    def chat_completion(self, body):
+        model = body['model']
+        question = body['messages'][-1]['content']
+        tokens = self.app.answer_tokens(question)
+        prompt_tokens = len(question.split())
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens),
+        }
+        completion_id = 'chatcmpl-' + uuid.uuid4().hex
+        created = int(time.time())
+
+        token_latency = self.app.stream_token_latency()
+        if not body.get('stream'):
+            self.app.sleep(self.app.first_token_latency)
+            for _ in tokens:
+                self.app.sleep(token_latency)
+            return {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            }
+
+        def event(choices, **kwargs):
+            chunk = dict(
+                id=completion_id, object='chat.completion.chunk', created=created, model=model,
+                choices=choices, **kwargs
+            )
+            return b'data: ' + json.dumps(chunk).encode() + b'\n\n'
+
+        # the connection is dropped in the middle of the stream
+        drop_at = len(tokens) // 2 if self.app.chance(self.app.stream_drop_rate, 'dropped_streams') else None
+
+        self._start_chunked('text/event-stream')
+        self.app.sleep(self.app.first_token_latency)
+        for i, token in enumerate(tokens):
+            if i == drop_at:
+                self.close_connection = True
+                return
+            if i > 0:
+                self.app.sleep(token_latency)
+            delta = {'content': token}
+            if i == 0:
+                delta['role'] = 'assistant'
+            self._write_chunk(event([{'index': 0, 'delta': delta, 'finish_reason': None}]))
+        self._write_chunk(event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._write_chunk(event([], usage=usage))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+
+class LocalServer:
+    '''
+    In-memory server emulating Minds REST API and OpenAI compatible chat endpoint
+    '''
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: Union[float, str, Latency] = 0.0,
+        first_token_latency: Union[float, str, Latency] = 0.0,
+        token_latency: Union[float, str, Latency] = 0.0,
+        answer_tokens: int = 20,
+        ingest_latency: Union[float, str, Latency] = 0.0,
+        batch_search: bool = True,
+        upload_parts: bool = True,
+        error_rate: float = 0.0,
+        rate_limit: float = None,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        slow_stream_rate: float = 0.0,
+        slow_token_latency: Union[float, str, Latency] = 1.0,
+        stream_drop_rate: float = 0.0,
+        seed: int = None,
+        verbose: bool = False,
+    ):
+        '''
+        Latencies are seconds or distributions, see Latency, they are sampled for every request or token
+
+        :param host: host to listen
+        :param port: port to listen, random free port by default
+        :param latency: delay before response of every request
+        :param first_token_latency: additional delay of completion before the first token
+        :param token_latency: delay between tokens of completion
+        :param answer_tokens: number of tokens in answer of completion
+        :param ingest_latency: processing time of inserts into knowledge base
+        :param batch_search: if false - batch search endpoint of knowledge bases is not available
+        :param upload_parts: if false - uploads of files in parts are not available, files are sent by one request
+        :param error_rate: fraction of requests failed with 500
+        :param rate_limit: requests per second, exceeding requests are rejected with 429
+        :param rate_limit_rate: fraction of requests randomly rejected with 429
+        :param retry_after: seconds in Retry-After header of 429 responses
+        :param slow_stream_rate: fraction of completions sent with slow_token_latency between tokens
+        :param slow_token_latency: delay between tokens of slow completions
+        :param stream_drop_rate: fraction of streamed completions whose connection is closed in the middle
+        :param seed: seed of random latencies and faults
+        :param verbose: log requests to stderr
+        '''
+        self.host = host
+        self.port = port
+        self.latency = Latency.parse(latency)
+        self.first_token_latency = Latency.parse(first_token_latency)
+        self.token_latency = Latency.parse(token_latency)
+        self.tokens = answer_tokens
+        self.ingest_latency = Latency.parse(ingest_latency)
+        self.batch_search = batch_search
+        self.upload_parts = upload_parts
+        self.error_rate = error_rate
+        self.rate_limiter = _RateLimiter(rate_limit) if rate_limit else None
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.slow_stream_rate = slow_stream_rate
+        self.slow_token_latency = Latency.parse(slow_token_latency)
+        self.stream_drop_rate = stream_drop_rate
+        self.verbose = verbose
+
+        self.random = random.Random(seed)
+        # number of requests and injected faults: requests, errors, throttled, slow_streams, dropped_streams
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        self.state = _State()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def sleep(self, latency: Union[float, Latency]):
+        seconds = latency.sample(self.random) if isinstance(latency, Latency) else latency
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def delay(self):
+        self.sleep(self.latency)
+
+    def count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def chance(self, rate: float, name: str) -> bool:
+        '''
+        :return: true with probability of the rate, the event is counted in stats
+        '''
+        if rate <= 0 or self.random.random() >= rate:
+            return False
+        self.count(name)
+        return True
+
+    def inject_fault(self):
+        '''
+        Raise error of the request: rate limit or random error
+        '''
+        self.count('requests')
+        wait = self.rate_limiter.acquire() if self.rate_limiter is not None else None
+        if wait is not None:
+            self.count('throttled')
+        elif self.chance(self.rate_limit_rate, 'throttled'):
+            wait = self.retry_after
+        if wait is not None:
+            headers = {'Retry-After': str(math.ceil(wait)), 'retry-after-ms': str(int(wait * 1000))}
+            raise _HTTPError(429, 'Too many requests', headers)
+        if self.chance(self.error_rate, 'errors'):
+            raise _HTTPError(500, 'Injected error')
+
+    def stream_token_latency(self) -> Latency:
+        # delay between tokens of a completion
+        if self.chance(self.slow_stream_rate, 'slow_streams'):
+            return self.slow_token_latency
+        return self.token_latency
+
+    def answer_tokens(self, question: str):
+        words = question.split() or ['answer']
+        return [words[i % len(words)] + ' ' for i in range(self.tokens)]
+
+    def start(self) -> 'LocalServer':
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def serve_forever(self):
+        if self._httpd is None:
+            self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    # latencies: seconds or distributions, for example uniform:0.01,0.05 or lognormal:0.05,0.5
+    parser.add_argument('--latency', type=Latency.parse, default=0.0, help='delay of every request, seconds')
+    parser.add_argument('--first-token-latency', type=Latency.parse, default=0.0,
+                        help='additional delay of completion before the first token, seconds')
+    parser.add_argument('--token-latency', type=Latency.parse, default=0.0,
+                        help='delay between completion tokens, seconds')
+    parser.add_argument('--answer-tokens', type=int, default=20, help='number of tokens in completion answer')
+    parser.add_argument('--ingest-latency', type=Latency.parse, default=0.0,
+                        help='processing time of inserts into knowledge base, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failed with 500')
+    parser.add_argument('--rate-limit', type=float, help='requests per second, exceeding requests get 429')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='fraction of requests randomly rejected with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After of 429 responses, seconds')
+    parser.add_argument('--slow-stream-rate', type=float, default=0.0,
+                        help='fraction of completions with slow tokens')
+    parser.add_argument('--slow-token-latency', type=Latency.parse, default=1.0,
+                        help='delay between tokens of slow completions, seconds')
+    parser.add_argument('--stream-drop-rate', type=float, default=0.0,
+                        help='fraction of streamed completions closed in the middle')
+    parser.add_argument('--server-seed', type=int, help='seed of random latencies and faults')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for Minds server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--verbose', action='store_true')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = LocalServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        answer_tokens=args.answer_tokens,
+        ingest_latency=args.ingest_latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        slow_stream_rate=args.slow_stream_rate,
+        slow_token_latency=args.slow_token_latency,
+        stream_drop_rate=args.stream_drop_rate,
+        seed=args.server_seed,
+        verbose=args.verbose,
+    )
+    server.start()
+    print(f'Listening on {server.url}', flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+'''
+Metrics of SDK calls: operations, HTTP requests, payload sizes and time to first token of streams
+
+Every thread writes to its own shard of counters and histograms, without locks.
+A snapshot merges the shards. Metrics of the client are returned by client.metrics():
+
+    snapshot = client.metrics()
+    snapshot.histogram('minds_operation_duration_seconds', operation='Mind.completion', outcome='ok').mean
+    print(snapshot.to_prometheus())
+
+Or served for Prometheus scraping:
+
+    from minds.metrics import serve_metrics
+    serve_metrics(client, port=9100)
+'''
+import bisect
+import functools
+import threading
+import time
+from collections.abc import Generator
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, description, label names)
+METRICS = {
+    'minds_operation_duration_seconds': (
+        'histogram', 'Duration of SDK operations', ('operation', 'outcome')
+    ),
+    'minds_operation_errors_total': (
+        'counter', 'Failed SDK operations by exception type', ('operation', 'error')
+    ),
+    'minds_http_request_duration_seconds': (
+        'histogram', 'Duration of HTTP requests to Minds API', ('method', 'status')
+    ),
+    'minds_http_request_bytes_total': (
+        'counter', 'Bytes of bodies of HTTP requests', ('method',)
+    ),
+    'minds_http_response_bytes_total': (
+        'counter', 'Bytes of bodies of HTTP responses', ('method',)
+    ),
+    'minds_completion_time_to_first_token_seconds': (
+        'histogram', 'Time from the start of streamed completion to its first token', ('mind',)
+    ),
+}
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms', 'thread')
+
+    def __init__(self, thread):
+        # (name, labels) -> value
+        self.counters = {}
+        # (name, labels) -> [count of every bucket..., count of +Inf bucket, sum]
+        self.histograms = {}
+        self.thread = thread
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...], counts: List[int], total: float):
+        '''
+        :param buckets: upper bounds of the buckets, without +Inf
+        :param counts: number of values in every bucket and in +Inf bucket, not cumulative
+        :param total: sum of values
+        '''
+        self.buckets = buckets
+        self.counts = counts
+        self.sum = total
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def mean(self) -> Optional[float]:
+        count = self.count
+        return self.sum / count if count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        '''
+        Estimate of the quantile: upper bound of the bucket containing it
+
+        :param q: quantile from 0 to 1
+        '''
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def __repr__(self):
+        return f'Histogram(count={self.count}, sum={self.sum:.6f})'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = None) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class MetricsSnapshot:
+    '''Merged values of all threads at the moment of the snapshot'''
+
+    def __init__(self, counters: Dict[str, Dict[tuple, float]], histograms: Dict[str, Dict[tuple, Histogram]]):
+        # name -> label values -> value
+        self.counters = counters
+        self.histograms = histograms
+
+    @staticmethod
+    def _labels(name: str, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in METRICS[name][2])
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(name, {}).get(self._labels(name, labels), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(name, {}).get(self._labels(name, labels))
+
+    def to_prometheus(self) -> str:
+        '''
+        :return: metrics in Prometheus text exposition format
+        '''
+        lines = []
+        for name, (kind, description, label_names) in METRICS.items():
+            values = self.counters.get(name) if kind == 'counter' else self.histograms.get(name)
+            if not values:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(values.items()):
+                if kind == 'counter':
+                    lines.append(f'{name}{_format_labels(label_names, labels)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                    cumulative += count
+                    le = _format_labels(label_names, labels, f'le="{_format_value(float(bound))}"')
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(label_names, labels)} {_format_value(value.sum)}')
+                lines.append(f'{name}_count{_format_labels(label_names, labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        '''
+        :param buckets: upper bounds of histogram buckets, seconds
+        '''
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards = []
+        # values of finished threads
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+
+    def _after_fork(self):
+        # the lock could be held by a thread of the parent process
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                # shards of finished threads are not kept until the next snapshot
+                self._retire()
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        # buckets are inclusive upper bounds
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    @staticmethod
+    def _merge(target: _Shard, counters: dict, histograms: dict):
+        for key, value in counters.items():
+            target.counters[key] = target.counters.get(key, 0) + value
+        for key, values in histograms.items():
+            merged = target.histograms.get(key)
+            if merged is None:
+                target.histograms[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    merged[i] += value
+
+    def _retire(self):
+        # values of finished threads are moved to one shard, it is called under the lock
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                self._merge(self._retired, shard.counters, shard.histograms)
+        self._shards = alive
+
+    def snapshot(self) -> MetricsSnapshot:
+        merged = _Shard(None)
+        with self._lock:
+            self._retire()
+            for shard in self._shards:
+                # copies of dicts and lists are atomic
+                counters = dict(shard.counters)
+                histograms = {key: list(values) for key, values in list(shard.histograms.items())}
+                self._merge(merged, counters, histograms)
+            self._merge(merged, self._retired.counters, self._retired.histograms)
+
+        counters = {}
+        for (name, labels), value in merged.counters.items():
+            counters.setdefault(name, {})[labels] = value
+        histograms = {}
+        for (name, labels), values in merged.histograms.items():
+            histograms.setdefault(name, {})[labels] = Histogram(self.buckets, values[:-1], values[-1])
+        return MetricsSnapshot(counters, histograms)
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+            self._retired = _Shard(None)
+
+
+def observe_operation(metrics: MetricsRegistry, operation: str, duration: float, error: BaseException = None):
+    '''
+    Record duration and error of the operation, it is used by instrument and by streamed operations
+
+    :param metrics: MetricsRegistry of the client
+    :param operation: name of the operation, for example 'Mind.completion'
+    :param duration: seconds
+    :param error: exception if the operation failed
+    '''
+    if error is None:
+        metrics.observe('minds_operation_duration_seconds', (operation, 'ok'), duration)
+        return
+    metrics.observe('minds_operation_duration_seconds', (operation, 'error'), duration)
+    metrics.inc('minds_operation_errors_total', (operation, type(error).__name__))
+
+
+def instrument(operation: str) -> Callable:
+    '''
+    Record duration and errors of the method to metrics of the client, the object must have `api` attribute.
+    If the method returns a generator, nothing is recorded: the generator records the operation when it is consumed
+
+    :param operation: name of the operation, for example 'Minds.create'
+    '''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self.api, 'metrics', None)
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            except BaseException as e:
+                observe_operation(metrics, operation, time.perf_counter() - start, e)
+                raise
+            if not isinstance(result, Generator):
+                observe_operation(metrics, operation, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+def serve_metrics(client, port: int = 9100, host: str = '127.0.0.1'):
+    '''
+    Serve metrics of the client in Prometheus format at /metrics from a background thread
+
+    :param client: Client object
+    :param port: port to listen, 0 - random free port
+    :param host: host to listen
+    :return: http server, it is stopped by server.shutdown()
+    '''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            ...
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            payload = client.metrics().to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,12 +1,62 @@
-from typing import List, Union, Iterable
-from openai import OpenAI
+import contextlib
+import time
+from collections.abc import Generator
+from typing import List, Union, Iterable, TYPE_CHECKING
 import minds.utils as utils
 import minds.exceptions as exc
-from minds.datasources import Datasource, DatabaseConfig, DatabaseTables, DatabaseConfigBase
-from minds.knowledge_bases import KnowledgeBase, KnowledgeBaseConfig
+from minds.metrics import instrument, observe_operation
+
+if TYPE_CHECKING:
+    # pydantic models are imported on first use
+    from minds.datasources import Datasource
+    from minds.knowledge_bases import KnowledgeBase, KnowledgeBaseConfig
 
 DEFAULT_PROMPT_TEMPLATE = 'Use your database tools to answer the user\'s question: {{question}}'
 
+
+def _restore_mind(client, name, attributes):
+    return Mind(client, name, **attributes)
+
+
+def _source_name(source) -> str:
+    # server returns sources of the mind as names or as dicts
+    if isinstance(source, dict):
+        return source['name']
+    return source
+
+
+class _CompletionStream(Generator):
+    '''
+    Stream of completion deltas. Closing it releases the scheduler slot and the response
+    even if the stream is not started: close() of a not started generator doesn't run its finally block
+    '''
+
+    def __init__(self, generator, response, slot=None):
+        self._generator = generator
+        self._response = response
+        self._slot = slot
+
+    def send(self, value):
+        return self._generator.send(value)
+
+    def throw(self, *args):
+        return self._generator.throw(*args)
+
+    def close(self):
+        self._generator.close()
+        if self._slot is not None:
+            self._slot.release()
+        close = getattr(self._response, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 class Mind:
     def __init__(
         self, client, name,
@@ -26,19 +76,46 @@ class Mind:
         self.name = name
         self.model_name = model_name
         self.provider = provider
-        if parameters is None:
-            parameters = {}
+        parameters = dict(parameters or {})
         self.prompt_template = parameters.pop('prompt_template', None)
         self.parameters = parameters
         self.created_at = created_at
         self.updated_at = updated_at
-        base_url = utils.get_openai_base_url(self.api.base_url)
-        self.openai_client = OpenAI(
-            api_key=self.api.api_key,
-            base_url=base_url
-        )
         self.datasources = datasources
         self.knowledge_bases = knowledge_bases
+        self.last_usage = None
+        # changes recorded inside `with mind.batch()`
+        self._batch = None
+
+    def __reduce__(self):
+        # pickled as a lightweight handle: client credentials, name and attributes
+        parameters = dict(self.parameters)
+        if self.prompt_template is not None:
+            parameters['prompt_template'] = self.prompt_template
+        attributes = dict(
+            model_name=self.model_name,
+            provider=self.provider,
+            parameters=parameters,
+            datasources=self.datasources,
+            knowledge_bases=self.knowledge_bases,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+        return _restore_mind, (self.client, self.name, attributes)
+
+    @property
+    def openai_client(self):
+        # shared by all minds of the client
+        return self.client.openai_client
+
+    @property
+    def usage(self):
+        """
+        Token usage accumulated by completions of this mind in the current client
+
+        :return: minds.usage.Usage object
+        """
+        return self.client.usage.get(self.name)
 
     def __repr__(self):
         return (f'Mind(name={self.name}, '
@@ -50,6 +127,7 @@ class Mind:
                 f'knowledge_bases={self.knowledge_bases}, '
                 f'datasources={self.datasources})')
 
+    @instrument('Mind.update')
     def update(
         self,
         name: str = None,
@@ -107,22 +185,32 @@ class Mind:
             data['model_name'] = model_name
         if provider is not None:
             data['provider'] = provider
-        if parameters is None:
-            parameters = {}
 
-        data['parameters'] = parameters
+        if parameters is not None or prompt_template is not None:
+            data['parameters'] = dict(parameters or {})
+            if prompt_template is not None:
+                data['parameters']['prompt_template'] = prompt_template
 
-        if prompt_template is not None:
-            data['parameters']['prompt_template'] = prompt_template
+        if self._batch is not None:
+            self._record(data)
+            return
+
+        self._patch(data)
 
+    def _patch(self, data: dict):
         self.api.patch(
             f'/projects/{self.project}/minds/{self.name}',
             data=data
         )
 
+        name = data.get('name')
         if name is not None and name != self.name:
+            self.client.minds._cache.pop(self.name, None)
             self.name = name
 
+        self._refresh()
+
+    def _refresh(self):
         refreshed_mind = self.client.minds.get(self.name)
         self.model_name = refreshed_mind.model_name
         self.provider = refreshed_mind.provider
@@ -131,9 +219,85 @@ class Mind:
         self.created_at = refreshed_mind.created_at
         self.updated_at = refreshed_mind.updated_at
         self.datasources = refreshed_mind.datasources
+        self.knowledge_bases = refreshed_mind.knowledge_bases
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Record changes of the mind and send them by one request on exit
 
+        Inside the block update, add_datasource, del_datasource, add_knowledge_base and del_knowledge_base
+        don't make requests. On exit only changed fields are sent by one patch request
+        and the mind is refreshed once. If nothing is changed no requests are made.
+        Changes are discarded if the block raises an exception.
 
-    def add_datasource(self, datasource: Datasource):
+            with mind.batch():
+                mind.del_datasource('old_db')
+                mind.add_datasource('new_db')
+                mind.update(model_name='gpt-4o')
+        """
+        if self._batch is not None:
+            # nested block is a part of the outer one
+            yield self
+            return
+
+        self._batch = {}
+        try:
+            yield self
+        except BaseException:
+            self._batch = None
+            raise
+
+        data = self._changed_fields(self._batch)
+        self._batch = None
+        if data:
+            self._patch(data)
+
+    def _record(self, data: dict):
+        for key, value in data.items():
+            if key == 'parameters':
+                self._batch.setdefault('parameters', {}).update(value)
+            else:
+                self._batch[key] = value
+
+    def _batch_sources(self, kind: str) -> list:
+        # desired list of sources is started from the current one
+        if kind not in self._batch:
+            current = getattr(self, kind) or []
+            if kind == 'datasources':
+                self._batch[kind] = [{'name': _source_name(ds)} for ds in current]
+            else:
+                self._batch[kind] = [_source_name(kb) for kb in current]
+        return self._batch[kind]
+
+    def _changed_fields(self, data: dict) -> dict:
+        changed = {}
+        for key in ('name', 'model_name', 'provider'):
+            if key in data and data[key] != getattr(self, key):
+                changed[key] = data[key]
+
+        parameters = {}
+        for key, value in data.get('parameters', {}).items():
+            current = self.prompt_template if key == 'prompt_template' else self.parameters.get(key)
+            if value != current:
+                parameters[key] = value
+        if parameters:
+            changed['parameters'] = parameters
+
+        if 'datasources' in data:
+            datasources = data['datasources']
+            current = [_source_name(ds) for ds in self.datasources or []]
+            if [ds['name'] for ds in datasources] != current or any('tables' in ds for ds in datasources):
+                changed['datasources'] = datasources
+
+        if 'knowledge_bases' in data:
+            current = [_source_name(kb) for kb in self.knowledge_bases or []]
+            if data['knowledge_bases'] != current:
+                changed['knowledge_bases'] = data['knowledge_bases']
+        return changed
+
+    @instrument('Mind.add_datasource')
+    def add_datasource(self, datasource: 'Datasource'):
         """
         Add datasource to mind
         Datasource can be passed as
@@ -144,7 +308,13 @@ class Mind:
         :param datasource: input datasource
         """
 
-        ds_name = self.client.minds._check_datasource(datasource)['name']
+        ds = self.client.minds._check_datasource(datasource)
+        ds_name = ds['name']
+
+        if self._batch is not None:
+            datasources = [item for item in self._batch_sources('datasources') if item['name'] != ds_name]
+            self._batch['datasources'] = datasources + [ds]
+            return
 
         self.api.post(
             f'/projects/{self.project}/minds/{self.name}/datasources',
@@ -156,7 +326,8 @@ class Mind:
 
         self.datasources = updated.datasources
 
-    def del_datasource(self, datasource: Union[Datasource, str]):
+    @instrument('Mind.del_datasource')
+    def del_datasource(self, datasource: Union['Datasource', str]):
         """
         Delete datasource from mind
 
@@ -166,10 +337,19 @@ class Mind:
 
         :param datasource: datasource to delete
         """
+        from minds.datasources import Datasource
+
         if isinstance(datasource, Datasource):
             datasource = datasource.name
         elif not isinstance(datasource, str):
             raise ValueError(f'Unknown type of datasource: {datasource}')
+
+        if self._batch is not None:
+            self._batch['datasources'] = [
+                item for item in self._batch_sources('datasources') if item['name'] != datasource
+            ]
+            return
+
         self.api.delete(
             f'/projects/{self.project}/minds/{self.name}/datasources/{datasource}',
         )
@@ -177,7 +357,8 @@ class Mind:
 
         self.datasources = updated.datasources
 
-    def add_knowledge_base(self, knowledge_base: Union[str, KnowledgeBase, KnowledgeBaseConfig]):
+    @instrument('Mind.add_knowledge_base')
+    def add_knowledge_base(self, knowledge_base: Union[str, 'KnowledgeBase', 'KnowledgeBaseConfig']):
         """
         Add knowledge base to mind
         Knowledge base can be passed as
@@ -190,6 +371,12 @@ class Mind:
 
         kb_name = self.client.minds._check_knowledge_base(knowledge_base)
 
+        if self._batch is not None:
+            knowledge_bases = self._batch_sources('knowledge_bases')
+            if kb_name not in knowledge_bases:
+                knowledge_bases.append(kb_name)
+            return
+
         self.api.post(
             f'/projects/{self.project}/minds/{self.name}/knowledge_bases',
             data={
@@ -200,7 +387,8 @@ class Mind:
 
         self.knowledge_bases = updated.knowledge_bases
 
-    def del_knowledge_base(self, knowledge_base: Union[KnowledgeBase, str]):
+    @instrument('Mind.del_knowledge_base')
+    def del_knowledge_base(self, knowledge_base: Union['KnowledgeBase', str]):
         """
         Delete knowledge base from mind
 
@@ -210,10 +398,19 @@ class Mind:
 
         :param knowledge_base: Knowledge base to delete
         """
+        from minds.knowledge_bases import KnowledgeBase
+
         if isinstance(knowledge_base, KnowledgeBase):
             knowledge_base = knowledge_base.name
         elif not isinstance(knowledge_base, str):
             raise ValueError(f'Unknown type of knowledge base: {knowledge_base}')
+
+        if self._batch is not None:
+            self._batch['knowledge_bases'] = [
+                name for name in self._batch_sources('knowledge_bases') if name != knowledge_base
+            ]
+            return
+
         self.api.delete(
             f'/projects/{self.project}/minds/{self.name}/knowledge_bases/{knowledge_base}',
         )
@@ -221,30 +418,109 @@ class Mind:
 
         self.knowledge_bases = updated.knowledge_bases
 
-    def completion(self, message: str, stream: bool = False) -> Union[str, Iterable[object]]:
+    @instrument('Mind.completion')
+    def completion(
+        self, message: str, stream: bool = False, priority: str = None, tenant: str = None
+    ) -> Union[str, Iterable[object]]:
         """
         Call mind completion
 
+        Token usage of the call is stored in mind.last_usage and aggregated in client.usage.
+        In stream mode it is available after the stream is consumed.
+
+        If client is created with hedging policy, slow requests are duplicated (see minds.hedging).
+        If client is created with scheduler, the call waits for its turn (see minds.scheduler).
+
         :param message: input question
         :param stream: to enable stream mode
+        :param priority: priority class of the call for the scheduler, optional
+        :param tenant: tenant of the call for fair queuing in the scheduler, optional
 
-        :return: string if stream mode is off or iterator of ChoiceDelta objects (by openai)
+        :return: string if stream mode is off or iterator of ChoiceDelta objects (by openai),
+            the iterator should be closed if it is not consumed
         """
-        response = self.openai_client.chat.completions.create(
+        # duration of streamed completion is recorded when the stream is consumed
+        operation_start = time.perf_counter()
+        self.client.usage.check(self.name)
+
+        slot = None
+        if self.client.scheduler is not None:
+            slot = self.client.scheduler.acquire(self.name, priority=priority, tenant=tenant)
+
+        start = time.perf_counter()
+        try:
+            response = self._send_completion(message, stream)
+        except Exception:
+            if slot is not None:
+                slot.release()
+            raise
+
+        if stream:
+            return _CompletionStream(self._stream_response(response, slot, start, operation_start), response, slot)
+
+        if slot is not None:
+            slot.release()
+        self.last_usage = self.client.usage.record_response_usage(self.name, response.usage)
+        return response.choices[0].message.content
+
+    def _send_completion(self, message: str, stream: bool):
+        kwargs = {}
+        if stream:
+            kwargs['stream_options'] = {'include_usage': True}
+
+        request = dict(
             model=self.name,
             messages=[
                 {'role': 'user', 'content': message}
             ],
-            stream=stream
+            stream=stream,
+            **kwargs
         )
-        if stream:
-            return self._stream_response(response)
-        else:
-            return response.choices[0].message.content
 
-    def _stream_response(self, response):
-        for chunk in response:
-            yield chunk.choices[0].delta
+        def create():
+            return self.openai_client.chat.completions.create(**request)
+
+        if self.client.cassette is not None:
+            create = self.client.cassette.wrap_completion(create, request)
+
+        if self.client.hedger is None:
+            return create()
+
+        on_discard = None
+        if not stream:
+            # the loser of the hedged request is also charged
+            def on_discard(response):
+                self.client.usage.record_response_usage(self.name, response.usage)
+        return self.client.hedger.run(create, stream=stream, on_discard=on_discard)
+
+    def _stream_response(self, response, slot=None, start: float = None, operation_start: float = None):
+        metrics = getattr(self.api, 'metrics', None)
+        first = True
+        error = None
+        try:
+            for chunk in response:
+                # the last chunk has empty choices and contains usage of the whole stream
+                if getattr(chunk, 'usage', None) is not None:
+                    self.last_usage = self.client.usage.record_response_usage(self.name, chunk.usage)
+                if not chunk.choices:
+                    continue
+                if first and start is not None and metrics is not None:
+                    metrics.observe(
+                        'minds_completion_time_to_first_token_seconds', (self.name,), time.perf_counter() - start
+                    )
+                first = False
+                yield chunk.choices[0].delta
+        except GeneratorExit:
+            # the stream is closed by the caller
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if slot is not None:
+                slot.release()
+            if operation_start is not None and metrics is not None:
+                observe_operation(metrics, 'Mind.completion', time.perf_counter() - operation_start, error)
 
 
 class Minds:
@@ -253,7 +529,10 @@ class Minds:
         self.client = client
 
         self.project = 'mindsdb'
+        # minds prefetched by client.warmup
+        self._cache = {}
 
+    @instrument('Minds.list')
     def list(self) -> List[Mind]:
         """
         Returns list of minds
@@ -267,18 +546,39 @@ class Minds:
             minds_list.append(Mind(self.client, **item))
         return minds_list
 
-    def get(self, name: str) -> Mind:
+    @instrument('Minds.get')
+    def get(self, name: str, cached: bool = False) -> Mind:
         """
         Get mind by name
 
         :param name: name of the mind
+        :param cached: if true - return the mind prefetched by client.warmup without a request, default is false
         :return: a mind object
         """
-        
+        if cached and name in self._cache:
+            return self._cache[name]
+
         item = self.api.get(f'/projects/{self.project}/minds/{name}').json()
         return Mind(self.client, **item)
 
+    def prefetch(self, names: List[str] = None) -> List[Mind]:
+        """
+        Fetch minds and keep them in cache, they are returned by get(name, cached=True)
+
+        :param names: names of the minds, all minds if not set
+        :return: list of fetched minds
+        """
+        if names is None:
+            minds_list = self.list()
+        else:
+            minds_list = [self.get(name) for name in names]
+        for mind in minds_list:
+            self._cache[mind.name] = mind
+        return minds_list
+
     def _check_datasource(self, ds) -> dict:
+        from minds.datasources import DatabaseConfig, DatabaseTables, DatabaseConfigBase
+
         if isinstance(ds, DatabaseConfigBase):
             res = {'name': ds.name}
 
@@ -302,6 +602,8 @@ class Minds:
 
 
     def _check_knowledge_base(self, knowledge_base) -> str:
+        from minds.knowledge_bases import KnowledgeBase, KnowledgeBaseConfig
+
         if isinstance(knowledge_base, KnowledgeBase):
             knowledge_base = knowledge_base.name
         elif isinstance(knowledge_base, KnowledgeBaseConfig):
@@ -316,6 +618,7 @@ class Minds:
             raise ValueError(f'Unknown type of knowledge base: {knowledge_base}')
         return knowledge_base
 
+    @instrument('Minds.create')
     def create(
         self, name,
         model_name=None,
@@ -355,6 +658,8 @@ class Minds:
         if name is not None:
             utils.validate_mind_name(name)
 
+        self._cache.pop(name, None)
+
         if replace:
             try:
                 self.get(name)
@@ -403,6 +708,7 @@ class Minds:
 
         return mind
 
+    @instrument('Minds.drop')
     def drop(self, name: str):
        """
        Drop mind by name
@@ -410,4 +716,5 @@ class Minds:
        :param name: name of the mind
        """
 
+       self._cache.pop(name, None)
        self.api.delete(f'/projects/{self.project}/minds/{name}')
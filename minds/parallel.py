@@ -0,0 +1,129 @@
+'''
+Fan-out of completions and ingestion across a process pool
+
+It is useful when CPU-bound work happens on the client side: preparing questions,
+parsing documents, building embeddings, etc. Mind and KnowledgeBase objects are sent
+to the worker processes once, as lightweight handles, and every worker opens its own connections.
+'''
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from minds.minds import Mind
+    from minds.knowledge_bases import KnowledgeBase, KnowledgeBaseDocument
+    from minds.knowledge_bases.preprocessing import PreprocessingConfig
+
+
+# state of the worker process, is set by initializer
+_worker = {}
+
+
+def _init_worker(target, prepare, kwargs):
+    _worker['target'] = target
+    _worker['prepare'] = prepare
+    _worker['kwargs'] = kwargs
+
+
+def _complete(item) -> str:
+    prepare = _worker['prepare']
+    message = prepare(item) if prepare is not None else item
+    return _worker['target'].completion(message, **_worker['kwargs'])
+
+
+def _insert(items: list) -> int:
+    prepare = _worker['prepare']
+    documents = [prepare(item) for item in items] if prepare is not None else items
+    _worker['target'].insert_documents(documents, **_worker['kwargs'])
+    return len(documents)
+
+
+def _bounded_map(executor, func: Callable, items: Iterable, max_in_flight: int) -> Iterator:
+    # unlike executor.map it doesn't consume the whole iterable at once
+    items = iter(items)
+    in_flight = deque(executor.submit(func, item) for item in islice(items, max_in_flight))
+    while in_flight:
+        result = in_flight.popleft().result()
+        for item in islice(items, 1):
+            in_flight.append(executor.submit(func, item))
+        yield result
+
+
+def _batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def map_completions(
+    mind: 'Mind',
+    messages: Iterable[Any],
+    processes: int = None,
+    prepare: Callable[[Any], str] = None,
+    max_in_flight: int = None,
+    mp_context=None,
+    **completion_kwargs
+) -> List[str]:
+    '''
+    Call completions of the mind in a process pool
+
+    :param mind: mind object
+    :param messages: questions, or items converted to questions by prepare
+    :param processes: number of worker processes, by default number of CPUs
+    :param prepare: picklable function executed in the worker to convert item to question, optional
+    :param max_in_flight: maximal number of submitted items, by default 2 per process
+    :param mp_context: multiprocessing context, optional
+    :param completion_kwargs: other arguments of mind.completion, for example priority
+    :return: answers in order of messages
+    '''
+    if completion_kwargs.get('stream'):
+        raise ValueError('Stream mode is not supported in process pool')
+    processes = processes or os.cpu_count()
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(mind, prepare, completion_kwargs),
+    ) as executor:
+        max_in_flight = max_in_flight or processes * 2
+        return list(_bounded_map(executor, _complete, messages, max_in_flight))
+
+
+def map_insert_documents(
+    knowledge_base: 'KnowledgeBase',
+    documents: Iterable[Any],
+    batch_size: int = 100,
+    processes: int = None,
+    prepare: Callable[[Any], 'KnowledgeBaseDocument'] = None,
+    preprocessing_config: 'PreprocessingConfig' = None,
+    max_in_flight: int = None,
+    mp_context=None,
+) -> int:
+    '''
+    Insert documents into the knowledge base in batches from a process pool
+
+    :param knowledge_base: knowledge base object
+    :param documents: documents, or items converted to documents by prepare
+    :param batch_size: number of documents in one request
+    :param processes: number of worker processes, by default number of CPUs
+    :param prepare: picklable function executed in the worker to convert item to KnowledgeBaseDocument, optional
+    :param preprocessing_config: preprocessing config of inserted documents, optional
+    :param max_in_flight: maximal number of submitted batches, by default 2 per process
+    :param mp_context: multiprocessing context, optional
+    :return: number of inserted documents
+    '''
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(knowledge_base, prepare, {'preprocessing_config': preprocessing_config}),
+    ) as executor:
+        max_in_flight = max_in_flight or processes * 2
+        return sum(_bounded_map(executor, _insert, _batches(documents, batch_size), max_in_flight))
@@ -0,0 +1,206 @@
+'''
+Clients of many tenants sharing connections
+
+Every tenant has its own API key. Tenant clients are lightweight views: connections to Minds API and
+to the LLM host are shared per host, the key of the tenant is sent with every request:
+
+    pool = ClientPool(max_tenants=1000, idle_timeout=600, max_connections=64)
+
+    def handle(request):
+        client = pool.client(request.api_key)
+        return client.minds.get('mind_name').completion(request.question)
+
+Least recently used tenants are evicted when there are more than max_tenants of them or they are idle longer
+than idle_timeout. A client which is still referenced continues to work after eviction.
+'''
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from minds.client import Client
+from minds.metrics import MetricsRegistry, MetricsSnapshot
+
+if TYPE_CHECKING:
+    from minds.usage import Budget
+    from minds.hedging import HedgingPolicy
+    from minds.scheduler import CompletionScheduler
+
+
+class TenantClient(Client):
+    '''
+    Client of a tenant using connections, metrics and hedger of the host client of the pool
+    '''
+
+    def __init__(self, api_key, host: Client, budget: 'Budget' = None, mind_budget: 'Budget' = None):
+        super().__init__(
+            api_key, host.api.base_url, budget=budget, mind_budget=mind_budget, scheduler=host.scheduler,
+            pool_size=host.api.pool_size, metrics=False,
+        )
+        self.host = host
+        self.api.shared = host.api
+        self.api.metrics = host.api.metrics
+        self.hedger = host.hedger
+
+    @property
+    def openai_client(self):
+        '''
+        OpenAI client of the tenant, it shares connections with OpenAI client of the host
+        '''
+        if self._openai_client is None:
+            with self._openai_lock:
+                if self._openai_client is None:
+                    self._openai_client = self.host.openai_client.with_options(api_key=self.api.api_key)
+        return self._openai_client
+
+    def close(self):
+        # connections and hedger belong to the host client, they are closed by pool.close()
+        ...
+
+
+class _Tenant:
+    __slots__ = ('client', 'used')
+
+    def __init__(self, client: TenantClient):
+        self.client = client
+        self.used = time.monotonic()
+
+
+class ClientPool:
+    def __init__(self, base_url=None, max_tenants: int = 1000, idle_timeout: float = None, max_connections: int = 32,
+                 budget: 'Budget' = None, mind_budget: 'Budget' = None, hedging: 'HedgingPolicy' = None,
+                 scheduler: 'CompletionScheduler' = None, metrics: bool = True):
+        '''
+        :param base_url: url of Minds server by default, optional
+        :param max_tenants: maximal number of kept tenant clients, least recently used are evicted
+        :param idle_timeout: seconds after the last use when tenant client is evicted, optional
+        :param max_connections: maximal number of connections to Minds API of each host,
+            requests wait for a free connection when all of them are busy
+        :param budget: token limits of each tenant, optional
+        :param mind_budget: token limits of each mind of each tenant, optional
+        :param hedging: policy of hedged completion requests, hedger is shared by tenants of the host
+        :param scheduler: scheduler shared by all tenants, optional
+        :param metrics: collect metrics of all tenants, see pool.metrics(), default is true
+        '''
+        if max_tenants < 1:
+            raise ValueError('max_tenants must be positive')
+        self.base_url = base_url
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.budget = budget
+        self.mind_budget = mind_budget
+        self.hedging = hedging
+        self.scheduler = scheduler
+        # metrics of all hosts and tenants
+        self._registry = MetricsRegistry() if metrics else None
+
+        # base url -> client which holds the shared connections
+        self._hosts = {}
+        # (base url, api key) -> tenant, ordered from least recently used
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _host(self, base_url) -> Client:
+        key = base_url or self.base_url
+        host = self._hosts.get(key)
+        if host is None:
+            # credentials of the host client are not used: every request has the key of the tenant
+            host = Client(
+                'pool', key, hedging=self.hedging, scheduler=self.scheduler, pool_size=self.max_connections,
+                metrics=False,
+            )
+            host.api.pool_block = True
+            # cookie jar of the shared session would send cookies of a tenant with requests of others
+            host.api.cookies = False
+            host.api.metrics = self._registry
+            self._hosts[key] = host
+        return host
+
+    def _evict_idle(self, now: float):
+        if self.idle_timeout is None:
+            return
+        while self._tenants:
+            tenant = next(iter(self._tenants.values()))
+            if now - tenant.used <= self.idle_timeout:
+                break
+            self._tenants.popitem(last=False)
+            self.evictions += 1
+
+    def client(self, api_key: str, base_url: str = None) -> TenantClient:
+        '''
+        Client of the tenant, it is created on first use and kept until it is evicted
+
+        :param api_key: Minds API key of the tenant
+        :param base_url: url of Minds server, base_url of the pool by default
+        :return: TenantClient, it has the same interface as Client
+        '''
+        now = time.monotonic()
+        key = (base_url or self.base_url, api_key)
+        with self._lock:
+            self._evict_idle(now)
+            tenant = self._tenants.get(key)
+            if tenant is not None:
+                self.hits += 1
+                tenant.used = now
+                self._tenants.move_to_end(key)
+                return tenant.client
+
+            self.misses += 1
+            client = TenantClient(api_key, self._host(base_url), budget=self.budget, mind_budget=self.mind_budget)
+            self._tenants[key] = _Tenant(client)
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+                self.evictions += 1
+            return client
+
+    def evict(self, api_key: str, base_url: str = None) -> bool:
+        '''
+        Remove client of the tenant from the pool
+
+        :return: true if it was in the pool
+        '''
+        with self._lock:
+            return self._tenants.pop((base_url or self.base_url, api_key), None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+
+    def close(self):
+        '''
+        Remove all tenants, close connections and stop threads of the host clients
+        '''
+        with self._lock:
+            self._tenants.clear()
+            hosts, self._hosts = list(self._hosts.values()), {}
+        for host in hosts:
+            host.close()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return {
+                'tenants': len(self._tenants),
+                'hosts': len(self._hosts),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def metrics(self) -> 'MetricsSnapshot':
+        '''
+        Metrics of requests of all tenants
+
+        :return: minds.metrics.MetricsSnapshot
+        '''
+        if self._registry is None:
+            return MetricsSnapshot({}, {})
+        return self._registry.snapshot()
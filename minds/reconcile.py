@@ -0,0 +1,340 @@
+'''
+Declarative management of datasources, knowledge bases and minds
+
+The desired state is compared with the current state of the server and only necessary calls are made:
+
+    client.apply({
+        'datasources': [{'name': 'my_ds', 'engine': 'postgres', 'description': '...', 'connection_data': {...}}],
+        'knowledge_bases': [{'name': 'my_kb', 'description': '...'}],
+        'minds': [{'name': 'my_mind', 'datasources': ['my_ds'], 'knowledge_bases': ['my_kb']}],
+    })
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+import minds.utils as utils
+from minds.datasources import DatabaseConfig, DatabaseTables
+from minds.knowledge_bases import KnowledgeBaseConfig
+from minds.knowledge_bases.knowledge_bases import KnowledgeBases
+from minds.minds import DEFAULT_PROMPT_TEMPLATE, _source_name
+
+
+class MindConfig(BaseModel):
+    '''Desired configuration of a mind. Not set fields are not compared with the server'''
+    name: str
+    model_name: Optional[str] = None
+    provider: Optional[str] = None
+    prompt_template: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+    datasources: List[Union[str, DatabaseTables]] = []
+    knowledge_bases: List[str] = []
+
+
+class DesiredState(BaseModel):
+    '''Objects that must exist on the server'''
+    datasources: List[DatabaseConfig] = []
+    knowledge_bases: List[KnowledgeBaseConfig] = []
+    minds: List[MindConfig] = []
+
+
+# execution levels: objects used by minds are created before and dropped after them
+_LEVELS = {
+    ('datasource', 'create'): 0,
+    ('datasource', 'update'): 0,
+    ('knowledge_base', 'create'): 0,
+    ('mind', 'create'): 1,
+    ('mind', 'update'): 1,
+    ('mind', 'attach'): 1,
+    ('mind', 'detach'): 1,
+    ('mind', 'drop'): 1,
+    ('datasource', 'drop'): 2,
+    ('knowledge_base', 'drop'): 2,
+}
+
+_SYMBOLS = {'create': '+', 'update': '~', 'attach': '>', 'detach': '<', 'drop': '-'}
+
+
+class Action:
+    '''One call to the server'''
+
+    def __init__(self, resource: str, kind: str, name: str, method: str, url: str,
+                 data: dict = None, details: str = None):
+        self.resource = resource
+        self.kind = kind
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.details = details
+
+    @property
+    def level(self) -> int:
+        return _LEVELS[(self.resource, self.kind)]
+
+    def __repr__(self):
+        text = f'{_SYMBOLS[self.kind]} {self.kind} {self.resource} {self.name}'
+        if self.details:
+            text += f': {self.details}'
+        return text
+
+
+class Plan:
+    '''List of actions to reach the desired state'''
+
+    def __init__(self, actions: List[Action], naive_calls: int, list_calls: int):
+        self.actions = sorted(actions, key=lambda action: action.level)
+        self.naive_calls = naive_calls
+        self.list_calls = list_calls
+
+    @property
+    def calls(self) -> int:
+        return self.list_calls + len(self.actions)
+
+    @property
+    def saved_calls(self) -> int:
+        return max(self.naive_calls - self.calls, 0)
+
+    def levels(self) -> List[List[Action]]:
+        levels = {}
+        for action in self.actions:
+            levels.setdefault(action.level, []).append(action)
+        return [levels[level] for level in sorted(levels)]
+
+    def __str__(self):
+        if not self.actions:
+            return 'No changes'
+        return '\n'.join(repr(action) for action in self.actions)
+
+    def __repr__(self):
+        return f'Plan(actions={len(self.actions)}, calls={self.calls}, saved_calls={self.saved_calls})'
+
+
+class ApplyResult:
+    def __init__(self, plan: Plan, executed: List[Action], errors: List[tuple], elapsed: float):
+        self.plan = plan
+        self.executed = executed
+        # list of (action, exception)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def calls(self) -> int:
+        return self.plan.list_calls + len(self.executed) + len(self.errors)
+
+    @property
+    def saved_calls(self) -> int:
+        return max(self.plan.naive_calls - self.calls, 0)
+
+    def __repr__(self):
+        return (f'ApplyResult(ok={self.ok}, executed={len(self.executed)}, errors={len(self.errors)}, '
+                f'calls={self.calls}, saved_calls={self.saved_calls})')
+
+
+def _ds_name(ds) -> str:
+    if isinstance(ds, str):
+        return ds
+    if isinstance(ds, dict):
+        return ds['name']
+    return ds.name
+
+
+def _ds_request(ds) -> dict:
+    if isinstance(ds, DatabaseTables) and ds.tables:
+        return {'name': ds.name, 'tables': ds.tables}
+    return {'name': _ds_name(ds)}
+
+
+class Reconciler:
+    # calls made by loops over create(update=True) / create(replace=True) for every object
+    NAIVE_DATASOURCE_CALLS = 2  # put, get
+    NAIVE_KNOWLEDGE_BASE_CALLS = 3  # get to check existence, post, get
+    NAIVE_MIND_CALLS = 4  # get, delete, post, get
+
+    def __init__(self, client):
+        self.client = client
+        self.api = client.api
+        self.project = client.minds.project
+
+    def plan(self, desired: Union[DesiredState, dict], prune: bool = False) -> Plan:
+        if not isinstance(desired, DesiredState):
+            desired = DesiredState.model_validate(desired)
+        for config in desired.datasources:
+            utils.validate_datasource_name(config.name)
+        for config in desired.minds:
+            utils.validate_mind_name(config.name)
+
+        # current state, every collection is listed once
+        current_ds = {ds.name: ds for ds in self.client.datasources.list()}
+        current_kb = {kb.name for kb in self.client.knowledge_bases.list()}
+        current_minds = {mind.name: mind for mind in self.client.minds.list()}
+
+        actions = []
+        actions += self._plan_datasources(desired, current_ds, prune)
+        actions += self._plan_knowledge_bases(desired, current_kb, prune)
+        actions += self._plan_minds(desired, current_minds, prune)
+
+        naive_calls = (
+            len(desired.datasources) * self.NAIVE_DATASOURCE_CALLS
+            + len(desired.knowledge_bases) * self.NAIVE_KNOWLEDGE_BASE_CALLS
+            + len(desired.minds) * self.NAIVE_MIND_CALLS
+        )
+        return Plan(actions, naive_calls=naive_calls, list_calls=3)
+
+    def _plan_datasources(self, desired: DesiredState, current: dict, prune: bool) -> List[Action]:
+        actions = []
+        for config in desired.datasources:
+            data = config.model_dump()
+            existing = current.get(config.name)
+            if existing is None:
+                actions.append(Action('datasource', 'create', config.name, 'post', '/datasources', data))
+                continue
+
+            changed = [
+                field for field in ('engine', 'description', 'connection_data', 'tables')
+                if (getattr(existing, field) or None) != (getattr(config, field) or None)
+            ]
+            if changed:
+                # update reconnects to the database, it is done only if the config is changed
+                actions.append(Action('datasource', 'update', config.name, 'put', f'/datasources/{config.name}',
+                                      data, details=', '.join(changed)))
+
+        if prune:
+            desired_names = {config.name for config in desired.datasources}
+            for name in current:
+                if name not in desired_names:
+                    actions.append(Action('datasource', 'drop', name, 'delete', f'/datasources/{name}'))
+        return actions
+
+    def _plan_knowledge_bases(self, desired: DesiredState, current: set, prune: bool) -> List[Action]:
+        # configuration of existing knowledge base can't be changed
+        actions = []
+        for config in desired.knowledge_bases:
+            if config.name not in current:
+                actions.append(Action('knowledge_base', 'create', config.name, 'post', '/knowledge_bases',
+                                      KnowledgeBases._create_request(config)))
+        if prune:
+            desired_names = {config.name for config in desired.knowledge_bases}
+            for name in current:
+                if name not in desired_names:
+                    actions.append(Action('knowledge_base', 'drop', name, 'delete', f'/knowledge_bases/{name}'))
+        return actions
+
+    def _plan_minds(self, desired: DesiredState, current: dict, prune: bool) -> List[Action]:
+        actions = []
+        url = f'/projects/{self.project}/minds'
+        for config in desired.minds:
+            existing = current.get(config.name)
+            if existing is None:
+                parameters = dict(config.parameters or {})
+                parameters['prompt_template'] = config.prompt_template or parameters.get(
+                    'prompt_template', DEFAULT_PROMPT_TEMPLATE
+                )
+                data = {
+                    'name': config.name,
+                    'model_name': config.model_name,
+                    'provider': config.provider,
+                    'parameters': parameters,
+                    'datasources': [_ds_request(ds) for ds in config.datasources],
+                    'knowledge_bases': list(config.knowledge_bases),
+                }
+                actions.append(Action('mind', 'create', config.name, 'post', url, data))
+                continue
+            actions += self._plan_mind_update(config, existing, f'{url}/{config.name}')
+
+        if prune:
+            desired_names = {config.name for config in desired.minds}
+            for name in current:
+                if name not in desired_names:
+                    actions.append(Action('mind', 'drop', name, 'delete', f'{url}/{name}'))
+        return actions
+
+    def _plan_mind_update(self, config: MindConfig, existing, url: str) -> List[Action]:
+        patch = {}
+        for field in ('model_name', 'provider'):
+            value = getattr(config, field)
+            if value is not None and value != getattr(existing, field):
+                patch[field] = value
+
+        parameters = {}
+        for key, value in (config.parameters or {}).items():
+            if existing.parameters.get(key) != value:
+                parameters[key] = value
+        if config.prompt_template is not None and config.prompt_template != existing.prompt_template:
+            parameters['prompt_template'] = config.prompt_template
+        if parameters:
+            patch['parameters'] = parameters
+
+        # sources are changed one by one or, if there are several changes, by one patch request
+        sources = []
+        desired_ds = {_ds_name(ds): ds for ds in config.datasources}
+        # sources of the mind are returned as names or as dicts
+        existing_ds = {_source_name(ds) for ds in existing.datasources or []}
+        for name in desired_ds:
+            if name not in existing_ds:
+                sources.append(('attach', 'datasources', name, _ds_request(desired_ds[name])))
+        for name in existing_ds:
+            if name not in desired_ds:
+                sources.append(('detach', 'datasources', name, None))
+
+        existing_kb = {_source_name(kb) for kb in existing.knowledge_bases or []}
+        for name in config.knowledge_bases:
+            if name not in existing_kb:
+                sources.append(('attach', 'knowledge_bases', name, {'name': name}))
+        for name in existing_kb:
+            if name not in config.knowledge_bases:
+                sources.append(('detach', 'knowledge_bases', name, None))
+
+        # tables of attached datasource can be set only by patch
+        with_tables = any(kind == 'attach' and 'tables' in data for kind, _, _, data in sources)
+        if patch or len(sources) > 1 or with_tables:
+            if any(collection == 'datasources' for _, collection, _, _ in sources):
+                patch['datasources'] = [_ds_request(ds) for ds in config.datasources]
+            if any(collection == 'knowledge_bases' for _, collection, _, _ in sources):
+                patch['knowledge_bases'] = list(config.knowledge_bases)
+        if patch:
+            return [Action('mind', 'update', config.name, 'patch', url, patch, details=', '.join(patch))]
+
+        actions = []
+        for kind, collection, name, data in sources:
+            if kind == 'attach':
+                actions.append(Action('mind', kind, config.name, 'post', f'{url}/{collection}', data,
+                                      details=f'{collection} {name}'))
+            else:
+                actions.append(Action('mind', kind, config.name, 'delete', f'{url}/{collection}/{name}',
+                                      details=f'{collection} {name}'))
+        return actions
+
+    def _execute(self, action: Action):
+        method = getattr(self.api, action.method)
+        if action.data is None:
+            method(action.url)
+        else:
+            method(action.url, data=action.data)
+
+    def apply(self, plan: Plan, max_workers: int = 8) -> ApplyResult:
+        start = time.monotonic()
+        executed = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for actions in plan.levels():
+                futures = [(action, executor.submit(self._execute, action)) for action in actions]
+                for action, future in futures:
+                    error = future.exception()
+                    if error is None:
+                        executed.append(action)
+                    else:
+                        errors.append((action, error))
+                if errors:
+                    # next levels depend on this one
+                    break
+
+        # cached minds could be changed
+        self.client.minds._cache.clear()
+        return ApplyResult(plan, executed, errors, time.monotonic() - start)
@@ -1,6 +1,9 @@
-import requests
+import threading
+import time
+from collections.abc import Mapping
 
 import minds.exceptions as exc
+from minds.metrics import MetricsRegistry
 
 
 def _raise_for_status(response):
@@ -14,11 +17,18 @@ def _raise_for_status(response):
         raise exc.Unauthorized(response.text)
 
     if 400 <= response.status_code < 600:
-        raise exc.UnknownError(f'{response.reason}: {response.text}')
+        raise exc.UnknownError(f'{response.reason}: {response.text}', status_code=response.status_code)
+
+
+def _content_length(headers) -> int:
+    # None if unknown
+    value = headers.get('Content-Length') if isinstance(headers, Mapping) else None
+    return int(value) if isinstance(value, str) and value.isdigit() else None
 
 
 class RestAPI:
-    def __init__(self, api_key, base_url=None):
+    def __init__(self, api_key, base_url=None, pool_size=10, metrics: bool = True, cassette=None,
+                 pool_block: bool = False):
         if base_url is None:
             base_url = 'https://mdb.ai'
 
@@ -27,52 +37,137 @@ class RestAPI:
             base_url = base_url + '/api'
         self.api_key = api_key
         self.base_url = base_url
+        self.pool_size = pool_size
+        # if true - requests wait for a free connection instead of opening more than pool_size connections
+        self.pool_block = pool_block
+        # if false - cookies set by responses are rejected, the session can be shared by several tenants
+        self.cookies = True
+        # RestAPI whose session is used instead of own one: connections are shared, see minds.pool
+        self.shared = None
+        # metrics of requests and operations, None if disabled
+        self.metrics = MetricsRegistry() if metrics else None
+        # minds.cassette.Cassette recording or replaying requests, optional
+        self.cassette = cassette
+        self._reset()
+
+    def _reset(self):
+        # is called after fork: connections of the parent process must not be used
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def __getstate__(self):
+        # pickled without connections
+        return {
+            'api_key': self.api_key, 'base_url': self.base_url, 'pool_size': self.pool_size,
+            'metrics': self.metrics is not None, 'cassette': self.cassette, 'pool_block': self.pool_block,
+            'cookies': self.cookies,
+        }
+
+    def __setstate__(self, state):
+        metrics = state.pop('metrics', True)
+        state.setdefault('cassette', None)
+        state.setdefault('pool_block', False)
+        state.setdefault('cookies', True)
+        self.__dict__.update(state)
+        self.shared = None
+        self.metrics = MetricsRegistry() if metrics else None
+        self._reset()
+
+    @property
+    def session(self):
+        """
+        Session keeps connections alive between requests. It is created on first use
+        """
+        if self.shared is not None:
+            return self.shared.session
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    import requests.adapters
+
+                    session = requests.Session()
+                    if not self.cookies:
+                        from http.cookiejar import DefaultCookiePolicy
+
+                        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size, pool_block=self.pool_block
+                    )
+                    if self.cassette is not None:
+                        adapter = self.cassette.adapter(adapter)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def close(self):
+        # shared session is closed by its owner
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
 
     def _headers(self):
         return {'Authorization': 'Bearer ' + self.api_key,  'Content-Type': 'application/json',}
 
-    def get(self, url):
-        resp = requests.get(self.base_url + url, headers=self._headers())
-
-        _raise_for_status(resp)
-        return resp
-
-    def delete(self, url, data={}):
-        resp = requests.delete(
-            self.base_url + url,
-            headers=self._headers(),
-            json=data
+    def _request(self, method: str, url: str, **kwargs):
+        send = getattr(self.session, method.lower())
+        if self.metrics is None:
+            resp = send(self.base_url + url, **kwargs)
+            _raise_for_status(resp)
+            return resp
+
+        start = time.perf_counter()
+        try:
+            resp = send(self.base_url + url, **kwargs)
+        except Exception:
+            self.metrics.observe('minds_http_request_duration_seconds', (method, 'error'), time.perf_counter() - start)
+            raise
+        self.metrics.observe(
+            'minds_http_request_duration_seconds', (method, str(resp.status_code)), time.perf_counter() - start
         )
+        request_bytes = _content_length(getattr(resp.request, 'headers', None))
+        if request_bytes:
+            self.metrics.inc('minds_http_request_bytes_total', (method,), request_bytes)
+        response_bytes = _content_length(resp.headers)
+        if response_bytes is None and isinstance(resp.content, bytes):
+            response_bytes = len(resp.content)
+        if response_bytes:
+            self.metrics.inc('minds_http_response_bytes_total', (method,), response_bytes)
 
         _raise_for_status(resp)
         return resp
 
-    def post(self, url, data={}):
-        resp = requests.post(
-            self.base_url + url,
-            headers=self._headers(),
-            json=data,
-        )
+    def get(self, url, headers: dict = None):
+        # headers: additional headers of the request, for example If-None-Match
+        request_headers = self._headers()
+        if headers:
+            request_headers.update(headers)
+        return self._request('GET', url, headers=request_headers)
 
-        _raise_for_status(resp)
-        return resp
-
-    def put(self, url, data={}):
-        resp = requests.put(
-            self.base_url + url,
-            headers=self._headers(),
-            json=data,
-        )
+    def delete(self, url, data={}):
+        return self._request('DELETE', url, headers=self._headers(), json=data)
 
-        _raise_for_status(resp)
-        return resp
+    def post(self, url, data={}):
+        return self._request('POST', url, headers=self._headers(), json=data)
+
+    def put(self, url, data={}, body: bytes = None, headers: dict = None):
+        # body: already serialized json, it is sent instead of data
+        # headers: additional headers of the request
+        request_headers = self._headers()
+        if headers:
+            request_headers.update(headers)
+        if body is not None:
+            return self._request('PUT', url, headers=request_headers, data=body)
+        return self._request('PUT', url, headers=request_headers, json=data)
 
     def patch(self, url, data={}):
-        resp = requests.patch(
-            self.base_url + url,
-            headers=self._headers(),
-            json=data,
-        )
-
-        _raise_for_status(resp)
-        return resp
+        return self._request('PATCH', url, headers=self._headers(), json=data)
+
+    def connect(self):
+        """
+        Open a connection to the server.
+        The connection is held by returned response until it is closed, then it goes to the pool
+        """
+        return self.session.head(self.base_url, headers=self._headers(), stream=True)
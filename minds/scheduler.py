@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Sequence
+
+import minds.exceptions as exc
+
+
+DEFAULT_PRIORITIES = ('interactive', 'batch')
+# waiting completions check releases queued by finalizers of slots with this interval, seconds
+_PENDING_INTERVAL = 0.05
+
+
+class _Waiter:
+    def __init__(self, mind_name, priority, tenant):
+        self.mind_name = mind_name
+        self.priority = priority
+        self.tenant = tenant
+        self.enqueued_at = time.monotonic()
+        self.event = threading.Event()
+
+
+class _QueueTimes:
+    '''Recent queue times of one priority class'''
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def to_dict(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            if not recent:
+                return None
+            return recent[min(int(len(recent) * p), len(recent) - 1)]
+
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': pct(0.5),
+            'p99': pct(0.99),
+            'max': self.max,
+        }
+
+
+class Slot:
+    '''Permission to run one completion. Must be released when the completion is finished'''
+
+    def __init__(self, scheduler: 'CompletionScheduler', mind_name: str):
+        self._scheduler = scheduler
+        self._mind_name = mind_name
+        self._epoch = scheduler._epoch
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self._mind_name, self._epoch)
+
+    def __del__(self):
+        # for example not consumed stream. The finalizer can run in any thread while the lock is held:
+        # the release is only queued and is applied by the scheduler under the lock
+        if not self._released:
+            self._released = True
+            self._scheduler._pending.append((self._mind_name, self._epoch))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class CompletionScheduler:
+    '''
+    Limits the number of concurrent completions and orders waiting ones
+
+     - waiting completions of a higher priority class are started first
+     - inside of a priority class tenants are served in round-robin order
+     - number of running completions is limited globally and per mind
+    '''
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        mind_concurrency: Optional[int] = None,
+        priorities: Sequence[str] = DEFAULT_PRIORITIES,
+        default_priority: Optional[str] = None,
+        window: int = 1000,
+    ):
+        '''
+        :param max_concurrency: maximal number of running completions of the client
+        :param mind_concurrency: maximal number of running completions of one mind, optional
+        :param priorities: names of priority classes, from the highest to the lowest
+        :param default_priority: priority of completions without it, by default the highest one
+        :param window: number of recent queue times kept for percentiles
+        '''
+        self._args = (max_concurrency, mind_concurrency, tuple(priorities), default_priority, window)
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be positive')
+        if mind_concurrency is not None and mind_concurrency < 1:
+            raise ValueError('mind_concurrency must be positive')
+
+        self.max_concurrency = max_concurrency
+        self.mind_concurrency = mind_concurrency
+        self.priorities = list(priorities)
+        self.default_priority = default_priority or self.priorities[0]
+        if self.default_priority not in self.priorities:
+            raise ValueError(f'Unknown priority: {self.default_priority}')
+
+        self._queue_times = {priority: _QueueTimes(window) for priority in self.priorities}
+        self._epoch = 0
+        self._after_fork()
+
+    def _after_fork(self):
+        # running and waiting completions belong to threads of the parent process.
+        # Slots acquired before are stale: their release doesn't change the new state
+        self._epoch += 1
+        self._lock = threading.Lock()
+        self._running = 0
+        self._running_by_mind: Dict[str, int] = {}
+        # releases of garbage collected slots, applied under the lock
+        self._pending = deque()
+        # priority -> tenant -> queue of waiters
+        self._queues = {priority: OrderedDict() for priority in self.priorities}
+
+    def __reduce__(self):
+        # pickled as configuration, without state
+        return CompletionScheduler, self._args
+
+    def acquire(self, mind_name: str, priority: str = None, tenant: str = None, timeout: float = None) -> Slot:
+        '''
+        Wait for a slot to run the completion
+
+        :param mind_name: name of the mind
+        :param priority: name of priority class, optional
+        :param tenant: tenant to share capacity fairly between, optional
+        :param timeout: maximal seconds to wait, optional
+        :return: slot object, must be released
+        '''
+        if priority is None:
+            priority = self.default_priority
+        if priority not in self._queues:
+            raise ValueError(f'Unknown priority: {priority}')
+
+        waiter = _Waiter(mind_name, priority, tenant)
+        with self._lock:
+            self._apply_pending()
+            self._queues[priority].setdefault(tenant, deque()).append(waiter)
+            self._dispatch()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = _PENDING_INTERVAL if deadline is None else min(_PENDING_INTERVAL, deadline - time.monotonic())
+            if waiter.event.wait(max(wait, 0)):
+                break
+            with self._lock:
+                if self._pending:
+                    self._apply_pending()
+                    self._dispatch()
+                if waiter.event.is_set():
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._remove(waiter)
+                    raise exc.SchedulerTimeout(f'Completion of {mind_name} was not scheduled in {timeout} seconds')
+
+        return Slot(self, mind_name)
+
+    def _remove(self, waiter: _Waiter):
+        tenants = self._queues[waiter.priority]
+        queue = tenants[waiter.tenant]
+        queue.remove(waiter)
+        if not queue:
+            del tenants[waiter.tenant]
+
+    def _can_run(self, mind_name: str) -> bool:
+        if self.mind_concurrency is None:
+            return True
+        return self._running_by_mind.get(mind_name, 0) < self.mind_concurrency
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in self.priorities:
+            tenants = self._queues[priority]
+            for tenant, queue in tenants.items():
+                for waiter in queue:
+                    if self._can_run(waiter.mind_name):
+                        return waiter
+        return None
+
+    def _dispatch(self):
+        # must be called under the lock
+        while self._running < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._remove(waiter)
+            # served tenant goes to the end of round-robin order
+            tenants = self._queues[waiter.priority]
+            if waiter.tenant in tenants:
+                tenants.move_to_end(waiter.tenant)
+
+            self._running += 1
+            self._running_by_mind[waiter.mind_name] = self._running_by_mind.get(waiter.mind_name, 0) + 1
+            self._queue_times[waiter.priority].add(time.monotonic() - waiter.enqueued_at)
+            waiter.event.set()
+
+    def _free(self, mind_name: str, epoch: int):
+        # must be called under the lock
+        if epoch != self._epoch:
+            # acquired in the parent process
+            return
+        self._running -= 1
+        count = self._running_by_mind[mind_name] - 1
+        if count:
+            self._running_by_mind[mind_name] = count
+        else:
+            del self._running_by_mind[mind_name]
+
+    def _apply_pending(self):
+        # must be called under the lock
+        while self._pending:
+            self._free(*self._pending.popleft())
+
+    def _release(self, mind_name: str, epoch: int):
+        with self._lock:
+            self._apply_pending()
+            self._free(mind_name, epoch)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        '''
+        :return: running and queued completions, queue times in seconds per priority class
+        '''
+        with self._lock:
+            if self._pending:
+                self._apply_pending()
+                self._dispatch()
+            return {
+                'running': self._running,
+                'running_by_mind': dict(self._running_by_mind),
+                'queued': {
+                    priority: sum(len(queue) for queue in tenants.values())
+                    for priority, tenants in self._queues.items()
+                },
+                'queue_time': {
+                    priority: times.to_dict()
+                    for priority, times in self._queue_times.items()
+                },
+            }
@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+import minds.exceptions as exc
+
+
+class Budget(BaseModel):
+    '''Token spend limits for completions'''
+    soft_limit: Optional[int] = Field(
+        default=None,
+        description='When total tokens exceed this value new completions are delayed',
+        ge=0
+    )
+    hard_limit: Optional[int] = Field(
+        default=None,
+        description='When total tokens exceed this value new completions are rejected',
+        ge=0
+    )
+    soft_limit_delay: float = Field(
+        default=1.0,
+        description='Seconds to wait before each completion while the soft limit is exceeded',
+        ge=0
+    )
+
+
+class Usage:
+    '''Accumulated token counts of completions'''
+
+    def __init__(self, prompt_tokens: int = 0, completion_tokens: int = 0, requests: int = 0):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.requests = requests
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.requests += 1
+
+    def copy(self) -> 'Usage':
+        return Usage(self.prompt_tokens, self.completion_tokens, self.requests)
+
+    def __eq__(self, other):
+        if not isinstance(other, Usage):
+            return NotImplemented
+        return (self.prompt_tokens, self.completion_tokens, self.requests) == \
+            (other.prompt_tokens, other.completion_tokens, other.requests)
+
+    def __repr__(self):
+        return (f'Usage(prompt_tokens={self.prompt_tokens}, '
+                f'completion_tokens={self.completion_tokens}, '
+                f'total_tokens={self.total_tokens}, '
+                f'requests={self.requests})')
+
+
+class UsageTracker:
+    '''
+    Aggregates token usage of completions per client and per mind, and enforces budgets
+
+    Budgets are checked before a completion is sent:
+     - if the hard limit is exceeded, exceptions.BudgetExceeded is raised
+     - if the soft limit is exceeded, the call is delayed by budget.soft_limit_delay
+    '''
+
+    def __init__(self, budget: Budget = None, mind_budget: Budget = None):
+        '''
+        :param budget: limits for all completions of the client, optional
+        :param mind_budget: limits applied to every mind separately, optional
+        '''
+        self.budget = budget
+        self.mind_budget = mind_budget
+        self._total = Usage()
+        self._minds: Dict[str, Usage] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> Usage:
+        with self._lock:
+            return self._total.copy()
+
+    def get(self, mind_name: str) -> Usage:
+        '''
+        Usage of one mind
+
+        :param mind_name: name of the mind
+        :return: usage object
+        '''
+        with self._lock:
+            usage = self._minds.get(mind_name)
+            return usage.copy() if usage is not None else Usage()
+
+    def by_mind(self) -> Dict[str, Usage]:
+        with self._lock:
+            return {name: usage.copy() for name, usage in self._minds.items()}
+
+    def record(self, mind_name: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self._total.add(prompt_tokens, completion_tokens)
+            if mind_name not in self._minds:
+                self._minds[mind_name] = Usage()
+            self._minds[mind_name].add(prompt_tokens, completion_tokens)
+
+    def record_response_usage(self, mind_name: str, usage) -> Optional[Usage]:
+        '''
+        Record usage object returned by openai (CompletionUsage)
+
+        :return: usage of this call or None if server didn't return it
+        '''
+        if usage is None:
+            return None
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        self.record(mind_name, prompt_tokens, completion_tokens)
+        return Usage(prompt_tokens, completion_tokens, 1)
+
+    def check(self, mind_name: str):
+        '''
+        Check budgets before a new completion. Blocks if soft limit is exceeded
+
+        :param mind_name: name of the mind
+        '''
+        delay = 0
+        with self._lock:
+            checks = [(self.budget, self._total, 'client')]
+            if self.mind_budget is not None and mind_name in self._minds:
+                checks.append((self.mind_budget, self._minds[mind_name], f'mind {mind_name}'))
+
+            for budget, usage, scope in checks:
+                if budget is None:
+                    continue
+                if budget.hard_limit is not None and usage.total_tokens >= budget.hard_limit:
+                    raise exc.BudgetExceeded(
+                        f'Token budget of {scope} is exceeded: {usage.total_tokens} >= {budget.hard_limit}'
+                    )
+                if budget.soft_limit is not None and usage.total_tokens >= budget.soft_limit:
+                    delay = max(delay, budget.soft_limit_delay)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def _after_fork(self):
+        # the lock could be held by a thread of the parent process
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._total = Usage()
+            self._minds = {}
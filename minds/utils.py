@@ -1,13 +1,28 @@
 import re
+import ipaddress
 import minds.exceptions as exc
 from urllib.parse import urlparse, urlunparse
 
+
+def _is_local_host(hostname: str) -> bool:
+    if hostname == 'localhost':
+        return True
+    try:
+        ipaddress.ip_address(hostname)
+    except ValueError:
+        return False
+    return True
+
+
 def get_openai_base_url(base_url: str) -> str:
     parsed = urlparse(base_url)
 
     netloc = parsed.netloc
     if netloc == 'mdb.ai':
         llm_host = 'llm.mdb.ai'
+    elif _is_local_host(parsed.hostname):
+        # local server serves llm endpoint on the same host
+        llm_host = netloc
     else:
         llm_host = 'ai.' + netloc
 
@@ -0,0 +1,243 @@
+'''
+Watching changes of minds, datasources and knowledge bases
+
+Lists of the resources are polled with conditional requests (If-None-Match): an unchanged list is not downloaded
+again. Items of a changed list are compared with the local snapshot by `updated_at` and hash of their content,
+and only added or changed items are hydrated. The poll interval is shortened while
+changes are coming and grows while there are none.
+
+    for event in client.watch(['minds', 'datasources'], interval=5):
+        print(event.type, event.resource, event.name)
+
+    watcher = client.watch(interval=5).start(callback)   # in background thread
+    watcher.stop()
+
+    async for event in client.watch(interval=5):
+        ...
+'''
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from minds.metrics import instrument
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+RESOURCES = ('minds', 'datasources', 'knowledge_bases')
+
+
+class WatchEvent:
+    def __init__(self, type: str, resource: str, name: str, item: Any = None):
+        '''
+        :param type: added, changed or removed
+        :param resource: minds, datasources or knowledge_bases
+        :param name: name of the item
+        :param item: Mind, Datasource or KnowledgeBase object, None for removed item
+        '''
+        self.type = type
+        self.resource = resource
+        self.name = name
+        self.item = item
+
+    def __repr__(self):
+        return f'WatchEvent({self.type}, {self.resource}, {self.name})'
+
+
+def _version(item: dict) -> str:
+    # content can be changed without a change of updated_at: both are compared
+    digest = hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode()).hexdigest()
+    return f'{item.get("updated_at") or ""}:{digest}'
+
+
+class _Resource:
+    '''Local snapshot of a watched resource'''
+
+    def __init__(self, name: str, url: str, hydrate: Callable[[dict], Any], accept: Callable[[dict], bool] = None):
+        self.name = name
+        self.url = url
+        self.hydrate = hydrate
+        self.accept = accept
+        # ETag of the last downloaded list
+        self.etag = None
+        # name of item -> version
+        self.versions = None
+
+
+class Watcher:
+    def __init__(self, client, resources: Iterable[str] = RESOURCES, interval: float = 5.0,
+                 min_interval: float = None, max_interval: float = None, initial: bool = False):
+        '''
+        :param client: Client object
+        :param resources: names of watched resources: minds, datasources, knowledge_bases
+        :param interval: first interval between polls, seconds
+        :param min_interval: shortest interval while changes are coming, default is interval / 4
+        :param max_interval: longest interval while there are no changes, default is interval * 4
+        :param initial: if true - existing items are returned as added by the first poll,
+            otherwise the first poll only takes the snapshot
+        '''
+        self.client = client
+        self.api = client.api
+        self.interval = interval
+        self.min_interval = interval / 4 if min_interval is None else min_interval
+        self.max_interval = interval * 4 if max_interval is None else max_interval
+        self.initial = initial
+
+        self._resources = [self._resource(name) for name in resources]
+        self._stop = threading.Event()
+        self._thread = None
+        # error of the last poll or of the callback of its events in the background thread
+        self.last_error = None
+
+    def _resource(self, name: str) -> _Resource:
+        if name == 'minds':
+            from minds.minds import Mind
+
+            return _Resource(
+                name, f'/projects/{self.client.minds.project}/minds', lambda item: Mind(self.client, **item)
+            )
+        if name == 'datasources':
+            from minds.datasources import Datasource
+
+            # not sql skills are skipped as in Datasources.list
+            return _Resource(
+                name, '/datasources', lambda item: Datasource(**item), lambda item: item.get('engine') is not None
+            )
+        if name == 'knowledge_bases':
+            from minds.knowledge_bases import KnowledgeBase
+
+            return _Resource(name, '/knowledge_bases', lambda item: KnowledgeBase(item['name'], self.api))
+        raise ValueError(f'Unknown resource: {name}, expected one of: {", ".join(RESOURCES)}')
+
+    def _fetch(self, resource: _Resource) -> Optional[Tuple[Optional[str], Dict[str, dict]]]:
+        '''
+        :return: ETag and items of the list by name, None if the list is not changed
+        '''
+        headers = {'If-None-Match': resource.etag} if resource.etag else None
+        response = self.api.get(resource.url, headers=headers)
+        if response.status_code == 304:
+            return None
+
+        items = {}
+        for item in response.json():
+            if resource.accept is None or resource.accept(item):
+                items[item['name']] = item
+        return response.headers.get('ETag'), items
+
+    def _changes(self, resource: _Resource, items: Dict[str, dict], versions: Dict[str, str]) -> List[WatchEvent]:
+        previous = resource.versions
+        if previous is None:
+            if not self.initial:
+                return []
+            previous = {}
+
+        events = []
+        for name, version in versions.items():
+            if name not in previous:
+                events.append(WatchEvent(ADDED, resource.name, name, resource.hydrate(items[name])))
+            elif previous[name] != version:
+                events.append(WatchEvent(CHANGED, resource.name, name, resource.hydrate(items[name])))
+        for name in previous:
+            if name not in versions:
+                events.append(WatchEvent(REMOVED, resource.name, name))
+        return events
+
+    @instrument('Watcher.poll')
+    def poll(self) -> List[WatchEvent]:
+        '''
+        Request the resources once and adapt the interval. The snapshot is updated only if all resources
+        are received, otherwise the changes are returned again by the next poll
+
+        :return: changes since the previous poll
+        '''
+        fetched = [(resource, self._fetch(resource)) for resource in self._resources]
+
+        events = []
+        updates = []
+        for resource, result in fetched:
+            if result is None:
+                continue
+            etag, items = result
+            versions = {name: _version(item) for name, item in items.items()}
+            events.extend(self._changes(resource, items, versions))
+            updates.append((resource, etag, versions))
+        for resource, etag, versions in updates:
+            resource.etag = etag
+            resource.versions = versions
+
+        if events:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.25)
+        return events
+
+    def snapshot(self) -> Dict[str, Optional[Dict[str, str]]]:
+        '''
+        :return: resource -> name of item -> version, None if the resource is not polled yet
+        '''
+        return {resource.name: resource.versions for resource in self._resources}
+
+    def __iter__(self) -> Iterator[WatchEvent]:
+        while not self._stop.is_set():
+            yield from self.poll()
+            self._stop.wait(self.interval)
+
+    async def __aiter__(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            for event in await loop.run_in_executor(None, self.poll):
+                yield event
+            await asyncio.sleep(self.interval)
+
+    def _run(self, callback: Callable[[WatchEvent], Any]):
+        while not self._stop.is_set():
+            error = None
+            try:
+                events = self.poll()
+            except Exception as e:
+                # the server is unavailable: wait longer and try again
+                error = e
+                self.interval = self.max_interval
+                events = []
+            for event in events:
+                try:
+                    callback(event)
+                except Exception as e:
+                    # the callback failed: the event is skipped, polling goes on
+                    error = e
+            self.last_error = error
+            self._stop.wait(self.interval)
+
+    def start(self, callback: Callable[[WatchEvent], Any]) -> 'Watcher':
+        '''
+        Poll in background thread until stop() is called, errors of requests and of the callback are kept
+        in last_error
+
+        :param callback: function called with every event from the background thread
+        :return: the watcher
+        '''
+        if self._thread is not None:
+            raise RuntimeError('Watcher is already started')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,), daemon=True, name='minds-watch')
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        '''
+        Stop polling: the background thread and iterators are finished after the current poll
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
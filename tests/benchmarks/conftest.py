@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # every run is saved to .benchmarks/ named by the commit, to be compared across commits:
+    #   pytest tests/benchmarks --benchmark-compare
+    if getattr(config.option, 'benchmark_disable', True) or config.option.benchmark_autosave:
+        return
+    from pytest_benchmark.utils import get_tag
+
+    config.option.benchmark_autosave = get_tag()
@@ -0,0 +1,151 @@
+'''
+Micro-benchmarks of hot paths of the SDK against the in-process LocalServer
+
+    pytest tests/benchmarks                        # run and save results to .benchmarks
+    pytest tests/benchmarks --benchmark-compare    # compare with the previous saved run
+    pytest tests/benchmarks --benchmark-disable    # run once as tests
+'''
+from collections import deque
+
+import pytest
+
+from minds.client import Client
+from minds.datasources import Datasource, DatabaseConfig, DatabaseTables
+from minds.knowledge_bases import KnowledgeBaseDocument, PreprocessingConfig
+from minds.local_server import LocalServer
+from minds.minds import Mind
+
+SIZES = [10, 1000, 100000]
+
+
+def mind_item(i: int) -> dict:
+    # as returned by the server
+    return {
+        'name': f'mind_{i}',
+        'model_name': 'gpt-4o',
+        'provider': 'openai',
+        'parameters': {'prompt_template': 'Answer the question: {{question}}', 'temperature': 0.1},
+        'datasources': ['sales', 'customers'],
+        'knowledge_bases': ['docs'],
+        'created_at': '2025-01-01T00:00:00',
+        'updated_at': '2025-01-01T00:00:00',
+    }
+
+
+DATASOURCE = {
+    'name': 'sales',
+    'engine': 'postgres',
+    'description': 'sales data',
+    'connection_data': {'host': 'localhost', 'port': 5432, 'user': 'demo', 'password': 'demo', 'database': 'sales'},
+    'tables': ['orders', 'customers', 'products'],
+}
+
+PREPROCESSING = {
+    'type': 'contextual',
+    'contextual_config': {
+        'llm_config': {'model_name': 'gpt-4o', 'provider': 'openai', 'params': {'temperature': 0}},
+        'context_template': 'Summarize: {{chunk}}',
+        'chunk_size': 500,
+        'chunk_overlap': 50,
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        server.state.datasources['sales'] = dict(DATASOURCE)
+        yield server
+
+
+@pytest.fixture(scope='module')
+def client(server):
+    return Client('key', base_url=server.url)
+
+
+@pytest.fixture(scope='module', params=SIZES)
+def minds_server(request):
+    with LocalServer() as server:
+        minds = server.state.project_minds('mindsdb')
+        for i in range(request.param):
+            minds[f'mind_{i}'] = mind_item(i)
+        yield server, request.param
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_mind_construction(benchmark, client, size):
+    items = [mind_item(i) for i in range(size)]
+
+    minds = benchmark(lambda: [Mind(client, **item) for item in items])
+    assert len(minds) == size
+
+
+def test_minds_list(benchmark, minds_server):
+    server, size = minds_server
+    client = Client('key', base_url=server.url)
+
+    minds = benchmark(client.minds.list)
+    assert len(minds) == size
+
+
+def test_datasource_validation(benchmark):
+    items = [dict(DATASOURCE, name=f'ds_{i}') for i in range(1000)]
+
+    datasources = benchmark(lambda: [Datasource.model_validate(item) for item in items])
+    assert datasources[-1].name == 'ds_999'
+
+
+@pytest.mark.parametrize('method', ['model_dump', 'model_dump_json'])
+def test_document_dump(benchmark, method):
+    documents = [
+        KnowledgeBaseDocument(id=i, content='text of the document ' * 20, metadata={'source': 'bench', 'page': i})
+        for i in range(10000)
+    ]
+
+    rows = benchmark(lambda: [getattr(document, method)() for document in documents])
+    assert len(rows) == len(documents)
+
+
+def test_preprocessing_config_validation(benchmark):
+    config = benchmark(PreprocessingConfig.model_validate, PREPROCESSING)
+    assert config.contextual_config.chunk_size == 500
+
+
+@pytest.mark.parametrize('kind', ['name', 'tables', 'config'])
+def test_check_datasource(benchmark, client, kind):
+    datasource = {
+        'name': 'sales',
+        'tables': DatabaseTables(name='sales', tables=['orders']),
+        # existence of the datasource is checked by a request
+        'config': DatabaseConfig(**DATASOURCE),
+    }[kind]
+
+    result = benchmark(client.minds._check_datasource, datasource)
+    assert result['name'] == 'sales'
+
+
+def test_stream_deltas(benchmark, client):
+    from openai.types.chat import ChatCompletionChunk
+
+    def chunk(i, **kwargs):
+        return ChatCompletionChunk.model_validate({
+            'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'bench_mind', **kwargs
+        })
+
+    chunks = [chunk(i, choices=[{'index': 0, 'delta': {'content': f'token{i} '}}]) for i in range(1000)]
+    chunks.append(chunk(0, choices=[], usage={'prompt_tokens': 2, 'completion_tokens': 1000, 'total_tokens': 1002}))
+    mind = Mind(client, 'bench_mind')
+
+    def iterate():
+        deque(mind._stream_response(iter(chunks)), maxlen=0)
+
+    benchmark(iterate)
+    assert mind.last_usage.completion_tokens == 1000
+
+
+def test_import_time(benchmark):
+    from minds.bench import measure_import_time
+
+    # every run imports in a new interpreter, the time reported by -X importtime is kept with the results
+    result = benchmark.pedantic(measure_import_time, args=('minds.client',), kwargs={'runs': 1}, rounds=3)
+    benchmark.extra_info['cumulative_us'] = result['cumulative_us']
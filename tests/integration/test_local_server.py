@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from minds.client import Client
+from minds.datasources import DatabaseConfig
+from minds.exceptions import ObjectNotFound, UnknownError
+from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.local_server import LocalServer
+
+
+def make_datasource(name='local_ds'):
+    return DatabaseConfig(
+        name=name,
+        engine='postgres',
+        description='local datasource',
+        connection_data={'host': 'localhost', 'port': 5432, 'database': 'demo'},
+        tables=['orders'],
+    )
+
+
+def test_base_flow():
+    with LocalServer(latency='uniform:0,0.005', seed=1) as server:
+        client = Client('key', base_url=server.url)
+
+        ds = client.datasources.create(make_datasource())
+        assert client.datasources.get(ds.name).tables == ['orders']
+        assert [item.name for item in client.datasources.list()] == [ds.name]
+
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='local_kb', description='kb'))
+        kb.insert_documents([KnowledgeBaseDocument(id=1, content='orders of customers')])
+
+        mind = client.minds.create(name='local_mind', datasources=[ds], knowledge_bases=[kb.name])
+        mind.update(model_name='gpt-4o')
+        assert client.minds.get('local_mind').model_name == 'gpt-4o'
+        assert mind.completion('count orders').startswith('count orders')
+
+        client.minds.drop('local_mind')
+        client.datasources.drop(ds.name)
+        with pytest.raises(ObjectNotFound):
+            client.minds.get('local_mind')
+
+
+def test_injected_errors():
+    with LocalServer(error_rate=1.0) as server:
+        client = Client('key', base_url=server.url)
+        with pytest.raises(UnknownError, match='Injected error'):
+            client.minds.list()
+        assert server.stats['errors'] == 1
+
+    with LocalServer(rate_limit_rate=1.0) as server:
+        client = Client('key', base_url=server.url)
+        with pytest.raises(UnknownError, match='Too many requests'):
+            client.datasources.list()
+        assert server.stats['throttled'] == 1
+
+
+def test_completion_retries():
+    # completions are retried by openai client, 429 after Retry-After
+    with LocalServer(error_rate=0.15, rate_limit_rate=0.15, retry_after=0.01, seed=3) as server:
+        client = Client('key', base_url=server.url)
+        server.error_rate = server.rate_limit_rate = 0
+        mind = client.minds.create(name='retry_mind')
+        server.error_rate = server.rate_limit_rate = 0.15
+
+        answers = [mind.completion('hello') for _ in range(10)]
+        assert all(answer.startswith('hello') for answer in answers)
+        assert server.stats['errors'] + server.stats['throttled'] > 0
+        assert server.stats['requests'] > 10
+
+
+def test_rate_limit_under_concurrency():
+    with LocalServer(rate_limit=20, latency='exponential:0.005', seed=1) as server:
+        client = Client('key', base_url=server.url)
+        client.minds.create(name='limited_mind')
+
+        def call(_):
+            try:
+                client.minds.get('limited_mind')
+                return 'ok'
+            except UnknownError:
+                return 'throttled'
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(60)))
+        # burst of one second is allowed, then requests are limited to the rate
+        assert 'ok' in results and 'throttled' in results
+        assert results.count('throttled') == server.stats['throttled']
+
+
+def test_slow_and_dropped_streams():
+    with LocalServer(slow_stream_rate=1.0, slow_token_latency=0.02, answer_tokens=10) as server:
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='slow_mind')
+
+        start = time.perf_counter()
+        chunks = [delta.content for delta in mind.completion('hello', stream=True) if delta.content]
+        assert len(chunks) == 10
+        assert time.perf_counter() - start >= 0.18
+        assert server.stats['slow_streams'] == 1
+
+    with LocalServer(stream_drop_rate=1.0, answer_tokens=10) as server:
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='dropped_mind')
+
+        received = []
+        with pytest.raises(Exception):
+            for delta in mind.completion('hello', stream=True):
+                received.append(delta.content)
+        assert 0 < len([content for content in received if content]) < 10
+        assert server.stats['dropped_streams'] == 1
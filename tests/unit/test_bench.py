@@ -0,0 +1,180 @@
+import asyncio
+import random
+import threading
+
+import pytest
+
+from minds import bench
+from minds.client import Client
+from minds.datasources.examples import example_ds
+from minds.exceptions import ObjectNotFound
+from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.local_server import Latency, LocalServer, _RateLimiter
+from minds.utils import get_openai_base_url
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_openai_base_url_of_local_server():
+    assert get_openai_base_url('http://127.0.0.1:8000/api') == 'http://127.0.0.1:8000'
+    assert get_openai_base_url('http://localhost:8000/api') == 'http://localhost:8000'
+    assert get_openai_base_url('https://mdb.ai/api') == 'https://llm.mdb.ai'
+    assert get_openai_base_url('https://dev.mdb.ai/api') == 'https://ai.dev.mdb.ai'
+
+
+class TestLocalServer:
+
+    def test_minds_flow(self, server):
+        client = Client('key', base_url=server.url)
+
+        ds = client.datasources.create(example_ds, update=True)
+        assert ds.name == example_ds.name
+
+        mind = client.minds.create(name='local_mind', datasources=[ds], replace=True)
+        assert mind.datasources == [example_ds.name]
+        assert 'local_mind' in [m.name for m in client.minds.list()]
+
+        mind.update(model_name='gpt-4o')
+        assert client.minds.get('local_mind').model_name == 'gpt-4o'
+
+        mind.del_datasource(example_ds.name)
+        assert mind.datasources == []
+
+        client.minds.drop('local_mind')
+        with pytest.raises(ObjectNotFound):
+            client.minds.get('local_mind')
+
+    def test_completion(self, server):
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='completion_mind', update=True)
+
+        answer = mind.completion('hello world')
+        assert answer.startswith('hello world')
+        assert mind.last_usage.prompt_tokens == 2
+        assert mind.last_usage.completion_tokens == server.tokens
+
+        chunks = [chunk.content for chunk in mind.completion('hello world', stream=True) if chunk.content]
+        assert len(chunks) == server.tokens
+        assert mind.last_usage.completion_tokens == server.tokens
+        assert client.usage.total.requests == 2
+
+    def test_insert_documents(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='local_kb', description='test'))
+        kb.insert_documents([KnowledgeBaseDocument(id=i, content='text') for i in range(10)])
+        assert len(server.state.documents['local_kb']) == 10
+
+    def test_latency(self):
+        rng = random.Random(1)
+        assert Latency.parse(0.5).sample(rng) == 0.5
+        assert Latency.parse('0.25').sample(rng) == 0.25
+        assert all(0.01 <= Latency.parse('uniform:0.01,0.02').sample(rng) <= 0.02 for _ in range(100))
+        assert all(Latency.parse('normal:0.01,1').sample(rng) >= 0 for _ in range(100))
+        samples = sorted(Latency.parse('lognormal:0.05,0.5').sample(rng) for _ in range(1000))
+        assert samples[500] == pytest.approx(0.05, rel=0.1)
+        assert str(Latency.parse('exponential:0.02')) == 'exponential:0.02'
+        assert not Latency.parse(0)
+        for spec in ('pareto:1', 'uniform:1', 'exponential:-1'):
+            with pytest.raises(ValueError):
+                Latency.parse(spec)
+
+    def test_fractional_rate_limit(self):
+        limiter = _RateLimiter(0.5)
+        assert limiter.acquire() is None
+        assert limiter.acquire() == pytest.approx(2, rel=0.01)
+        # a token is added in two seconds
+        limiter.updated -= 2
+        assert limiter.acquire() is None
+        limiter.updated -= 10
+        assert limiter.acquire() is None
+        assert limiter.acquire() is not None
+
+
+class TestWarmup:
+
+    def test_warmup(self, server):
+        client = Client('key', base_url=server.url)
+        client.minds.create(name='warm_mind', update=True)
+
+        report = client.warmup(connections=3, minds=['warm_mind'])
+        assert report['ok'], report['errors']
+        assert report['connections'] == {'rest': 3, 'llm': 3}
+        assert report['minds'] == ['warm_mind']
+        assert client._openai_client is not None
+
+        # idle connections are kept in the pool
+        poolmanager = client.api.session.get_adapter(server.url).poolmanager
+        pools = [poolmanager.pools[key] for key in poolmanager.pools.keys()]
+        assert sum(pool.num_connections for pool in pools) == 3
+        idle = [conn for pool in pools for conn in pool.pool.queue if conn is not None]
+        assert len(idle) == 3
+
+        mind = client.minds.get('warm_mind', cached=True)
+        assert mind is client.minds.get('warm_mind', cached=True)
+        client.minds.drop('warm_mind')
+        with pytest.raises(ObjectNotFound):
+            client.minds.get('warm_mind', cached=True)
+
+    def test_warmup_async(self, server):
+        client = Client('key', base_url=server.url)
+        report = asyncio.run(client.warmup_async(minds=True))
+        assert report['ok']
+        assert report['connections'] == {'rest': 1, 'llm': 1}
+
+    def test_warmup_llm_error_status(self, server):
+        client = Client('key', base_url=server.url)
+        # models are not listed by the LLM host: 404
+        client.openai_client.base_url = f'{server.url}/missing/'
+        report = client.warmup(connections=2, timeout=5)
+        assert report['ok'], report['errors']
+        assert report['connections'] == {'rest': 2, 'llm': 2}
+
+        # the holder still waits for the others
+        barrier = threading.Barrier(2, timeout=5)
+        holder = threading.Thread(target=client._hold_llm_connection, args=(barrier,))
+        holder.start()
+        barrier.wait()
+        holder.join()
+
+    def test_warmup_unavailable_server(self):
+        client = Client('key', base_url='http://127.0.0.1:1')
+        report = client.warmup()
+        assert not report['ok']
+        assert len(report['errors']) == 2
+
+
+def test_bench(capsys):
+    results = bench.main([
+        '--scenario', 'completion',
+        '--scenario', 'completion-stream',
+        '--scenario', 'minds-list',
+        '--scenario', 'kb-insert',
+        '--requests', '5',
+        '--concurrency', '2',
+    ])
+    assert [r.scenario for r in results] == ['completion', 'completion-stream', 'minds-list', 'kb-insert']
+    for result in results:
+        row = result.to_dict()
+        assert row['requests'] == 5
+        assert row['errors'] == 0
+        assert row['p99_ms'] is not None
+    assert results[1].to_dict()['ttft_p50_ms'] is not None
+
+    assert 'completion-stream' in capsys.readouterr().out
+
+
+def test_bench_open_loop():
+    result = bench.Result('test')
+    bench.run_open_loop(lambda i: None, result, rate=200, concurrency=4, requests=20)
+    assert len(result.latencies) == 20
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert bench.percentile(values, 50) == 50
+    assert bench.percentile(values, 99) == 99
+    assert bench.percentile([], 50) is None
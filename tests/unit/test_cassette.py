@@ -0,0 +1,92 @@
+import json
+import pickle
+import time
+
+import pytest
+
+import minds.exceptions as exc
+from minds.cassette import Cassette
+from minds.client import Client
+from minds.datasources import DatabaseConfig
+from minds.local_server import LocalServer
+
+# nothing is listening there: replay must not use network
+CLOSED_URL = 'http://127.0.0.1:9'
+
+
+def traffic(client):
+    ds = client.datasources.create(DatabaseConfig(name='cassette_ds', engine='postgres', description='db'))
+    mind = client.minds.create(name='cassette_mind', datasources=[ds], update=True)
+    with pytest.raises(exc.ObjectNotFound):
+        client.minds.get('missing_mind')
+    answer = mind.completion('hello')
+    deltas = [delta.content for delta in mind.completion('hello', stream=True)]
+    return [mind.name, mind.datasources, answer, deltas, mind.last_usage.total_tokens]
+
+
+@pytest.mark.parametrize('file_name', ['trace.jsonl', 'trace.jsonl.gz'])
+def test_record_replay(tmp_path, file_name):
+    path = tmp_path / file_name
+    with LocalServer(first_token_latency=0.1) as server:
+        with Cassette(path, mode='record') as cassette:
+            recorded = traffic(Client('secret-key', base_url=server.url, cassette=cassette))
+            assert cassette.recorded >= 7
+
+    if file_name == 'trace.jsonl':
+        text = path.read_text()
+        assert 'secret-key' not in text
+        kinds = [json.loads(line)['kind'] for line in text.splitlines()]
+        assert kinds[-2:] == ['completion'] * 2 and set(kinds[:-2]) == {'rest'}
+
+    cassette = Cassette(path)
+    client = Client('other-key', base_url=CLOSED_URL, cassette=cassette)
+    start = time.perf_counter()
+    assert traffic(client) == recorded
+    # latencies are not replayed by default
+    assert time.perf_counter() - start < 0.1
+    # the last response is repeated
+    assert client.minds.get('cassette_mind').name == 'cassette_mind'
+    with pytest.raises(exc.CassetteMiss):
+        client.minds.get('other_mind')
+    with pytest.raises(exc.CassetteMiss):
+        client.minds.get('cassette_mind').completion('other question')
+
+    # pickled client replays the same cassette
+    restored = pickle.loads(pickle.dumps(client))
+    assert restored.minds.get('cassette_mind').completion('hello') == recorded[2]
+
+
+def test_preserve_timing(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    with LocalServer(first_token_latency=0.2) as server:
+        with Cassette(path, mode='record') as cassette:
+            client = Client('key', base_url=server.url, cassette=cassette)
+            list(client.minds.create(name='timed_mind', update=True).completion('hello', stream=True))
+
+    stream = json.loads(path.read_text().splitlines()[-1])
+    assert stream['chunks'][0][0] >= 0.2
+
+    for speed, minimum, maximum in ((1.0, 0.2, 1.0), (4.0, 0.05, 0.2)):
+        client = Client('key', base_url=CLOSED_URL, cassette=Cassette(path, preserve_timing=True, speed=speed))
+        mind = client.minds.create(name='timed_mind', update=True)
+        start = time.perf_counter()
+        next(iter(mind.completion('hello', stream=True)))
+        assert minimum <= time.perf_counter() - start < maximum
+
+
+def test_record_file_upload(tmp_path):
+    data = bytes(range(256)) * 4 * 1024 * 3
+    path = tmp_path / 'large.bin'
+    path.write_bytes(data)
+    cassette_path = str(tmp_path / 'upload.jsonl')
+
+    # parts are bigger than a piece read by the http client
+    with LocalServer() as server:
+        client = Client('key', base_url=server.url, cassette=Cassette(cassette_path, mode='record'))
+        file = client.files.upload(str(path), part_size=1024 * 1024, state_dir=str(tmp_path / 'state'))
+        assert file.size == len(data)
+        assert server.state.files['large']['content'] == data
+
+    client = Client('key', base_url=server.url, cassette=Cassette(cassette_path))
+    file = client.files.upload(str(path), part_size=1024 * 1024, max_workers=1, state_dir=str(tmp_path / 'state'))
+    assert file.size == len(data)
@@ -0,0 +1,53 @@
+import pytest
+
+from minds import bench
+from minds.knowledge_bases import KnowledgeBaseDocument
+from minds.knowledge_bases.chunking import TextChunker, chunk_documents
+from minds.knowledge_bases.preprocessing import TextChunkingConfig
+
+
+class TestTextChunker:
+
+    def test_split(self):
+        chunker = TextChunker(TextChunkingConfig(chunk_size=10, chunk_overlap=4))
+        text = 'Hi.\n\nI am a text splitter.\nBye now'
+        assert chunker.split_text(text) == ['Hi.', 'I am a', 'a text', 'splitter.', 'Bye now']
+
+        # long words are split by characters
+        chunker = TextChunker(TextChunkingConfig(chunk_size=7, chunk_overlap=0))
+        assert chunker.split_text('abcdefghijklmnop qr') == ['abcdefg', 'hijklmn', 'op', 'qr']
+
+        with pytest.raises(ValueError):
+            TextChunker(TextChunkingConfig(chunk_size=10, chunk_overlap=20))
+
+    def test_offsets(self):
+        chunker = TextChunker(TextChunkingConfig(chunk_size=50, chunk_overlap=10))
+        text = ' '.join(f'word{i}' for i in range(200))
+        chunks = chunker.split_text_with_offsets(text)
+        assert len(chunks) > 1
+        for chunk, offset in chunks:
+            assert len(chunk) <= 50
+            assert text[offset:offset + len(chunk)] == chunk
+
+    def test_chunk_documents(self):
+        config = TextChunkingConfig(chunk_size=100, chunk_overlap=20)
+        documents = [
+            KnowledgeBaseDocument(id=i, content=' '.join(['text'] * 100 * (i + 1)), metadata={'source': 'test'})
+            for i in range(10)
+        ]
+        local = list(chunk_documents(documents, config, processes=1))
+        parallel = list(chunk_documents(documents, config, processes=2, batch_size=3))
+        assert local == parallel
+
+        first = local[0]
+        assert first.id == '0:0'
+        assert first.metadata == {
+            'source': 'test', '_original_doc_id': 0, '_chunk_index': 0, '_start_char': 0, '_end_char': 99
+        }
+        assert {chunk.metadata['_original_doc_id'] for chunk in local} == set(range(10))
+
+
+def test_bench_chunking():
+    result = bench.measure_chunking(documents=10, doc_size=5000)
+    assert result['chunks'] > 10
+    assert result['chunks_per_second'] > 0
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+import minds.exceptions as exc
+from minds.client import Client
+from minds.files import _MultipartBody, _READ_SIZE
+from minds.knowledge_bases import KnowledgeBaseConfig
+from minds.local_server import LocalServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'report.csv'
+    path.write_bytes(os.urandom(100_000))
+    return path
+
+
+def fail_parts(client, numbers, errors=1):
+    # first `errors` uploads of the parts fail with server error
+    put = client.api.put
+    failures = {number: errors for number in numbers}
+
+    def failing_put(url, *args, **kwargs):
+        if '/parts/' in url:
+            number = int(url.rsplit('/', 1)[1])
+            if failures.get(number):
+                failures[number] -= 1
+                raise exc.UnknownError('Bad Gateway', status_code=502)
+        return put(url, *args, **kwargs)
+
+    client.api.put = failing_put
+
+
+class TestUpload:
+
+    def test_upload(self, server, data_file, tmp_path):
+        client = Client('key', base_url=server.url)
+        fail_parts(client, [2, 5])
+
+        progress = []
+        file = client.files.upload(
+            str(data_file), part_size=16 * 1024, max_workers=3, retry_delay=0,
+            state_dir=str(tmp_path / 'state'), on_progress=lambda p: progress.append(p.uploaded_parts)
+        )
+        assert file.name == 'report' and file.size == 100_000
+        assert server.state.files['report']['content'] == data_file.read_bytes()
+        assert progress == list(range(1, 8))
+        # completed upload is forgotten
+        assert os.listdir(tmp_path / 'state') == []
+
+        assert [f.name for f in client.files.list()] == ['report']
+        client.files.drop('report')
+        with pytest.raises(exc.ObjectNotFound):
+            client.files.get('report')
+
+        # empty file
+        empty = tmp_path / 'empty.txt'
+        empty.write_bytes(b'')
+        assert client.files.upload(str(empty), state_dir=str(tmp_path / 'state')).size == 0
+
+    def test_resume(self, server, data_file, tmp_path):
+        client = Client('key', base_url=server.url)
+        state_dir = str(tmp_path / 'state')
+        fail_parts(client, [4], errors=10)
+
+        with pytest.raises(exc.UnknownError):
+            client.files.upload(str(data_file), name='resumed', part_size=10_000, max_workers=1,
+                                max_retries=1, retry_delay=0, state_dir=state_dir)
+        assert 'resumed' not in server.state.files
+        assert len(os.listdir(state_dir)) == 1
+
+        client = Client('key', base_url=server.url)
+        progress = []
+        file = client.files.upload(str(data_file), name='resumed', part_size=10_000, max_workers=1,
+                                   state_dir=state_dir, on_progress=progress.append)
+        assert file.size == 100_000
+        assert server.state.files['resumed']['content'] == data_file.read_bytes()
+        # parts sent before the failure are not sent again, one more part could be in flight
+        assert progress[-1].resumed_parts in (3, 4)
+        assert progress[-1].resumed_parts + progress[-1].uploaded_parts == 10
+
+    def test_insert_local_files(self, server, data_file, tmp_path):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='files_kb', description='test'))
+
+        other = tmp_path / 'notes.txt'
+        other.write_text('notes')
+        kb.insert_local_files([str(data_file), str(other)], state_dir=str(tmp_path / 'state'))
+        assert server.state.files['notes']['content'] == b'notes'
+        assert server.state.files['report']['size'] == 100_000
+
+    def test_upload_without_parts(self, data_file, tmp_path):
+        with LocalServer(upload_parts=False) as server:
+            client = Client('key', base_url=server.url)
+            kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='whole_files_kb', description='test'))
+
+            progress = []
+            kb.insert_local_files([str(data_file)], state_dir=str(tmp_path / 'state'), on_progress=progress.append)
+            assert server.state.files['report']['content'] == data_file.read_bytes()
+            assert [(p.uploaded_parts, p.uploaded_bytes) for p in progress] == [(1, 100_000)]
+            assert server.state.uploads == {}
+
+        # the body is read from the mapped memory by pieces, never fully
+        body = _MultipartBody(memoryview(data_file.read_bytes()), 'file', 'report.csv')
+        size = len(body)
+        pieces = list(body)
+        assert max(len(piece) for piece in pieces) <= _READ_SIZE
+        assert sum(len(piece) for piece in pieces) == size
+        assert pieces[0].startswith(f'--{body.boundary}'.encode())
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+
+from minds.bench import measure_import_time
+
+
+# heavy dependencies must be imported on first use only
+HEAVY_MODULES = ('openai', 'pydantic', 'requests')
+
+
+@pytest.mark.parametrize('module', ['minds', 'minds.client'])
+def test_heavy_dependencies_are_not_imported(module):
+    result = measure_import_time(module, runs=1)
+    for name in HEAVY_MODULES:
+        assert name not in result['imported']
+
+
+def test_lazy_exports():
+    code = (
+        'import sys, minds; '
+        'assert "pydantic" not in sys.modules; '
+        'from minds import Client, DatabaseConfig; '
+        'assert "pydantic" in sys.modules; '
+        'assert "openai" not in sys.modules; '
+        'assert Client.__module__ == "minds.client"'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_unknown_attribute():
+    import minds
+
+    with pytest.raises(AttributeError):
+        minds.NotExisting
@@ -0,0 +1,560 @@
+import array
+import asyncio
+import csv
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import minds.exceptions as exc
+from minds.client import Client
+from minds.knowledge_bases import EmbeddingConfig, KnowledgeBase, KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.knowledge_bases.embeddings import decode_embedding, encode_embedding, float32_le_buffer
+from minds.knowledge_bases.ingestion import BatchUploader
+from minds.knowledge_bases.jobs import COMPLETED, CANCELLED, FAILED, PENDING, RUNNING, wait_jobs
+from minds.knowledge_bases.urls import canonicalize_url, shard_urls
+from minds.local_server import LocalServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def generate_documents(count, size=10):
+    for i in range(count):
+        yield KnowledgeBaseDocument(id=i, content='x' * size, metadata={'n': i})
+
+
+class TestInsertDocuments:
+
+    def test_generator(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='stream_kb', description='test'))
+
+        progress_calls = []
+        progress = kb.insert_documents(
+            generate_documents(2500), batch_size=1000, max_workers=2,
+            on_progress=lambda p: progress_calls.append(p.documents)
+        )
+        assert progress.documents == 2500
+        assert progress.batches == 3
+        assert sorted(progress_calls)[-1] == 2500
+        assert len(progress_calls) == 3
+
+        rows = server.state.documents['stream_kb']
+        assert len(rows) == 2500
+        assert rows[1999] == {'id': 1999, 'content': 'x' * 10, 'metadata': {'n': 1999}}
+
+    def test_batch_bytes(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='bytes_kb', description='test'))
+
+        # every document is ~1kb, 4 of them fit in a batch
+        progress = kb.insert_documents(
+            ({'id': i, 'content': 'y' * 1000} for i in range(10)), max_batch_bytes=4500
+        )
+        assert progress.batches == 3
+        assert len(server.state.documents['bytes_kb']) == 10
+
+
+class TestBatchUploader:
+
+    def test_retry(self):
+        sent = []
+        failures = {1: 2}
+        lock = threading.Lock()
+
+        def send(rows):
+            with lock:
+                key = int(rows[0])
+                if failures.get(key):
+                    failures[key] -= 1
+                    raise exc.UnknownError('Service Unavailable', status_code=503)
+                sent.extend(int(row) for row in rows)
+
+        uploader = BatchUploader(send, batch_size=1, max_workers=3, retry_delay=0.01)
+        progress = uploader.upload(range(5), lambda i: b'%d' % i)
+        assert sorted(sent) == [0, 1, 2, 3, 4]
+        assert progress.retries == 2
+        assert progress.failed_batches == 0
+
+    def test_failure(self):
+        def send(rows):
+            if b'3' in rows:
+                raise exc.Forbidden('forbidden')
+
+        batches = []
+        uploader = BatchUploader(send, batch_size=1, max_workers=1, max_in_flight=1, on_batch=batches.append)
+        with pytest.raises(exc.Forbidden):
+            uploader.upload(range(100), lambda i: b'%d' % i)
+        # not retryable error stops the upload
+        assert batches == [[0], [1], [2]]
+
+    def test_rejected_batch_is_not_retried(self):
+        calls = []
+
+        def send(rows):
+            calls.append(rows)
+            raise exc.UnknownError('Bad Request: invalid document', status_code=400)
+
+        uploader = BatchUploader(send, batch_size=1, max_workers=1, retry_delay=0.01)
+        with pytest.raises(exc.UnknownError, match='Bad Request'):
+            uploader.upload(range(1), lambda i: b'%d' % i)
+        assert len(calls) == 1
+
+    def test_bounded_memory(self):
+        consumed = 0
+        max_pending = 0
+        sent = 0
+        lock = threading.Lock()
+
+        def items():
+            nonlocal consumed, max_pending
+            for i in range(10000):
+                consumed += 1
+                with lock:
+                    max_pending = max(max_pending, consumed - sent)
+                yield i
+
+        def send(rows):
+            nonlocal sent
+            with lock:
+                sent += len(rows)
+
+        uploader = BatchUploader(send, batch_size=10, max_workers=2, max_in_flight=4)
+        uploader.upload(items(), lambda i: b'%d' % i)
+        assert sent == 10000
+        # in flight batches and the one being read
+        assert max_pending <= 10 * 5
+
+
+class TestInsertFromPath:
+
+    @pytest.fixture
+    def kb(self, server, request):
+        client = Client('key', base_url=server.url)
+        name = request.node.name.replace('test_', 'path_')
+        return client.knowledge_bases.create(KnowledgeBaseConfig(name=name, description='test'))
+
+    def test_jsonl(self, server, kb, tmp_path):
+        path = tmp_path / 'docs.jsonl'
+        path.write_text('\n'.join(json.dumps({'id': i, 'text': f'doc {i}', 'lang': 'en'}) for i in range(25)) + '\n\n')
+
+        progress = kb.insert_from_path(str(path), content_field='text', batch_size=10)
+        assert progress.documents == 25
+        assert progress.batches == 3
+        assert server.state.documents[kb.name][7] == {'id': 7, 'content': 'doc 7', 'metadata': {'lang': 'en'}}
+
+    def test_csv(self, server, kb, tmp_path):
+        path = tmp_path / 'docs.csv'
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['doc_id', 'content', 'author', 'year'])
+            writer.writerow(['a', 'multi\nline', 'bob', '2020'])
+            writer.writerow(['b', 'single line', 'alice', '2021'])
+
+        kb.insert_from_path(str(path), id_field='doc_id', metadata_fields=['author'])
+        documents = server.state.documents[kb.name]
+        assert documents['a'] == {'id': 'a', 'content': 'multi\nline', 'metadata': {'author': 'bob'}}
+        assert documents['b']['metadata'] == {'author': 'alice'}
+
+    def test_parquet(self, server, kb, tmp_path):
+        pa = pytest.importorskip('pyarrow')
+        pq = pytest.importorskip('pyarrow.parquet')
+
+        path = tmp_path / 'docs.parquet'
+        table = pa.table({'id': list(range(100)), 'content': [f'doc {i}' for i in range(100)]})
+        pq.write_table(table, path, row_group_size=30)
+        assert pq.ParquetFile(path).num_row_groups == 4
+
+        progress = kb.insert_from_path(str(path), batch_size=50)
+        assert progress.documents == 100
+        assert server.state.documents[kb.name][99]['content'] == 'doc 99'
+
+    def test_dir(self, server, kb, tmp_path):
+        (tmp_path / 'sub').mkdir()
+        (tmp_path / 'readme.md').write_text('# readme')
+        (tmp_path / 'sub' / 'notes.txt').write_text('notes')
+        (tmp_path / 'image.png').write_bytes(b'\x89PNG')
+
+        kb.insert_from_path(str(tmp_path))
+        documents = server.state.documents[kb.name]
+        assert sorted(documents) == ['readme.md', 'sub/notes.txt']
+        assert documents['sub/notes.txt']['content'] == 'notes'
+
+    def test_errors(self, kb, tmp_path):
+        path = tmp_path / 'docs.txt'
+        path.write_text('text')
+        with pytest.raises(ValueError):
+            kb.insert_from_path(str(path))
+
+        path = tmp_path / 'docs.jsonl'
+        path.write_text(json.dumps({'content': 'no id'}))
+        with pytest.raises(ValueError):
+            kb.insert_from_path(str(path))
+
+
+class TestSyncDocuments:
+
+    def test_sync(self, server, tmp_path):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='sync_kb', description='test'))
+        manifest = str(tmp_path / 'manifest.db')
+
+        result = kb.sync_documents(generate_documents(50), manifest, batch_size=10)
+        assert (result.uploaded, result.unchanged, result.deleted, result.resumed) == (50, 0, [], False)
+
+        result = kb.sync_documents(generate_documents(50), manifest, batch_size=10)
+        assert (result.uploaded, result.unchanged) == (0, 50)
+        assert result.progress.batches == 0
+
+        # one changed, one deleted, one new
+        documents = list(generate_documents(51))
+        documents[5].content = 'changed'
+        documents[7].metadata = {'n': 'changed'}
+        del documents[9]
+        result = kb.sync_documents(documents, manifest, batch_size=10)
+        assert (result.uploaded, result.unchanged, result.deleted) == (3, 47, [9])
+        assert server.state.documents['sync_kb'][5]['content'] == 'changed'
+
+    def test_resume(self, server, tmp_path):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='resume_kb', description='test'))
+        manifest = str(tmp_path / 'manifest.db')
+
+        put = client.api.put
+        calls = []
+
+        def failing_put(url, data={}, body=None):
+            calls.append(url)
+            if len(calls) == 3:
+                raise exc.Forbidden('interrupted')
+            return put(url, data=data, body=body)
+
+        client.api.put = failing_put
+        with pytest.raises(exc.Forbidden):
+            kb.sync_documents(generate_documents(50), manifest, batch_size=10, max_workers=1)
+        client.api.put = put
+
+        # committed batches are not uploaded again
+        result = kb.sync_documents(generate_documents(50), manifest, batch_size=10)
+        assert result.resumed
+        # at least 2 batches before the failed one, a batch in flight could be committed too
+        assert result.unchanged in (20, 30)
+        assert result.uploaded + result.unchanged == 50
+        assert len(server.state.documents['resume_kb']) == 50
+
+        result = kb.sync_documents(generate_documents(50), manifest)
+        assert not result.resumed
+        assert result.uploaded == 0
+
+
+class TestEmbeddings:
+
+    def test_encoding(self):
+        np = pytest.importorskip('numpy')
+
+        vector = np.linspace(0, 1, 8, dtype='float32')
+        # float32 array is encoded from its memory
+        assert float32_le_buffer(vector).obj is vector
+
+        for value in (vector, vector.astype('float64'), array.array('f', vector), vector.tolist()):
+            data, dimensions = encode_embedding(value)
+            assert dimensions == 8
+            assert decode_embedding(data.decode()) == vector.tolist()
+
+        with pytest.raises(ValueError):
+            encode_embedding(np.zeros((2, 2), dtype='float32'))
+
+    def test_insert(self, server):
+        np = pytest.importorskip('numpy')
+
+        client = Client('key', base_url=server.url)
+        config = KnowledgeBaseConfig(
+            name='vectors_kb', description='test',
+            embedding_config=EmbeddingConfig(provider='openai', model='text-embedding-3-small', dimensions=4)
+        )
+        kb = client.knowledge_bases.create(config)
+        assert kb.embedding_dimensions == 4
+
+        vectors = np.random.rand(10, 4).astype('float32')
+        kb.insert_documents(KnowledgeBaseDocument(id=i, content='text', embedding=vectors[i]) for i in range(10))
+        rows = server.state.documents['vectors_kb']
+        assert rows[3]['embedding'] == vectors[3].tolist()
+        assert rows[3]['metadata'] == {}
+
+        # validated on the client side
+        with pytest.raises(ValueError):
+            kb.insert_documents([KnowledgeBaseDocument(id=1, content='text', embedding=np.zeros(5))])
+
+        # knowledge base from the server: all vectors of the insert must have the same size
+        kb = client.knowledge_bases.get('vectors_kb')
+        with pytest.raises(ValueError):
+            kb.insert_documents([
+                KnowledgeBaseDocument(id=1, content='text', embedding=[0.1, 0.2]),
+                KnowledgeBaseDocument(id=2, content='text', embedding=[0.1, 0.2, 0.3]),
+            ])
+
+
+@pytest.fixture(scope='module')
+def slow_server():
+    with LocalServer(ingest_latency=0.3) as server:
+        yield server
+
+
+class TestIngestionJob:
+
+    def test_server_job(self, slow_server):
+        client = Client('key', base_url=slow_server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='job_kb', description='test'))
+
+        start = time.monotonic()
+        jobs = [kb.insert_files([f'file_{i}'], wait=False) for i in range(5)]
+        # returned immediately
+        assert time.monotonic() - start < 0.3
+        assert jobs[0].status() in (PENDING, RUNNING)
+
+        done, pending = wait_jobs(jobs, timeout=10, min_interval=0.05)
+        assert len(done) == 5 and pending == []
+        for job in jobs:
+            assert job.location is not None
+            assert job.status() == COMPLETED
+            assert job.result() is None
+
+        # timeout and cancel
+        job = kb.insert_from_select('SELECT * FROM table', wait=False)
+        assert job.wait(timeout=0.05) in (PENDING, RUNNING)
+        with pytest.raises(TimeoutError):
+            job.result(timeout=0.01)
+        assert job.cancel()
+        assert job.wait() == CANCELLED
+        with pytest.raises(exc.IngestionFailed):
+            job.result()
+
+    def test_documents_job(self, slow_server):
+        client = Client('key', base_url=slow_server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='job_docs_kb', description='test'))
+
+        job = kb.insert_documents(generate_documents(30), batch_size=10, wait=False)
+        progress = job.result(timeout=10)
+        assert progress.documents == 30
+        assert job.status() == COMPLETED
+        # cancelled only before it is sent
+        assert not job.cancel()
+
+        # errors of the request are raised by result
+        missing_kb = KnowledgeBase('missing_kb', client.api)
+        job = missing_kb.insert_files(['file'], wait=False)
+        assert job.wait(timeout=10) == FAILED
+        with pytest.raises(exc.ObjectNotFound):
+            job.result()
+
+    def test_await(self, slow_server):
+        client = Client('key', base_url=slow_server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='job_async_kb', description='test'))
+
+        async def main():
+            jobs = [kb.insert_files([f'file_{i}'], wait=False) for i in range(3)]
+            return await asyncio.gather(*jobs)
+
+        start = time.monotonic()
+        assert asyncio.run(main()) == [None, None, None]
+        # processed concurrently
+        assert time.monotonic() - start < 0.9
+
+
+
+class TestColumnar:
+
+    @pytest.fixture
+    def kb(self, server, request):
+        client = Client('key', base_url=server.url)
+        name = request.node.name.replace('test_', 'columnar_')
+        return client.knowledge_bases.create(KnowledgeBaseConfig(name=name, description='test'))
+
+    def test_dataframe(self, server, kb):
+        pd = pytest.importorskip('pandas')
+        pytest.importorskip('pyarrow')
+
+        df = pd.DataFrame({
+            'doc_id': ['a', 'b', 'c'],
+            'text': ['quote " and \\ slash', 'new\nline\ttab \x01', 'unicode ü'],
+            'score': [1.5, float('nan'), 3.0],
+            'count': [1, 2, 3],
+            'flag': [True, None, False],
+            'created': pd.to_datetime(['2024-01-01 10:00:00', None, '2024-01-03 00:00:00']),
+            'ignored': ['x', 'y', 'z'],
+        })
+        batches = []
+        progress = kb.insert_dataframe(df, id_col='doc_id', content_col='text',
+                                       metadata_cols=['score', 'count', 'flag', 'created'],
+                                       batch_size=2, max_workers=1, on_batch=lambda rows: batches.append(rows.num_rows))
+        assert progress.documents == 3 and progress.batches == 2
+        assert batches == [2, 1]
+
+        # the same json as from models
+        documents = server.state.documents[kb.name]
+        for row in df.to_dict('records'):
+            metadata = {
+                'score': None if row['score'] != row['score'] else row['score'],
+                'count': row['count'],
+                'flag': row['flag'],
+                'created': None if pd.isna(row['created']) else row['created'].isoformat(),
+            }
+            expected = KnowledgeBaseDocument(id=row['doc_id'], content=row['text'], metadata=metadata)
+            assert documents[row['doc_id']] == json.loads(expected.model_dump_json())
+
+    def test_arrow(self, server, kb):
+        pa = pytest.importorskip('pyarrow')
+
+        table = pa.table({'id': list(range(100)), 'content': ['x' * 100] * 100})
+        # batches are limited by size
+        progress = kb.insert_arrow(table.to_batches()[0], max_batch_bytes=1000)
+        assert progress.documents == 100
+        assert progress.batches == 15
+        assert server.state.documents[kb.name][99] == {'id': 99, 'content': 'x' * 100, 'metadata': {}}
+
+        with pytest.raises(TypeError):
+            kb.insert_arrow(pa.table({'id': [1.5], 'content': ['text']}))
+        with pytest.raises(TypeError):
+            kb.insert_arrow(pa.table({'id': [1], 'content': ['text'], 'tags': [['a', 'b']]}))
+        with pytest.raises(ValueError):
+            kb.insert_arrow(pa.table({'id': [1, None], 'content': ['a', 'b']}))
+        with pytest.raises(ValueError):
+            kb.insert_arrow(table, content_col='text')
+
+class _PageHandler(BaseHTTPRequestHandler):
+    # pages of preflight tests: /missing is not found, others are slow to check concurrency
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        ...
+
+    def do_HEAD(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestInsertUrls:
+
+    def test_canonicalize(self):
+        assert canonicalize_url('HTTP://Example.COM:80/a/./b/../c?b=2&a=1#top') == 'http://example.com/a/c?a=1&b=2'
+        assert canonicalize_url('https://example.com') == 'https://example.com/'
+        assert canonicalize_url('https://example.com:8443/%7euser/%2f') == 'https://example.com:8443/~user/%2F'
+        for url in ['ftp://example.com/file', 'not a url', 'https://example.com:99999/']:
+            with pytest.raises(ValueError):
+                canonicalize_url(url)
+
+    def test_shard(self):
+        urls = [f'https://a.com/{i}' for i in range(6)] + [f'https://b.com/{i}' for i in range(3)]
+        batches = shard_urls(urls, 3)
+        assert len(batches) == 3
+        assert sorted(sum(batches, [])) == sorted(urls)
+        for batch in batches:
+            hosts = [url.split('/')[2] for url in batch]
+            assert hosts.count('a.com') == 2 and hosts.count('b.com') == 1
+
+    def test_report(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='urls_kb', description='test'))
+
+        urls = [f'https://example.com/{i}' for i in range(10)] + [
+            'https://EXAMPLE.com/1#section',  # duplicate
+            'mailto:user@example.com',  # invalid
+            'https://down.invalid/page',  # rejected by the server
+        ]
+        report = kb.insert_urls(urls, batch_size=4, max_workers=2)
+        assert report.batches == 3
+        assert report.counts() == {'ok': 10, 'duplicate': 1, 'invalid': 1, 'failed': 1}
+        assert not report.ok
+        failed = report.by_status('failed')[0]
+        assert failed.url == 'https://down.invalid/page' and 'down.invalid' in failed.error
+        # only valid urls are crawled once, the rejected batch is split
+        assert sorted(server.state.urls['urls_kb']) == sorted(f'https://example.com/{i}' for i in range(10))
+
+        job = kb.insert_urls(['https://example.com/new'], wait=False)
+        assert job.result(timeout=10).counts() == {'ok': 1}
+
+    def test_original_urls_are_sent(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='original_urls_kb', description='test'))
+
+        report = kb.insert_urls(['https://Example.com/search?q=b&flag&a=1', 'https://example.com/search?a=1&flag=&q=b'])
+        assert report.counts() == {'ok': 1, 'duplicate': 1}
+        assert report.ok
+        assert server.state.urls['original_urls_kb'] == ['https://Example.com/search?q=b&flag&a=1']
+
+    def test_errors(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='url_errors_kb', description='test'))
+        urls = [f'https://example.com/{i}' for i in range(4)]
+
+        client.knowledge_bases.drop('url_errors_kb')
+        # not found knowledge base is not reported as failed urls
+        with pytest.raises(exc.ObjectNotFound):
+            kb.insert_urls(urls, batch_size=2)
+
+        calls = []
+
+        def unavailable(update_request):
+            calls.append(update_request['urls'])
+            raise exc.UnknownError('Service Unavailable', status_code=503)
+
+        kb._update = unavailable
+        with pytest.raises(exc.UnknownError):
+            kb.insert_urls(urls, batch_size=4, max_workers=1, max_retries=1)
+        # the batch is retried as a whole, not split
+        assert calls == [urls] * 2
+
+        calls.clear()
+        report = kb.insert_urls(urls + ['https://EXAMPLE.com/0'], batch_size=4, max_workers=1, max_retries=0,
+                                raise_on_error=False)
+        assert calls == [urls]
+        assert report.counts() == {'failed': 4, 'duplicate': 1}
+        # duplicate has the outcome of the sent url
+        assert report.by_status('duplicate')[0].error == 'Service Unavailable'
+        assert not report.ok
+
+        def bad_request(update_request):
+            calls.append(update_request['urls'])
+            raise exc.UnknownError('Unsupported preprocessing', status_code=400)
+
+        calls.clear()
+        kb._update = bad_request
+        # the error doesn't point at urls: the batch is not split
+        with pytest.raises(exc.UnknownError):
+            kb.insert_urls(urls, batch_size=4, max_workers=1)
+        assert calls == [urls]
+
+    def test_preflight(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='preflight_kb', description='test'))
+
+        pages = ThreadingHTTPServer(('127.0.0.1', 0), _PageHandler)
+        threading.Thread(target=pages.serve_forever, daemon=True).start()
+        try:
+            base = f'http://127.0.0.1:{pages.server_address[1]}'
+            urls = [f'{base}/{i}' for i in range(8)] + [f'{base}/missing', 'http://127.0.0.1:1/closed']
+            report = kb.insert_urls(urls, preflight=True, per_host_limit=2, timeout=2)
+        finally:
+            pages.shutdown()
+            pages.server_close()
+
+        assert report.counts() == {'ok': 8, 'unreachable': 2}
+        assert report.by_status('unreachable')[0].error == 'HTTP 404'
+        assert _PageHandler.max_active == 2
+        assert len(server.state.urls['preflight_kb']) == 8
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+import requests
+
+import minds.exceptions as exc
+from minds.client import Client
+from minds.datasources import DatabaseConfig
+from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.local_server import LocalServer
+from minds.metrics import MetricsRegistry, serve_metrics
+
+DURATION = 'minds_operation_duration_seconds'
+HTTP_DURATION = 'minds_http_request_duration_seconds'
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer(first_token_latency=0.05) as server:
+        yield server
+
+
+def test_registry_threads():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+
+    def work():
+        for i in range(1000):
+            registry.inc('minds_http_request_bytes_total', ('GET',), 2)
+            registry.observe(DURATION, ('op', 'ok'), 0.5 if i % 2 else 0.1)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    work()
+
+    for _ in range(2):
+        # values of finished threads are kept
+        snapshot = registry.snapshot()
+        assert snapshot.counter('minds_http_request_bytes_total', method='GET') == 10000
+        histogram = snapshot.histogram(DURATION, operation='op', outcome='ok')
+        assert histogram.counts == [2500, 2500, 0]
+        assert histogram.sum == pytest.approx(1500)
+        assert histogram.quantile(0.5) == 0.1 and histogram.quantile(0.9) == 1.0
+    assert len(registry._shards) == 1
+
+    # shards of finished threads are retired when a new thread records without snapshots
+    for _ in range(20):
+        thread = threading.Thread(target=registry.inc, args=('minds_http_request_bytes_total', ('GET',)))
+        thread.start()
+        thread.join()
+    assert len(registry._shards) <= 2
+    assert registry.snapshot().counter('minds_http_request_bytes_total', method='GET') == 10020
+
+    registry.reset()
+    assert registry.snapshot().counters == {}
+
+
+def test_client_metrics(server):
+    client = Client('key', base_url=server.url)
+
+    client.datasources.create(DatabaseConfig(name='metrics_ds', engine='postgres', description='db'))
+    with pytest.raises(exc.ObjectNotFound):
+        client.datasources.get('missing_ds')
+    kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='metrics_kb', description='test'))
+    kb.insert_documents([KnowledgeBaseDocument(id=i, content='text') for i in range(10)])
+    mind = client.minds.create(name='metrics_mind', update=True)
+    mind.completion('hello')
+    list(mind.completion('hello', stream=True))
+
+    snapshot = client.metrics()
+    assert snapshot.histogram(DURATION, operation='Datasources.create', outcome='ok').count == 1
+    assert snapshot.histogram(DURATION, operation='Datasources.get', outcome='error').count == 1
+    assert snapshot.counter('minds_operation_errors_total', operation='Datasources.get', error='ObjectNotFound') == 1
+    assert snapshot.histogram(DURATION, operation='KnowledgeBase.insert_documents', outcome='ok').count == 1
+    assert snapshot.histogram(DURATION, operation='Mind.completion', outcome='ok').count == 2
+
+    assert snapshot.histogram(HTTP_DURATION, method='GET', status='404').count == 1
+    assert snapshot.histogram(HTTP_DURATION, method='PUT', status='200').count >= 1
+    assert snapshot.counter('minds_http_request_bytes_total', method='PUT') > 10 * len('"content":"text"')
+    assert snapshot.counter('minds_http_response_bytes_total', method='GET') > 0
+
+    ttft = snapshot.histogram('minds_completion_time_to_first_token_seconds', mind='metrics_mind')
+    assert ttft.count == 1 and ttft.sum >= 0.05
+
+    text = snapshot.to_prometheus()
+    assert '# TYPE minds_operation_duration_seconds histogram' in text
+    assert 'minds_operation_duration_seconds_count{operation="Datasources.create",outcome="ok"} 1' in text
+    assert 'minds_http_request_duration_seconds_bucket{method="GET",status="404",le="+Inf"} 1' in text
+
+    exporter = serve_metrics(client, port=0)
+    try:
+        response = requests.get(f'http://127.0.0.1:{exporter.server_address[1]}/metrics')
+        assert response.status_code == 200
+        assert 'minds_operation_errors_total{operation="Datasources.get",error="ObjectNotFound"} 1' in response.text
+    finally:
+        exporter.shutdown()
+        exporter.server_close()
+
+    disabled = Client('key', base_url=server.url, metrics=False)
+    disabled.minds.list()
+    assert disabled.metrics().to_prometheus() == '\n'
+
+
+def test_streamed_completion_metrics():
+    with LocalServer(token_latency=0.01, answer_tokens=10, stream_drop_rate=1.0) as server:
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='stream_metrics_mind')
+
+        stream = mind.completion('hello', stream=True)
+        # nothing is recorded until the stream is consumed
+        assert client.metrics().histogram(DURATION, operation='Mind.completion', outcome='ok') is None
+        with pytest.raises(Exception):
+            list(stream)
+
+        server.stream_drop_rate = 0
+        list(mind.completion('hello', stream=True))
+
+    snapshot = client.metrics()
+    failed = snapshot.histogram(DURATION, operation='Mind.completion', outcome='error')
+    assert failed.count == 1
+    assert sum(snapshot.counters['minds_operation_errors_total'].values()) == 1
+    # duration includes the streamed body
+    assert snapshot.histogram(DURATION, operation='Mind.completion', outcome='ok').sum >= 0.08
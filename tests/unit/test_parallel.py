@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import pickle
+
+import pytest
+
+from minds import parallel
+from minds.client import Client
+from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.local_server import LocalServer
+from minds.scheduler import CompletionScheduler
+from minds.usage import Budget
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer(answer_tokens=2) as server:
+        yield server
+
+
+def make_document(i):
+    return KnowledgeBaseDocument(id=i, content=f'document {i}')
+
+
+def _child_state(client, queue):
+    queue.put((client.api._session is None, client._openai_client is None, client.scheduler.stats()['running']))
+
+
+def _release_in_child(client, slot, queue):
+    # slot acquired in the parent process
+    slot.release()
+    with client.scheduler.acquire('fork_mind'):
+        running = client.scheduler.stats()['running']
+    queue.put((running, client.scheduler.stats()['running']))
+
+
+class TestPickle:
+
+    def test_client(self, server):
+        client = Client('key', base_url=server.url, budget=Budget(hard_limit=10),
+                        scheduler=CompletionScheduler(max_concurrency=3))
+        client.minds.list()
+
+        restored = pickle.loads(pickle.dumps(client))
+        assert restored.api.api_key == 'key'
+        assert restored.api.base_url == client.api.base_url
+        assert restored.api._session is None
+        assert restored.budget.hard_limit == 10
+        assert restored.scheduler.max_concurrency == 3
+        assert restored.scheduler is not client.scheduler
+
+    def test_mind(self, server):
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='pickled_mind', prompt_template='be brief', update=True)
+        mind.completion('question')
+
+        data = pickle.dumps(mind)
+        # lightweight handle: no connections and openai client
+        assert len(data) < 2000
+
+        restored = pickle.loads(data)
+        assert restored.name == mind.name
+        assert restored.prompt_template == 'be brief'
+        assert restored.client._openai_client is None
+        assert restored.completion('question')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not supported')
+def test_reinit_after_fork(server):
+    client = Client('key', base_url=server.url, scheduler=CompletionScheduler())
+    mind = client.minds.create(name='fork_mind', update=True)
+    mind.completion('question')
+    slot = client.scheduler.acquire('fork_mind')
+
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child_state, args=(client, queue))
+    process.start()
+    process.join()
+    slot.release()
+
+    assert queue.get(timeout=5) == (True, True, 0)
+    # parent keeps its connections
+    assert client.api._session is not None
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not supported')
+def test_release_of_parent_slot_after_fork():
+    scheduler = CompletionScheduler()
+    client = Client('key', base_url='http://127.0.0.1:9', scheduler=scheduler)
+    slot = scheduler.acquire('fork_mind')
+
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_release_in_child, args=(client, slot, queue))
+    process.start()
+    process.join()
+
+    assert queue.get(timeout=5) == (1, 0)
+    assert scheduler.stats()['running'] == 1
+    slot.release()
+    assert scheduler.stats()['running'] == 0
+
+
+class TestProcessPool:
+
+    def test_map_completions(self, server):
+        client = Client('key', base_url=server.url)
+        mind = client.minds.create(name='pool_mind', update=True)
+
+        messages = [f'question{i}' for i in range(10)]
+        answers = parallel.map_completions(mind, messages, processes=2)
+        assert answers == [f'{m} {m} ' for m in messages]
+
+        with pytest.raises(ValueError):
+            parallel.map_completions(mind, messages, stream=True)
+
+    def test_map_insert_documents(self, server):
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='pool_kb', description='test'))
+
+        count = parallel.map_insert_documents(kb, range(25), batch_size=10, processes=2, prepare=make_document)
+        assert count == 25
+        assert len(server.state.documents['pool_kb']) == 25
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from minds.local_server import LocalServer
+from minds.pool import ClientPool
+
+
+def test_tenants_share_connections():
+    with LocalServer(latency=0.02) as server:
+        pool = ClientPool(base_url=server.url, max_connections=2)
+        tenants = [pool.client(f'key_{i}') for i in range(8)]
+        assert pool.client('key_0') is tenants[0]
+
+        host = tenants[0].host
+        authorization = []
+        host.api.session.hooks['response'].append(
+            lambda response, *args, **kwargs: authorization.append(response.request.headers['Authorization'])
+        )
+        tenants[0].minds.create(name='pool_mind')
+
+        def call(i):
+            return tenants[i % 8].minds.list()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(call, range(32)))
+
+        # every request has the key of its tenant, connections are not opened over the limit
+        assert sorted(set(authorization)) == [f'Bearer key_{i}' for i in range(8)]
+        connections = host.api.session.get_adapter(server.url).poolmanager.connection_from_url(server.url)
+        assert connections.num_connections <= 2
+
+        # the LLM connections are shared as well
+        assert tenants[1].openai_client.api_key == 'key_1'
+        assert tenants[1].openai_client._client is host.openai_client._client
+        assert tenants[0].minds.get('pool_mind').completion('hello').startswith('hello')
+
+        assert pool.metrics().histogram(
+            'minds_operation_duration_seconds', operation='Minds.list', outcome='ok'
+        ).count == 32
+        assert pool.stats() == {'tenants': 8, 'hosts': 1, 'hits': 1, 'misses': 8, 'evictions': 0}
+
+        # closing of a tenant doesn't close shared connections
+        tenants[2].close()
+        assert tenants[3].minds.list()
+        pool.close()
+        assert pool.stats()['hosts'] == 0
+
+
+class _CookieHandler(BaseHTTPRequestHandler):
+    # sets a cookie of the tenant, keeps cookies of requests
+    received = []
+
+    def do_GET(self):
+        _CookieHandler.received.append(self.headers.get('Cookie'))
+        tenant = self.headers['Authorization'].split()[-1]
+        self.send_response(200)
+        self.send_header('Set-Cookie', f'session={tenant}; Path=/')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'[]')
+
+    def log_message(self, format, *args):
+        ...
+
+
+def test_cookies_are_not_shared():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _CookieHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        pool = ClientPool(base_url=f'http://127.0.0.1:{server.server_address[1]}')
+        pool.client('key_a').minds.list()
+        pool.client('key_b').minds.list()
+        pool.client('key_a').minds.list()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert _CookieHandler.received == [None, None, None]
+
+
+def test_eviction():
+    pool = ClientPool(base_url='http://127.0.0.1:9', max_tenants=3, idle_timeout=0.1)
+    first = pool.client('a')
+    pool.client('b')
+    pool.client('c')
+    pool.client('a')
+    # least recently used is evicted
+    pool.client('d')
+    assert pool.client('a') is first
+    assert pool.stats()['evictions'] == 1
+    assert pool.evict('c') and not pool.evict('b')
+
+    time.sleep(0.15)
+    assert pool.client('a') is not first
+    assert pool.stats()['tenants'] == 1
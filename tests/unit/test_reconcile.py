@@ -0,0 +1,141 @@
+from unittest.mock import patch
+
+import pytest
+
+import minds.exceptions as exc
+from minds.client import Client
+from minds.local_server import LocalServer
+from minds.reconcile import DesiredState
+
+
+@pytest.fixture
+def client():
+    with LocalServer() as server:
+        yield Client('key', base_url=server.url)
+
+
+def get_state(description='sales data', tables=None, kbs=('docs',)):
+    return {
+        'datasources': [
+            {'name': 'sales', 'engine': 'postgres', 'description': description, 'connection_data': {'host': 'db'}},
+            {'name': 'crm', 'engine': 'postgres', 'description': 'crm data'},
+        ],
+        'knowledge_bases': [{'name': 'docs', 'description': 'documents'}],
+        'minds': [
+            {'name': 'analyst', 'model_name': 'gpt-4o',
+             'datasources': [{'name': 'sales', 'tables': tables or []}], 'knowledge_bases': list(kbs)},
+            {'name': 'support', 'datasources': ['crm']},
+        ],
+    }
+
+
+def count_calls(client):
+    calls = []
+    request = client.api.session.request
+
+    def wrapper(method, url, *args, **kwargs):
+        calls.append((method.upper(), url[len(client.api.base_url):]))
+        return request(method, url, *args, **kwargs)
+
+    return calls, patch.object(client.api.session, 'request', wrapper)
+
+
+class TestApply:
+
+    def test_create_and_noop(self, client):
+        plan = client.apply(get_state(), dry_run=True)
+        assert [repr(action) for action in plan.actions] == [
+            '+ create datasource sales',
+            '+ create datasource crm',
+            '+ create knowledge_base docs',
+            '+ create mind analyst',
+            '+ create mind support',
+        ]
+        # nothing is changed in dry run
+        assert client.minds.list() == []
+
+        result = client.apply(get_state())
+        assert result.ok
+        assert len(result.executed) == 5
+        mind = client.minds.get('analyst')
+        assert mind.model_name == 'gpt-4o'
+        assert mind.datasources == ['sales']
+        assert mind.knowledge_bases == ['docs']
+
+        # the second apply only lists the state
+        calls, patcher = count_calls(client)
+        with patcher:
+            result = client.apply(get_state())
+        assert str(result.plan) == 'No changes'
+        assert sorted(calls) == [
+            ('GET', '/datasources'), ('GET', '/knowledge_bases'), ('GET', '/projects/mindsdb/minds')
+        ]
+        assert result.calls == 3
+        # 2 datasources * 2 + 1 knowledge base * 3 + 2 minds * 4
+        assert result.saved_calls == 15 - 3
+
+    def test_minimal_changes(self, client):
+        client.apply(get_state())
+
+        calls, patcher = count_calls(client)
+        with patcher:
+            result = client.apply(get_state(description='new description', kbs=()), prune=False)
+        assert result.ok
+        writes = [call for call in calls if call[0] != 'GET']
+        # changed datasource is updated, unchanged isn't touched, knowledge base is detached by one call
+        assert sorted(writes) == [
+            ('DELETE', '/projects/mindsdb/minds/analyst/knowledge_bases/docs'),
+            ('PUT', '/datasources/sales'),
+        ]
+        assert client.datasources.get('sales').description == 'new description'
+        assert client.minds.get('analyst').knowledge_bases == []
+
+        # several changes of the mind are sent by one patch
+        state = get_state(description='new description', kbs=())
+        state['minds'][0].update(model_name='gpt-4o-mini', knowledge_bases=['docs'], datasources=['sales', 'crm'])
+        plan = client.apply(state, dry_run=True)
+        assert [(action.kind, action.method) for action in plan.actions] == [('update', 'patch')]
+        assert client.apply(state).ok
+        mind = client.minds.get('analyst')
+        assert mind.model_name == 'gpt-4o-mini'
+        assert mind.datasources == ['sales', 'crm']
+        assert mind.knowledge_bases == ['docs']
+
+    def test_sources_as_dicts(self):
+        with LocalServer() as server:
+            client = Client('key', base_url=server.url)
+            client.apply(get_state())
+            # server can return sources of the mind as dicts
+            mind = server.state.project_minds('mindsdb')['analyst']
+            mind['datasources'] = [{'name': 'sales'}]
+            mind['knowledge_bases'] = [{'name': 'docs'}]
+
+            assert str(client.apply(get_state(), dry_run=True)) == 'No changes'
+            plan = client.apply(get_state(kbs=()), dry_run=True)
+            assert [repr(action) for action in plan.actions] == ['< detach mind analyst: knowledge_bases docs']
+
+    def test_prune(self, client):
+        client.apply(get_state())
+        state = DesiredState.model_validate(get_state())
+        state.minds = state.minds[:1]
+        state.datasources = state.datasources[:1]
+
+        plan = client.apply(state, prune=True, dry_run=True)
+        assert [repr(action) for action in plan.actions] == ['- drop mind support', '- drop datasource crm']
+
+        result = client.apply(state, prune=True)
+        assert result.ok
+        assert [mind.name for mind in client.minds.list()] == ['analyst']
+        assert [ds.name for ds in client.datasources.list()] == ['sales']
+
+    def test_errors_stop_next_levels(self, client):
+        state = get_state()
+        state['datasources'][0]['name'] = 'wrong name'
+        with pytest.raises(exc.DatasourceNameInvalid):
+            client.apply(state)
+
+        with patch.object(client.api, 'post', side_effect=RuntimeError('failed')):
+            result = client.apply(get_state())
+        assert not result.ok
+        assert {action.resource for action, _ in result.errors} == {'datasource', 'knowledge_base'}
+        assert result.executed == []
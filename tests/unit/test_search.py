@@ -0,0 +1,106 @@
+import pytest
+
+from minds.client import Client
+from minds.knowledge_bases import KnowledgeBaseConfig, KnowledgeBaseDocument
+from minds.local_server import LocalServer
+
+DOCUMENTS = [
+    KnowledgeBaseDocument(id=1, content='red apples grow on trees', metadata={'topic': 'fruit'}),
+    KnowledgeBaseDocument(id=2, content='green apples are sour', metadata={'topic': 'fruit'}),
+    KnowledgeBaseDocument(id=3, content='trees need water', metadata={'topic': 'plants'}),
+]
+
+
+def count_posts(client):
+    calls = []
+    post = client.api.post
+
+    def counting_post(url, *args, **kwargs):
+        calls.append(url.rsplit('/', 1)[1])
+        return post(url, *args, **kwargs)
+
+    client.api.post = counting_post
+    return calls
+
+
+@pytest.mark.parametrize('batch_search', [True, False])
+def test_search(batch_search):
+    with LocalServer(batch_search=batch_search) as server:
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='search_kb', description='test'))
+        kb.insert_documents(DOCUMENTS)
+        calls = count_posts(client)
+
+        results = kb.search('apples trees', top_k=2)
+        assert [result.id for result in results] == [1, 2]
+        assert results[0].relevance == 1.0 and results[0].metadata == {'topic': 'fruit'}
+        assert [result.id for result in kb.search('trees', filters={'topic': 'plants'})] == [3]
+
+        queries = ['apples', 'water', {'query': 'trees', 'top_k': 1}] + [f'word{i}' for i in range(5)]
+        calls.clear()
+        results = kb.search_batch(queries, batch_size=4)
+        assert [[result.id for result in query_results] for query_results in results[:3]] == [[1, 2], [3], [1]]
+        assert results[3:] == [[]] * 5
+        if batch_search:
+            assert calls == ['batch', 'batch']
+        else:
+            # batch endpoint is requested once, then queries are sent concurrently
+            assert calls[0] == 'batch' and calls[1:].count('search') == 8
+            calls.clear()
+            kb.search_batch(['a', 'b'])
+            assert calls == ['search', 'search']
+
+
+def test_search_cache():
+    with LocalServer() as server:
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='cache_kb', description='test'))
+        kb.insert_documents(DOCUMENTS[:1])
+        kb.enable_search_cache(maxsize=2)
+        calls = count_posts(client)
+
+        assert [result.id for result in kb.search('apples')] == [1]
+        assert [result.id for result in kb.search('apples')] == [1]
+        assert len(calls) == 1
+        # cached and the same queries are not sent
+        kb.search_batch(['apples', 'trees', 'trees'])
+        assert calls == ['search', 'search']
+        assert kb.search_cache.hits == 2
+
+        # least recently used is evicted
+        kb.search('water')
+        kb.search('apples')
+        assert len(calls) == 4
+
+        # insert invalidates the cache
+        kb.insert_documents(DOCUMENTS[1:])
+        assert len(kb.search_cache) == 0
+        assert [result.id for result in kb.search('apples')] == [1, 2]
+        kb.insert_files(['file'])
+        assert len(kb.search_cache) == 0
+
+
+def test_search_cache_is_shared_by_objects_of_knowledge_base():
+    with LocalServer(ingest_latency=0.2) as server:
+        client = Client('key', base_url=server.url)
+        kb = client.knowledge_bases.create(KnowledgeBaseConfig(name='shared_cache_kb', description='test'))
+        kb.insert_documents(DOCUMENTS[:1])
+        kb.enable_search_cache()
+        assert [result.id for result in kb.search('apples')] == [1]
+
+        # insert by another object of the knowledge base
+        other = client.knowledge_bases.get('shared_cache_kb')
+        assert other.search_cache is kb.search_cache
+        other.insert_documents(DOCUMENTS[1:])
+        assert [result.id for result in kb.search('apples')] == [1, 2]
+
+        # background insert: the cache is cleared again when the job is finished
+        job = other.insert_files(['file'], wait=False)
+        job._wait_request()
+        kb.search('apples')
+        assert len(kb.search_cache) == 1
+        assert job.wait(timeout=10) == 'completed'
+        assert len(kb.search_cache) == 0
+
+        # another client has its own cache
+        assert Client('key', base_url=server.url).knowledge_bases.get('shared_cache_kb').search_cache is None
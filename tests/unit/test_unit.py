@@ -1,7 +1,11 @@
 
-from unittest.mock import Mock
+import threading
+import time
+from unittest.mock import Mock, MagicMock
 from unittest.mock import patch
 
+import pytest
+
 
 from minds.datasources.datasources import DatabaseTables
 from minds.datasources.examples import example_ds
@@ -13,10 +17,11 @@ def get_client():
     return Client(API_KEY)
 
 
-from minds import rest_api
-
 # patch _raise_for_status
-rest_api._raise_for_status = Mock()
+@pytest.fixture(autouse=True)
+def no_raise_for_status():
+    with patch('minds.rest_api._raise_for_status'):
+        yield
 
 
 def response_mock(mock, data):
@@ -40,10 +45,10 @@ class TestDatasources:
         assert ds1.connection_data == ds2.connection_data
         assert ds1.tables == ds2.tables
 
-    @patch('requests.get')
-    @patch('requests.put')
-    @patch('requests.post')
-    @patch('requests.delete')
+    @patch('requests.Session.get')
+    @patch('requests.Session.put')
+    @patch('requests.Session.post')
+    @patch('requests.Session.delete')
     def test_create_datasources(self, mock_del, mock_post, mock_put, mock_get):
         client = get_client()
         response_mock(mock_get, example_ds.model_dump())
@@ -64,7 +69,7 @@ class TestDatasources:
         ds = client.datasources.create(example_ds, update=True)
         check_ds_created(ds, mock_put, f'https://mdb.ai/api/datasources/{ds.name}')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_datasource(self, mock_get):
         client = get_client()
 
@@ -75,7 +80,7 @@ class TestDatasources:
         args, _ = mock_get.call_args
         assert args[0].endswith(f'/api/datasources/{example_ds.name}')
 
-    @patch('requests.delete')
+    @patch('requests.Session.delete')
     def test_delete_datasource(self, mock_del):
         client = get_client()
 
@@ -84,7 +89,7 @@ class TestDatasources:
         args, _ = mock_del.call_args
         assert args[0].endswith('/api/datasources/ds_name')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_list_datasources(self, mock_get):
         client = get_client()
 
@@ -103,8 +108,8 @@ class TestKnowledgeBases:
     def _compare_knowledge_base(self, knowledge_base, config):
         assert knowledge_base.name == config.name
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('requests.Session.get')
+    @patch('requests.Session.post')
     def test_create_knowledge_bases(self, mock_post, mock_get):
         client = get_client()
 
@@ -166,7 +171,7 @@ class TestKnowledgeBases:
         assert kwargs['json'] == expected_create_request
         assert args[0] == 'https://mdb.ai/api/knowledge_bases'
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_knowledge_base(self, mock_get):
         client = get_client()
 
@@ -215,7 +220,7 @@ class TestKnowledgeBases:
         args, _ = mock_get.call_args
         assert args[0].endswith(f'/api/knowledge_bases/{test_knowledge_base_config.name}')
 
-    @patch('requests.delete')
+    @patch('requests.Session.delete')
     def test_delete_knowledge_base(self, mock_del):
         client = get_client()
 
@@ -224,7 +229,7 @@ class TestKnowledgeBases:
         args, _ = mock_del.call_args
         assert args[0].endswith('/api/knowledge_bases/test_kb')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_list_knowledge_bases(self, mock_get):
         client = get_client()
 
@@ -295,12 +300,14 @@ class TestMinds:
         assert mind.name == mind_json['name']
         assert mind.model_name == mind_json['model_name']
         assert mind.provider == mind_json['provider']
-        assert mind.parameters == mind_json['parameters']
-
-    @patch('requests.get')
-    @patch('requests.put')
-    @patch('requests.post')
-    @patch('requests.delete')
+        parameters = dict(mind_json['parameters'])
+        assert mind.prompt_template == parameters.pop('prompt_template', None)
+        assert mind.parameters == parameters
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.put')
+    @patch('requests.Session.post')
+    @patch('requests.Session.delete')
     def test_create(self, mock_del, mock_post, mock_put, mock_get):
         client = get_client()
 
@@ -398,8 +405,8 @@ class TestMinds:
 
         check_mind_created(mind, mock_put, create_params, f'/api/projects/mindsdb/minds/{mind_name}')
 
-    @patch('requests.get')
-    @patch('requests.patch')
+    @patch('requests.Session.get')
+    @patch('requests.Session.patch')
     def test_update(self, mock_patch, mock_get):
         client = get_client()
 
@@ -425,7 +432,58 @@ class TestMinds:
         params['datasources'] = [{'name': 'ds_name'}]
         assert kwargs['json'] == params
 
-    @patch('requests.get')
+        # not changed parameters are not sent
+        mind.update(model_name='llama3')
+        _, kwargs = mock_patch.call_args
+        assert kwargs['json'] == {'model_name': 'llama3'}
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.patch')
+    @patch('requests.Session.post')
+    @patch('requests.Session.delete')
+    def test_batch(self, mock_del, mock_post, mock_patch, mock_get):
+        client = get_client()
+
+        response_mock(mock_get, self.mind_json)
+        mind = client.minds.get('test_mind')
+        mock_get.reset_mock()
+
+        with mind.batch():
+            mind.del_datasource('example_ds')
+            mind.add_datasource('ds_name')
+            mind.add_knowledge_base('example_kb')
+            mind.update(model_name='gpt-4o', provider='ollama')
+            mind.update(prompt_template="Answer the user's question", parameters={'temperature': 0})
+
+        assert not mock_post.called
+        assert not mock_del.called
+        # only changed fields are sent by one request
+        assert mock_patch.call_count == 1
+        args, kwargs = mock_patch.call_args
+        assert args[0].endswith('/api/projects/mindsdb/minds/test_mind')
+        assert kwargs['json'] == {
+            'provider': 'ollama',
+            'parameters': {'temperature': 0},
+            'datasources': [{'name': 'ds_name'}],
+        }
+        # refreshed once
+        assert mock_get.call_count == 1
+
+        # nothing is changed
+        with mind.batch():
+            mind.add_knowledge_base('example_kb')
+        assert mock_patch.call_count == 1
+        assert mock_get.call_count == 1
+
+        # changes are discarded on error
+        with pytest.raises(ValueError):
+            with mind.batch():
+                mind.update(model_name='llama')
+                raise ValueError()
+        assert mock_patch.call_count == 1
+        assert mind._batch is None
+
+    @patch('requests.Session.get')
     def test_get(self, mock_get):
         client = get_client()
 
@@ -437,7 +495,7 @@ class TestMinds:
         args, _ = mock_get.call_args
         assert args[0].endswith('/api/projects/mindsdb/minds/my_mind')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_list(self, mock_get):
         client = get_client()
 
@@ -449,7 +507,7 @@ class TestMinds:
         args, _ = mock_get.call_args
         assert args[0].endswith('/api/projects/mindsdb/minds')
 
-    @patch('requests.delete')
+    @patch('requests.Session.delete')
     def test_delete(self, mock_del):
         client = get_client()
         client.minds.drop('my_name')
@@ -457,8 +515,8 @@ class TestMinds:
         args, _ = mock_del.call_args
         assert args[0].endswith('/api/projects/mindsdb/minds/my_name')
 
-    @patch('requests.get')
-    @patch('minds.minds.OpenAI')
+    @patch('requests.Session.get')
+    @patch('openai.OpenAI')
     def test_completion(self, mock_openai, mock_get):
         client = get_client()
 
@@ -474,6 +532,8 @@ class TestMinds:
             choice.message.content = answer
             choice.delta.content = answer  # for stream
             response.choices = [choice]
+            response.usage.prompt_tokens = 10
+            response.usage.completion_tokens = 5
 
             if kwargs.get('stream'):
                 return [response]
@@ -492,3 +552,319 @@ class TestMinds:
             if question == chunk.content.lower():
                 success = True
         assert success is True
+
+        _, kwargs = mock_openai().chat.completions.create.call_args
+        assert kwargs['stream_options'] == {'include_usage': True}
+
+        # usage of both calls
+        assert mind.last_usage.total_tokens == 15
+        assert mind.usage.requests == 2
+        assert client.usage.total.prompt_tokens == 20
+        assert client.usage.total.completion_tokens == 10
+
+    @patch('requests.Session.get')
+    @patch('openai.OpenAI')
+    def test_completion_budget(self, mock_openai, mock_get):
+        from minds.client import Client
+        from minds.usage import Budget
+        from minds.exceptions import BudgetExceeded
+
+        client = Client(API_KEY, budget=Budget(soft_limit=20, hard_limit=40, soft_limit_delay=0.1))
+
+        response_mock(mock_get, self.mind_json)
+        mind = client.minds.get('mind_name')
+
+        response = Mock()
+        choice = Mock()
+        choice.message.content = 'answer'
+        response.choices = [choice]
+        response.usage.prompt_tokens = 15
+        response.usage.completion_tokens = 10
+        mock_openai().chat.completions.create.return_value = response
+
+        with patch('minds.usage.time.sleep') as mock_sleep:
+            mind.completion('question')
+            assert not mock_sleep.called
+
+            # soft limit is exceeded: delayed
+            mind.completion('question')
+            mock_sleep.assert_called_with(0.1)
+
+            # hard limit is exceeded: rejected
+            with pytest.raises(BudgetExceeded):
+                mind.completion('question')
+
+        assert client.usage.total.total_tokens == 50
+        assert client.usage.by_mind()[mind.name].requests == 2
+
+
+class TestHedging:
+
+    def _delayed(self, delays, answer_prefix='answer'):
+        # every call of create returns the answer after the next delay
+        calls = []
+
+        def create():
+            n = len(calls)
+            calls.append(n)
+            time.sleep(delays[n])
+            response = Mock()
+            choice = Mock()
+            choice.message.content = f'{answer_prefix}{n}'
+            response.choices = [choice]
+            response.usage.prompt_tokens = 1
+            response.usage.completion_tokens = 1
+            return response
+        return create, calls
+
+    def test_hedge_wins(self):
+        from minds.hedging import Hedger, HedgingPolicy
+
+        hedger = Hedger(HedgingPolicy(threshold=0.05, max_hedge_rate=1))
+        create, calls = self._delayed([1, 0])
+
+        discarded = []
+        response = hedger.run(create, on_discard=discarded.append)
+        assert response.choices[0].message.content == 'answer1'
+        assert len(calls) == 2
+
+        stats = hedger.stats()
+        assert stats['hedges'] == 1
+        assert stats['hedge_wins'] == 1
+
+        # loser is reported when it is finished
+        time.sleep(1.2)
+        assert len(discarded) == 1
+
+    def test_no_hedge_for_fast_request(self):
+        from minds.hedging import Hedger, HedgingPolicy
+
+        hedger = Hedger(HedgingPolicy(threshold=0.5, max_hedge_rate=1))
+        create, calls = self._delayed([0])
+        response = hedger.run(create)
+        assert response.choices[0].message.content == 'answer0'
+        assert len(calls) == 1
+        assert hedger.stats()['hedges'] == 0
+
+    def test_hedge_rate_limit(self):
+        from minds.hedging import Hedger, HedgingPolicy
+
+        hedger = Hedger(HedgingPolicy(threshold=0.01, max_hedge_rate=0.5))
+        create, calls = self._delayed([0.05] * 10)
+        for _ in range(4):
+            hedger.run(create)
+        stats = hedger.stats()
+        assert stats['requests'] == 4
+        assert stats['hedges'] == 2
+
+    def test_threshold_by_percentile(self):
+        from minds.hedging import Hedger, HedgingPolicy
+
+        hedger = Hedger(HedgingPolicy(min_samples=10, percentile=0.9))
+        assert hedger.threshold() is None
+        for i in range(10):
+            hedger._latencies.append(i / 10)
+        assert hedger.threshold() == 0.9
+        # threshold in effect is reported
+        assert hedger.stats()['threshold'] == 0.9
+
+    def test_close(self):
+        from minds.client import Client
+        from minds.hedging import HedgingPolicy
+
+        with Client(API_KEY, hedging=HedgingPolicy(threshold=0.05)) as client:
+            hedger = client.hedger
+            assert hedger.run(lambda: 'answer') == 'answer'
+        with pytest.raises(RuntimeError):
+            hedger.run(lambda: 'answer')
+
+    def test_stream_hedge(self):
+        from minds.hedging import Hedger, HedgingPolicy
+
+        hedger = Hedger(HedgingPolicy(threshold=0.05, max_hedge_rate=1))
+        closed = []
+
+        def make_stream(delay, name):
+            stream = MagicMock()
+            choice = Mock()
+            choice.delta.content = name
+            chunk = Mock()
+            chunk.choices = [choice]
+
+            def iterate():
+                time.sleep(delay)
+                yield chunk
+            stream.__iter__.return_value = iterate()
+            stream.close.side_effect = lambda: closed.append(name)
+            return stream
+
+        streams = [make_stream(1, 'slow'), make_stream(0, 'fast')]
+        chunks = list(hedger.run(lambda: streams.pop(0), stream=True))
+        assert chunks[0].choices[0].delta.content == 'fast'
+
+        time.sleep(1.2)
+        assert closed == ['slow']
+
+    @patch('requests.Session.get')
+    @patch('openai.OpenAI')
+    def test_mind_completion(self, mock_openai, mock_get):
+        from minds.client import Client
+        from minds.hedging import HedgingPolicy
+
+        client = Client(API_KEY, hedging=HedgingPolicy(threshold=0.05, max_hedge_rate=1))
+
+        response_mock(mock_get, TestMinds.mind_json)
+        mind = client.minds.get('mind_name')
+
+        create, calls = self._delayed([0.5, 0])
+        mock_openai().chat.completions.create.side_effect = lambda *args, **kwargs: create()
+
+        assert mind.completion('question') == 'answer1'
+        time.sleep(0.6)
+        # both requests are charged
+        assert client.usage.total.requests == 2
+
+
+class TestScheduler:
+
+    def _start_waiters(self, scheduler, params, order):
+        # start waiting threads one by one, so they are queued in given order
+        threads = []
+        for mind_name, priority, tenant in params:
+            def run(mind_name=mind_name, priority=priority, tenant=tenant):
+                with scheduler.acquire(mind_name, priority=priority, tenant=tenant):
+                    order.append((mind_name, priority, tenant))
+            thread = threading.Thread(target=run)
+            thread.start()
+            threads.append(thread)
+            while sum(scheduler.stats()['queued'].values()) < len(threads):
+                time.sleep(0.001)
+        return threads
+
+    def test_priority(self):
+        from minds.scheduler import CompletionScheduler
+
+        scheduler = CompletionScheduler(max_concurrency=1)
+        order = []
+        blocker = scheduler.acquire('mind')
+
+        threads = self._start_waiters(scheduler, [
+            ('mind', 'batch', None),
+            ('mind', 'batch', None),
+            ('mind', 'interactive', None),
+        ], order)
+        blocker.release()
+        for thread in threads:
+            thread.join()
+
+        assert [priority for _, priority, _ in order] == ['interactive', 'batch', 'batch']
+        stats = scheduler.stats()
+        assert stats['running'] == 0
+        assert stats['queue_time']['batch']['count'] == 2
+        assert stats['queue_time']['interactive']['max'] > 0
+
+    def test_fair_queuing(self):
+        from minds.scheduler import CompletionScheduler
+
+        scheduler = CompletionScheduler(max_concurrency=1)
+        order = []
+        blocker = scheduler.acquire('mind')
+
+        threads = self._start_waiters(scheduler, [
+            ('mind', 'batch', 'a'),
+            ('mind', 'batch', 'a'),
+            ('mind', 'batch', 'a'),
+            ('mind', 'batch', 'b'),
+        ], order)
+        blocker.release()
+        for thread in threads:
+            thread.join()
+
+        assert [tenant for _, _, tenant in order] == ['a', 'b', 'a', 'a']
+
+    def test_mind_concurrency(self):
+        from minds.scheduler import CompletionScheduler
+
+        scheduler = CompletionScheduler(max_concurrency=2, mind_concurrency=1)
+        order = []
+        slot1 = scheduler.acquire('mind1')
+
+        # mind1 is at its limit, mind2 is not blocked by it
+        threads = self._start_waiters(scheduler, [('mind1', None, None)], order)
+        with scheduler.acquire('mind2'):
+            assert scheduler.stats()['running_by_mind'] == {'mind1': 1, 'mind2': 1}
+        assert order == []
+
+        slot1.release()
+        threads[0].join()
+        assert order == [('mind1', None, None)]
+
+    def test_timeout(self):
+        from minds.scheduler import CompletionScheduler
+        from minds.exceptions import SchedulerTimeout
+
+        scheduler = CompletionScheduler(max_concurrency=1)
+        with scheduler.acquire('mind'):
+            with pytest.raises(SchedulerTimeout):
+                scheduler.acquire('mind', timeout=0.01)
+        assert scheduler.stats()['queued'] == {'interactive': 0, 'batch': 0}
+
+    @patch('requests.Session.get')
+    @patch('openai.OpenAI')
+    def test_mind_completion(self, mock_openai, mock_get):
+        from minds.client import Client
+        from minds.scheduler import CompletionScheduler
+
+        client = Client(API_KEY, scheduler=CompletionScheduler(max_concurrency=1))
+        response_mock(mock_get, TestMinds.mind_json)
+        mind = client.minds.get('mind_name')
+
+        response = Mock()
+        choice = Mock()
+        choice.message.content = 'answer'
+        choice.delta.content = 'answer'
+        response.choices = [choice]
+        response.usage = None
+        mock_openai().chat.completions.create.return_value = response
+
+        assert mind.completion('question', priority='batch', tenant='a') == 'answer'
+        assert client.scheduler.stats()['running'] == 0
+
+        # stream holds the slot until it is consumed
+        mock_openai().chat.completions.create.return_value = [response]
+        stream = mind.completion('question', stream=True)
+        next(stream)
+        assert client.scheduler.stats()['running'] == 1
+        list(stream)
+        assert client.scheduler.stats()['running'] == 0
+
+        # not started stream releases the slot when it is closed
+        stream = mind.completion('question', stream=True)
+        assert client.scheduler.stats()['running'] == 1
+        stream.close()
+        assert client.scheduler.stats()['running'] == 0
+
+    def test_collected_slot(self):
+        from minds.scheduler import CompletionScheduler
+
+        scheduler = CompletionScheduler(max_concurrency=1)
+        slot = scheduler.acquire('mind')
+        with scheduler._lock:
+            # the finalizer doesn't take the lock, the release is applied later
+            del slot
+            assert len(scheduler._pending) == 1
+        # the next completion gets the released slot
+        with scheduler.acquire('mind', timeout=1):
+            assert scheduler.stats()['running'] == 1
+        assert scheduler.stats()['running'] == 0
+
+        # a completion waiting already gets the slot released by the finalizer
+        slot = scheduler.acquire('mind')
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(scheduler.acquire('mind', timeout=2)))
+        waiter.start()
+        while scheduler.stats()['queued']['interactive'] == 0:
+            time.sleep(0.01)
+        del slot
+        waiter.join()
+        assert len(acquired) == 1
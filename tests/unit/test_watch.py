@@ -0,0 +1,152 @@
+import asyncio
+import queue
+import time
+
+import pytest
+
+from minds.client import Client
+from minds.datasources import DatabaseConfig, Datasource
+from minds.knowledge_bases import KnowledgeBaseConfig
+from minds.local_server import LocalServer
+from minds.minds import Mind
+
+HTTP_DURATION = 'minds_http_request_duration_seconds'
+
+
+def make_datasource(name, description='db'):
+    return DatabaseConfig(name=name, engine='postgres', description=description)
+
+
+@pytest.fixture
+def client():
+    with LocalServer() as server:
+        yield Client('key', base_url=server.url)
+
+
+def test_poll(client):
+    client.datasources.create(make_datasource('watch_ds'))
+    client.knowledge_bases.create(KnowledgeBaseConfig(name='watch_kb', description='kb'))
+    watcher = client.watch(interval=1.0)
+
+    assert watcher.poll() == []
+    assert list(watcher.snapshot()['datasources']) == ['watch_ds']
+    # nothing is changed: lists are not downloaded again
+    assert watcher.poll() == []
+    assert client.metrics().histogram(HTTP_DURATION, method='GET', status='304').count == 3
+    assert watcher.interval == 1.25 * 1.25
+
+    client.minds.create(name='watch_mind')
+    client.datasources.create(make_datasource('watch_ds', description='changed'), update=True)
+    client.knowledge_bases.drop('watch_kb')
+
+    events = {(event.type, event.resource, event.name): event for event in watcher.poll()}
+    assert set(events) == {
+        ('added', 'minds', 'watch_mind'),
+        ('changed', 'datasources', 'watch_ds'),
+        ('removed', 'knowledge_bases', 'watch_kb'),
+    }
+    assert isinstance(events['added', 'minds', 'watch_mind'].item, Mind)
+    changed = events['changed', 'datasources', 'watch_ds'].item
+    assert isinstance(changed, Datasource) and changed.description == 'changed'
+    assert events['removed', 'knowledge_bases', 'watch_kb'].item is None
+    assert watcher.interval == 1.25 * 1.25 / 2
+
+    initial = client.watch(['minds'], initial=True)
+    assert [(event.type, event.name) for event in initial.poll()] == [('added', 'watch_mind')]
+    with pytest.raises(ValueError):
+        client.watch(['skills'])
+
+
+def test_failed_poll_keeps_changes(client):
+    watcher = client.watch(['minds', 'knowledge_bases'])
+    watcher.poll()
+    client.minds.create(name='kept_mind')
+
+    get = watcher.api.get
+
+    def failing_get(url, **kwargs):
+        if url == '/knowledge_bases':
+            raise ConnectionError('server is unavailable')
+        return get(url, **kwargs)
+
+    watcher.api.get = failing_get
+    with pytest.raises(ConnectionError):
+        watcher.poll()
+    watcher.api.get = get
+    # the change of minds received before the error is not lost
+    assert [(event.type, event.name) for event in watcher.poll()] == [('added', 'kept_mind')]
+    assert watcher.poll() == []
+
+
+def wait_snapshot(watcher):
+    deadline = time.monotonic() + 5
+    while watcher.snapshot()['minds'] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_background_thread(client):
+    events = queue.Queue()
+    with client.watch(['minds'], interval=0.01).start(events.put) as watcher:
+        wait_snapshot(watcher)
+        client.minds.create(name='thread_mind')
+        event = events.get(timeout=5)
+        assert (event.type, event.name) == ('added', 'thread_mind')
+
+        client.minds.drop('thread_mind')
+        assert events.get(timeout=5).type == 'removed'
+    assert watcher._thread is None
+
+
+def test_callback_error(client):
+    events = queue.Queue()
+
+    def callback(event):
+        if event.name == 'bad_mind':
+            raise RuntimeError('callback failed')
+        events.put(event)
+
+    # the error is kept until the next poll
+    with client.watch(['minds'], interval=0.2, min_interval=0.2).start(callback) as watcher:
+        wait_snapshot(watcher)
+        client.minds.create(name='bad_mind')
+        deadline = time.monotonic() + 5
+        while watcher.last_error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert str(watcher.last_error) == 'callback failed'
+
+        # the thread keeps polling
+        client.minds.create(name='good_mind')
+        assert events.get(timeout=5).name == 'good_mind'
+
+
+def test_content_change_without_updated_at():
+    with LocalServer() as server:
+        client = Client('key', base_url=server.url)
+        client.minds.create(name='content_mind')
+        watcher = client.watch(['minds'])
+        watcher.poll()
+
+        # updated_at is not changed
+        server.state.project_minds(client.minds.project)['content_mind']['model_name'] = 'changed_model'
+        events = watcher.poll()
+        assert [(event.type, event.name) for event in events] == [('changed', 'content_mind')]
+        assert events[0].item.model_name == 'changed_model'
+
+
+def test_async_iterator(client):
+    watcher = client.watch(['minds'], interval=0.01)
+
+    async def watch():
+        async for event in watcher:
+            watcher.stop()
+            return event
+
+    async def main():
+        watching = asyncio.ensure_future(watch())
+        # the snapshot is taken first, then the mind is created
+        await asyncio.get_running_loop().run_in_executor(None, wait_snapshot, watcher)
+        await asyncio.get_running_loop().run_in_executor(None, lambda: client.minds.create(name='async_mind'))
+        return await asyncio.wait_for(watching, timeout=5)
+
+    event = asyncio.run(main())
+    assert (event.type, event.resource, event.name) == ('added', 'minds', 'async_mind')